@@ -4,6 +4,101 @@
 # Note: Removed 'sys' and 'os' imports as they are not needed
 # for the core function when used as a module.
 
+import codecs
+
+from bitseq import BitSequence, format_binary_string
+from instrument import configure_logging, get_logger
+
+logger = get_logger("Scriptor")
+
+TEXT_CHUNK_CHARS = 1 << 16 # 流式读取时每块的字符数
+
+def bytes_to_bit_array(byte_data):
+    """
+    把字节序列展开为取值 0/1 的 numpy uint8 数组（np.unpackbits，高位在前）。
+
+    numpy 仅在调用此函数时导入，Scriptor 的文本接口本身不依赖 numpy。
+    """
+    return BitSequence.from_bytes(byte_data).to_array()
+
+def text_to_bit_array(text, encoding='utf-8'):
+    """
+    将文本直接转换为比特数组，跳过 "01010101 ..." 文本表示。
+
+    Returns:
+        numpy.ndarray: 取值 0/1 的 uint8 数组；编码失败时返回 None。
+    """
+    try:
+        return bytes_to_bit_array(text.encode(encoding))
+    except UnicodeEncodeError:
+        logger.error(f"错误 (Scriptor): 无法使用 '{encoding}' 对提供的文本进行编码。")
+        return None
+
+def text_to_bits(text, encoding='utf-8'):
+    """
+    将文本转换为紧凑的 BitSequence（每比特 1/8 字节），供 audio 模块直接使用。
+
+    Returns:
+        BitSequence: 文本编码后的比特序列；编码失败时返回 None。
+    """
+    try:
+        return BitSequence.from_bytes(text.encode(encoding))
+    except UnicodeEncodeError:
+        logger.error(f"错误 (Scriptor): 无法使用 '{encoding}' 对提供的文本进行编码。")
+        return None
+
+def bits_to_text(bits, encoding='utf-8'):
+    """
+    text_to_bits 的逆操作：把 BitSequence 或 "01010101 ..." 形式的文本还原为文本。
+
+    末尾不足 8 位的比特被丢弃，无法解码的字节替换为 U+FFFD。只依赖标准库，
+    不需要导入 translator (numpy)。
+
+    Returns:
+        str: 还原的文本；编码名称无效时返回 None。
+    """
+    if isinstance(bits, str):
+        bits = BitSequence.from_string(bits)
+    if len(bits) % 8:
+        logger.warning(f"警告 (Scriptor): 比特数 ({len(bits)}) 不是8的倍数，将丢弃末尾的 {len(bits) % 8} 个比特。")
+    try:
+        return bits.to_bytes().decode(encoding, errors='replace')
+    except LookupError:
+        logger.error(f"错误 (Scriptor): 未知的文本编码 '{encoding}'。")
+        return None
+
+def iter_text_chunks(text_file, chunk_chars=TEXT_CHUNK_CHARS):
+    """
+    按块读取已打开的文本文件 (或 sys.stdin)，每块最多 chunk_chars 个字符。
+
+    文本模式的文件对象自带增量解码器，多字节字符不会在块边界处被截断。
+    """
+    while True:
+        chunk = text_file.read(chunk_chars)
+        if not chunk:
+            return
+        yield chunk
+
+def iter_text_bits(text_chunks, encoding='utf-8'):
+    """
+    用增量编码器把逐块到达的文本转换为 BitSequence 流，拼接结果与
+    text_to_bits(''.join(text_chunks), encoding) 完全相同。
+
+    增量编码器保留跨块的状态 (如 UTF-16 的 BOM 只输出一次、被拆开的代理对)，
+    因此分块方式不影响输出。
+
+    Raises:
+        UnicodeEncodeError: 文本无法用 encoding 编码时抛出 (已产出的块保持有效)。
+    """
+    encoder = codecs.getincrementalencoder(encoding)()
+    for chunk in text_chunks:
+        data = encoder.encode(chunk)
+        if data:
+            yield BitSequence.from_bytes(data)
+    data = encoder.encode('', final=True)
+    if data:
+        yield BitSequence.from_bytes(data)
+
 def text_to_binary_string(text, encoding='utf-8'):
     """
     将文本字符串转换为其二进制表示形式（每个字节用8位二进制数表示，用空格分隔）。
@@ -17,27 +112,25 @@ def text_to_binary_string(text, encoding='utf-8'):
              如果输入为空或发生错误，则返回 None。
     """
     if not text:
-        print("警告 (Scriptor): 输入文本为空。")
+        logger.warning("警告 (Scriptor): 输入文本为空。")
         return "" # Return empty string for empty input
     try:
         # 1. 将文本字符串根据指定编码转换为字节序列 (bytes object)
         byte_array = text.encode(encoding)
 
-        # 2. 将每个字节转换为8位的二进制字符串
-        binary_strings = [bin(byte)[2:].zfill(8) for byte in byte_array]
-
-        # 3. 用空格连接所有字节的二进制字符串
-        return ' '.join(binary_strings)
+        # 2. 查表把每个字节转换为8位的二进制字符串，并用空格连接
+        return format_binary_string(byte_array)
     except UnicodeEncodeError:
-        print(f"错误 (Scriptor): 无法使用 '{encoding}' 对提供的文本进行编码。")
+        logger.error(f"错误 (Scriptor): 无法使用 '{encoding}' 对提供的文本进行编码。")
         return None
     except Exception as e:
-        print(f"错误 (Scriptor): 文本到二进制转换过程中发生错误: {e}")
+        logger.error(f"错误 (Scriptor): 文本到二进制转换过程中发生错误: {e}")
         return None
 
 # --- Standalone Execution Block (Optional: for testing Scriptor.py independently) ---
 # The main controller will NOT use this part.
 if __name__ == "__main__":
+    configure_logging()
     import os # Import os here if testing standalone file processing
 
     print("--- Running Scriptor.py Standalone for Testing ---")
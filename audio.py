@@ -1,18 +1,35 @@
 # 用于把二进制字符生成音频
+import functools
 import numpy as np
-import scipy.io.wavfile as wavfile
+import os
 import re 
+import struct
+from bitseq import BitSequence
+from instrument import configure_logging, count, get_logger, progress
+from modem import PROFILES, format_metadata, get_profile, profile_from_constants, streams_metadata
 
-SAMPLE_RATE = 44100      # 采样率 (Hz)
-FREQ_0 = 440             # '0' 的频率 (Hz)
-FREQ_1 = 880             # '1' 的频率 (Hz)
-DURATION = 0.1           # 每个音的持续时间 (秒)
-SILENCE_DURATION = 0.05  # 音之间的静音持续时间 (秒)
-AMPLITUDE = 0.6          # 音量 (0.0 to 1.0)
+logger = get_logger("audio")
+
+# 默认参数取自 modem.py 中的 'classic' 调制参数 (与 translator.py 共享，不再重复定义)
+# 传入 profile=None 时使用以下常量；修改它们即得到自定义参数
+_CLASSIC = PROFILES["classic"]
+SAMPLE_RATE = _CLASSIC.sample_rate            # 采样率 (Hz)
+FREQ_0, FREQ_1 = _CLASSIC.frequencies         # '0' / '1' 的频率 (Hz)
+DURATION = _CLASSIC.tone_duration             # 每个音的持续时间 (秒)
+SILENCE_DURATION = _CLASSIC.silence_duration  # 音之间的静音持续时间 (秒)
+AMPLITUDE = _CLASSIC.amplitude                # 音量 (0.0 to 1.0)
+PCM_SCALE = 32767        # float -> 16 位整数的缩放系数
+STREAM_CHUNK_BITS = 256  # 流式编码时每批合成的比特数 (决定峰值内存)
+WAV_MAX_DATA_BYTES = 0xFFFFFFFF # RIFF 32 位大小字段的上限
+BYTE_TABLE_MAX_BYTES = 32 << 20 # 字节波形表 (见 build_byte_table) 的内存上限；超出时逐符号查表
 
 def generate_sine_wave(frequency, duration, sample_rate, amplitude):
     """生成正弦波 NumPy 数组。"""
-    num_samples = int(sample_rate * duration)
+    return generate_tone(frequency, int(sample_rate * duration), sample_rate, amplitude)
+
+def generate_tone(frequency, num_samples, sample_rate, amplitude):
+    """生成指定采样点数的正弦波 NumPy 数组 (从相位 0 开始)。"""
+    duration = num_samples / sample_rate
     t = np.linspace(0., duration, num_samples, endpoint=False)
     wave = amplitude * np.sin(2 * np.pi * frequency * t)
     return wave
@@ -21,66 +38,470 @@ def generate_silence(duration, sample_rate):
     """生成静音 NumPy 数组。"""
     return np.zeros(int(sample_rate * duration))
 
+# --- Synthesis Engine ---
+def active_profile(profile=None):
+    """
+    解析调制参数：profile 可以是名称或 ModemProfile；None 表示使用本模块的
+    SAMPLE_RATE / FREQ_0 / FREQ_1 / DURATION / SILENCE_DURATION / AMPLITUDE 常量。
+    """
+    if profile is not None:
+        return get_profile(profile)
+    return profile_from_constants(SAMPLE_RATE, (FREQ_0, FREQ_1), DURATION, SILENCE_DURATION, AMPLITUDE)
+
+def build_tone_table(profile=None):
+    """
+    预先计算每个符号一个周期的 16 位 PCM 波形。
+
+    每一行的布局为 [静音 | 音调]，第 i 行对应符号 i (二进制参数下即 '0' 和 '1')。
+    频分复用参数 (subchannels > 1) 下每行对应 profile.frequencies 中的一个音调，
+    振幅为 amplitude / subchannels，各子信道的行相加即为一个符号周期的波形。
+    整段音频就是按符号值从表中取行后首尾相接，再去掉开头多出的一段静音，
+    因此与逐比特生成、拼接后再转换为 int16 的结果逐样本一致。
+
+    表按调制参数缓存：修改模块常量 (SAMPLE_RATE / DURATION / AMPLITUDE 等) 或 PCM_SCALE
+    后，active_profile 得到不同的参数，下次调用时自动重新生成。返回的数组为只读。
+
+    Returns:
+        tuple: (table, silence_samples)，table 为形状 (符号数, 周期样本数) 的 int16 数组。
+    """
+    return _tone_table(active_profile(profile), PCM_SCALE)
+
+@functools.lru_cache(maxsize=8)
+def _tone_table(profile, pcm_scale):
+    silence = np.zeros(profile.silence_samples)
+    rows = []
+    amplitude = profile.amplitude / profile.subchannels # 各子信道的音调叠加后不超过 amplitude
+    for frequency in profile.frequencies:
+        tone = generate_tone(frequency, profile.tone_samples, profile.sample_rate, amplitude)
+        rows.append(np.concatenate((silence, tone)))
+    table = (np.vstack(rows) * pcm_scale).astype(np.int16)
+    table.flags.writeable = False
+    return table, len(silence)
+
+def build_byte_table(profile=None):
+    """
+    预先计算 256 个字节值各自的完整 PCM 波形块 (8 个比特对应的符号依次取自
+    build_tone_table 的行)，合成时每个字节只需一次查表和一次块复制。
+
+    与 build_tone_table 一样按调制参数缓存。每个字节不是整数个符号、表的大小
+    超过 BYTE_TABLE_MAX_BYTES，或参数为频分复用时返回 None，此时应逐符号查表。
+
+    Returns:
+        np.ndarray | None: 形状 (256, 每字节样本数) 的只读 int16 数组。
+    """
+    return _byte_table(active_profile(profile), PCM_SCALE)
+
+@functools.lru_cache(maxsize=8)
+def _byte_table(profile, pcm_scale):
+    bits_per_symbol = profile.bits_per_symbol
+    if 8 % bits_per_symbol or profile.subchannels > 1:
+        return None
+    table, _ = _tone_table(profile, pcm_scale)
+    if 256 * (8 // bits_per_symbol) * table.nbytes // len(table) > BYTE_TABLE_MAX_BYTES:
+        return None
+    byte_bits = np.unpackbits(np.arange(256, dtype=np.uint8)[:, None], axis=1)
+    symbols = bits_to_symbols(byte_bits.reshape(-1), bits_per_symbol).reshape(256, -1)
+    byte_table = table[symbols].reshape(256, -1)
+    byte_table.flags.writeable = False
+    return byte_table
+
+def bits_to_array(binary_string):
+    """把只含 '0'/'1' 的字符串转换为取值 0/1 的 uint8 数组（不逐字符遍历）。"""
+    return np.frombuffer(binary_string.encode('ascii'), dtype=np.uint8) - ord('0')
+
+def bits_to_symbols(bits, bits_per_symbol):
+    """
+    每 bits_per_symbol 个比特 (高位在前) 组成一个符号；末尾不足一个符号时补 0。
+    """
+    if bits_per_symbol == 1:
+        return bits
+    padding = -len(bits) % bits_per_symbol
+    if padding:
+        bits = np.concatenate((bits, np.zeros(padding, dtype=bits.dtype)))
+    weights = 1 << np.arange(bits_per_symbol - 1, -1, -1)
+    return bits.reshape(-1, bits_per_symbol) @ weights
+
+def synthesize_pcm(bits, leading_silence=False, profile=None):
+    """
+    把比特数组一次性合成为 16 位 PCM 波形。
+
+    Args:
+        bits (np.ndarray | BitSequence): 取值为 0/1 的整数数组，或打包的比特序列
+                                         (此时直接按字节查表，不展开为数组)。
+        leading_silence (bool): 是否保留第一个符号之前的静音。
+                                流式合成时，除第一批外的每一批都需要保留。
+        profile (str | ModemProfile | None): 调制参数，见 active_profile。
+
+    Returns:
+        np.ndarray: int16 波形；符号之间插入静音，最后一个符号之后不加静音。
+                    频分复用参数下每个周期同时发送各子信道的符号，见 synthesize_symbols。
+    """
+    profile = active_profile(profile)
+    if profile.subchannels > 1:
+        # 频分复用: 比特按周期依次分给各子信道，最后一个周期中没有数据的子信道保持静音
+        bits = bits.to_array() if isinstance(bits, BitSequence) else bits
+        symbols = bits_to_symbols(bits, profile.bits_per_symbol).astype(np.int64)
+        symbols = np.concatenate((symbols, np.full(-len(symbols) % profile.subchannels, -1)))
+        return synthesize_symbols(symbols.reshape(-1, profile.subchannels), leading_silence, profile)
+    table, silence_samples = build_tone_table(profile)
+    byte_table = build_byte_table(profile)
+    cycle_samples = table.shape[1]
+
+    if byte_table is None:
+        byte_values = np.empty(0, dtype=np.uint8)
+        tail_bits = bits.to_array() if isinstance(bits, BitSequence) else bits
+    elif isinstance(bits, BitSequence):
+        packed = np.frombuffer(bits.data, dtype=np.uint8)
+        byte_values = packed[:len(bits) // 8]
+        tail_bits = np.unpackbits(packed[len(byte_values):], count=len(bits) % 8)
+    else:
+        byte_values = np.packbits(bits[:len(bits) - len(bits) % 8])
+        tail_bits = bits[len(bits) - len(bits) % 8:]
+    tail_symbols = bits_to_symbols(tail_bits, profile.bits_per_symbol)
+
+    # 预分配整个输出缓冲区：完整字节按字节表整块填充，剩余比特按符号表填充
+    byte_samples = byte_table.shape[1] if byte_table is not None else 0
+    head = len(byte_values) * byte_samples
+    buffer = np.empty(head + len(tail_symbols) * cycle_samples, dtype=np.int16)
+    if len(byte_values):
+        np.take(byte_table, byte_values, axis=0, out=buffer[:head].reshape(len(byte_values), byte_samples))
+    np.take(table, tail_symbols, axis=0, out=buffer[head:].reshape(len(tail_symbols), cycle_samples))
+    return buffer if leading_silence else buffer[silence_samples:]
+
+def synthesize_symbols(symbols, leading_silence=False, profile=None):
+    """
+    按符号矩阵合成频分复用的 16 位 PCM 波形。
+
+    Args:
+        symbols (np.ndarray): 形状 (周期数, 子信道数) 的整数数组，第 c 列是子信道 c
+                              在各周期发送的符号 (子信道内的音调序号)；-1 表示该子信道静音。
+        leading_silence (bool): 是否保留第一个周期之前的静音，见 synthesize_pcm。
+        profile (str | ModemProfile | None): 调制参数，见 active_profile。
+
+    Returns:
+        np.ndarray: int16 波形；各子信道的音调逐周期相加。
+    """
+    profile = active_profile(profile)
+    table, silence_samples = build_tone_table(profile)
+    symbols = np.asarray(symbols).reshape(len(symbols), -1)
+    if symbols.shape[1] > profile.subchannels:
+        raise ValueError(f"符号矩阵有 {symbols.shape[1]} 列，调制参数 '{profile.name}' 只有 {profile.subchannels} 个子信道")
+    buffer = np.zeros((len(symbols), table.shape[1]), dtype=np.int32)
+    for subchannel in range(symbols.shape[1]):
+        column = symbols[:, subchannel]
+        active = column >= 0
+        buffer[active] += table[subchannel * profile.tones_per_subchannel + column[active]]
+    buffer = buffer.reshape(-1).astype(np.int16)
+    return buffer if leading_silence else buffer[silence_samples:]
+
+# --- Streaming WAV Output ---
+class WavStreamWriter:
+    """
+    以流的方式写入 16 位单声道 PCM WAV 文件。
+
+    打开时先写入大小字段为占位值的 RIFF 头，之后每次 write_frames 直接把采样点
+    追加到文件末尾，close 时再回填 RIFF 与 data 块的大小。内存中不保留任何已写入的数据。
+    可选的 metadata 字符串 (如调制参数) 写入 data 块之前的 LIST/INFO 'ICMT' 注释块。
+    """
+
+    def __init__(self, target, sample_rate=SAMPLE_RATE, metadata=None):
+        """
+        Args:
+            target (str | file): 输出文件路径，或已打开的可 seek 二进制文件对象。
+            sample_rate (int): 采样率 (Hz)。
+            metadata (str | None): 写入 ICMT 注释块的文本。
+        """
+        self._owns_file = isinstance(target, (str, bytes, os.PathLike))
+        self._file = open(target, 'wb') if self._owns_file else target
+        self._start = self._file.tell()
+        self.sample_rate = sample_rate
+        self.frames_written = 0
+        self._info_chunk = self._list_info_chunk(metadata) if metadata else b''
+        self._file.write(self._header(0))
+
+    @staticmethod
+    def _list_info_chunk(text):
+        comment = text.encode('utf-8') + b'\0'
+        if len(comment) % 2:
+            comment += b'\0' # RIFF 块按偶数字节对齐
+        info = b'INFO' + b'ICMT' + struct.pack('<I', len(comment)) + comment
+        return b'LIST' + struct.pack('<I', len(info)) + info
+
+    def _header(self, data_bytes):
+        return _wav_header(self.sample_rate, data_bytes, self._info_chunk)
+
+    def write_frames(self, pcm):
+        """追加一段 int16 采样点。"""
+        pcm = np.asarray(pcm, dtype='<i2')
+        self._file.write(pcm.tobytes())
+        self.frames_written += len(pcm)
+
+    def close(self):
+        """回填头部中的大小字段并关闭 (或交还) 文件。"""
+        if self._file is None:
+            return
+        # RIFF 的大小字段只有 32 位；超出时按惯例写入最大值，读取端应读到文件末尾
+        data_bytes = min(self.frames_written * 2, WAV_MAX_DATA_BYTES)
+        end = self._file.tell()
+        self._file.seek(self._start)
+        self._file.write(self._header(data_bytes))
+        self._file.seek(end)
+        if self._owns_file:
+            self._file.close()
+        self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+def _wav_header(sample_rate, data_bytes, info_chunk=b''):
+    block_align = 2 # 单声道 * 16 位
+    riff_bytes = 36 + len(info_chunk) + data_bytes
+    return (b'RIFF' + struct.pack('<I', min(riff_bytes, WAV_MAX_DATA_BYTES)) + b'WAVE'
+            + b'fmt ' + struct.pack('<IHHIIHH', 16, 1, 1, sample_rate,
+                                    sample_rate * block_align, block_align, 16)
+            + info_chunk
+            + b'data' + struct.pack('<I', min(data_bytes, WAV_MAX_DATA_BYTES)))
+
+def wav_header(n_bits, profile=None, metadata=None):
+    """
+    返回 n_bits 个比特合成后的完整 WAV 头 (大小字段已是最终值)，用于无法回填头部的
+    输出 (如网络连接)：先发送头部，再依次发送 synthesize_pcm 生成的各批采样点。
+    metadata 为额外写入注释块的字段，见 binary_string_to_audio。
+    """
+    profile = active_profile(profile)
+    info_chunk = WavStreamWriter._list_info_chunk(format_metadata(profile, **(metadata or {})))
+    return _wav_header(profile.sample_rate, synthesized_frames(n_bits, profile) * 2, info_chunk)
+
+def synthesized_frames(n_bits, profile=None):
+    """n_bits 个比特合成后的采样点数 (与 synthesize_pcm 的输出长度一致)。"""
+    profile = active_profile(profile)
+    n_symbols = -(-n_bits // profile.bits_per_period)
+    return max(0, n_symbols * profile.cycle_samples - profile.silence_samples)
+
+def iter_bit_chunks(binary_input, chunk_bits=STREAM_CHUNK_BITS):
+    """
+    把二进制输入切分为有界大小的比特数组。
+
+    Args:
+        binary_input (BitSequence | str | iterable): 完整的比特序列 / 二进制字符串，
+                                                     或逐块产出它们的可迭代对象。
+                                                     字符串中的非 '0'/'1' 字符 (如空格) 会被忽略。
+        chunk_bits (int): 每块最多包含的比特 (字符) 数。
+
+    Yields:
+        np.ndarray: 取值 0/1 的 uint8 数组 (不会产出空数组)。
+    """
+    if isinstance(binary_input, (str, BitSequence, np.ndarray)):
+        binary_input = [binary_input]
+    for piece in binary_input:
+        if isinstance(piece, BitSequence):
+            # 打包数据按块展开，不经过文本形式
+            for chunk in piece.iter_chunks(chunk_bits):
+                if chunk:
+                    yield chunk.to_array()
+            continue
+        if isinstance(piece, np.ndarray):
+            for i in range(0, len(piece), chunk_bits):
+                if len(piece[i:i + chunk_bits]):
+                    yield piece[i:i + chunk_bits].astype(np.uint8, copy=False)
+            continue
+        for i in range(0, len(piece), chunk_bits):
+            cleaned = re.sub(r'[^01]', '', piece[i:i + chunk_bits])
+            if cleaned:
+                yield bits_to_array(cleaned)
+
+def align_to_symbols(bit_chunks, bits_per_symbol):
+    """
+    重新切分比特块，使每块 (最后一块除外) 都是 bits_per_symbol 的整数倍，
+    多出的比特留到下一块，保证流式合成的符号边界与一次性合成一致。
+    频分复用参数应传入 profile.bits_per_period，使每块都是完整的周期。
+    """
+    carry = np.empty(0, dtype=np.uint8)
+    for bits in bit_chunks:
+        if len(carry):
+            bits = np.concatenate((carry, bits))
+        usable = len(bits) - len(bits) % bits_per_symbol
+        carry = bits[usable:]
+        if usable:
+            yield bits[:usable]
+    if len(carry):
+        yield carry # synthesize_pcm 会为最后一个不完整的符号补 0
+
 # --- Core Function ---
-def binary_string_to_audio(binary_string, output_filename):
-    """将二进制字符串转换为 Beep/Boop音频并保存为 WAV 文件。"""
-    
-    print(f"音频模块收到二进制输入 (前100字符): '{binary_string[:100]}{'...' if len(binary_string) > 100 else ''}'")
+def binary_string_to_audio(binary_string, output_filename, profile=None, metadata=None):
+    """
+    将二进制字符串转换为 Beep/Boop音频并保存为 WAV 文件。
+
+    binary_string 也可以是 BitSequence (如 Scriptor.text_to_bits 的结果) 或取值 0/1 的
+    numpy 比特数组，此时直接展开打包数据，跳过正则清理和逐字符解析。
+    profile 为调制参数 (名称或 ModemProfile)，None 使用本模块常量，见 active_profile。
+    metadata 为额外写入注释块的字段 (dict，如 framing.framing_metadata())。
+    """
+    if isinstance(binary_string, BitSequence):
+        logger.info(f"音频模块收到比特序列 ({len(binary_string)} 位)。")
+        return bit_array_to_audio(binary_string, output_filename, profile, metadata)
+    if not isinstance(binary_string, str):
+        return bit_array_to_audio(np.asarray(binary_string, dtype=np.uint8), output_filename, profile, metadata)
+
+    logger.info(f"音频模块收到二进制输入 (前100字符): '{binary_string[:100]}{'...' if len(binary_string) > 100 else ''}'")
 
     # 1. 清理输入：移除所有非 '0' 或 '1' 的字符
     cleaned_binary = re.sub(r'[^01]', '', binary_string)
 
     if not cleaned_binary:
-        print("\n错误 (Audio): 输入数据清理后未找到有效的二进制数字 ('0' 或 '1')。")
+        logger.error("错误 (Audio): 输入数据清理后未找到有效的二进制数字 ('0' 或 '1')。")
         return False
 
-    print(f"清理后的二进制序列 ({len(cleaned_binary)} 位) 将用于生成音频。")
+    logger.info(f"清理后的二进制序列 ({len(cleaned_binary)} 位) 将用于生成音频。")
     # print(f"音频参数: FREQ_0={FREQ_0}, FREQ_1={FREQ_1}, DUR={DURATION}, SILENCE={SILENCE_DURATION}") # Optional detail
 
-    audio_segments = []
-    silence_segment = generate_silence(SILENCE_DURATION, SAMPLE_RATE)
+    return bit_array_to_audio(bits_to_array(cleaned_binary), output_filename, profile, metadata)
 
-    # 2. 生成音频波形
-    print("开始生成音频波形...")
-    total_bits = len(cleaned_binary)
-    for i, bit in enumerate(cleaned_binary):
-        frequency = FREQ_0 if bit == '0' else FREQ_1
-        # tone_type = "Boop (低)" if bit == '0' else "Beep (高)" # For verbose logging
+def bit_array_to_audio(bits, output_filename, profile=None, metadata=None):
+    """将 0/1 比特数组 (或 BitSequence) 合成为音频并保存为 WAV 文件 (调制参数记录在文件的注释块中)。"""
+    if len(bits) == 0:
+        logger.error("错误 (Audio): 比特数组为空，无法生成音频。")
+        return False
+    try:
+        profile = active_profile(profile)
+    except ValueError as e:
+        logger.error(f"错误 (Audio): {e}")
+        return False
 
-        # 打印进度
-        if (i + 1) % 100 == 0 or i == total_bits - 1:
-             print(f"  生成中: {i + 1}/{total_bits} 位...", end='\r')
+    # 1. 生成音频波形 (查表合成，直接输出 16 位整数)
+    logger.info(f"开始生成音频波形 (调制参数: {profile.name}, {profile.bit_rate:.1f} 比特/秒)...")
+    scaled_wave = synthesize_pcm(bits, profile=profile)
+    logger.info(f"音频波形生成完成。共 {len(scaled_wave)} 个采样点。")
 
-        tone_segment = generate_sine_wave(frequency, DURATION, SAMPLE_RATE, AMPLITUDE)
-        audio_segments.append(tone_segment)
+    # 2. 写入 WAV 文件
+    try:
+        logger.info(f"写入 WAV 文件: {output_filename}...")
+        with WavStreamWriter(output_filename, profile.sample_rate, format_metadata(profile, **(metadata or {}))) as writer:
+            writer.write_frames(scaled_wave)
+        count("bits_encoded", len(bits))
+        count("samples_written", writer.frames_written)
+        progress("audio", len(bits), len(bits))
+        logger.info(f"成功！音频文件已保存到 '{output_filename}'")
+        return True
+    except Exception as e:
+        logger.error(f"错误 (Audio): 无法写入 WAV 文件 '{output_filename}': {e}")
+        return False
 
-        if SILENCE_DURATION > 0 and i < total_bits - 1:
-            audio_segments.append(silence_segment)
+def binary_string_to_audio_stream(binary_input, output_filename, chunk_bits=STREAM_CHUNK_BITS, profile=None,
+                                  metadata=None):
+    """
+    流式版本的 binary_string_to_audio：按块合成并直接追加到 WAV 文件，峰值内存与输入长度无关。
 
-    print("\n" + "-" * 50 + "\r音频波形生成完成。")
+    Args:
+        binary_input (BitSequence | str | iterable): 比特序列 / 二进制字符串，或逐块产出它们的可迭代对象。
+        output_filename (str): 输出 WAV 文件路径。
+        chunk_bits (int): 每批合成的比特数。
+        profile (str | ModemProfile | None): 调制参数，见 active_profile。
+        metadata (dict | None): 额外写入注释块的字段。
 
-    if not audio_segments:
-        print("错误 (Audio): 未能生成任何音频片段。")
+    Returns:
+        bool: 成功返回 True，否则返回 False。
+    """
+    try:
+        profile = active_profile(profile)
+    except ValueError as e:
+        logger.error(f"错误 (Audio): {e}")
+        return False
+    chunks = align_to_symbols(iter_bit_chunks(binary_input, chunk_bits), profile.bits_per_period)
+    first_bits = next(chunks, None)
+    if first_bits is None:
+        logger.error("错误 (Audio): 输入数据清理后未找到有效的二进制数字 ('0' 或 '1')。")
+        return False
+
+    logger.info(f"音频模块 (流式) 开始写入: {output_filename}，每批 {chunk_bits} 位，调制参数: {profile.name}。")
+    total_bits = len(first_bits)
+    expected_bits = len(binary_input) if isinstance(binary_input, BitSequence) else None # For progress only
+    try:
+        with WavStreamWriter(output_filename, profile.sample_rate, format_metadata(profile, **(metadata or {}))) as writer:
+            writer.write_frames(synthesize_pcm(first_bits, profile=profile))
+            progress("audio", total_bits, expected_bits)
+            for bits in chunks:
+                writer.write_frames(synthesize_pcm(bits, leading_silence=True, profile=profile))
+                total_bits += len(bits)
+                progress("audio", total_bits, expected_bits)
+    except Exception as e:
+        logger.error(f"错误 (Audio): 无法写入 WAV 文件 '{output_filename}': {e}")
         return False
+    count("bits_encoded", total_bits)
+    count("samples_written", writer.frames_written)
+
+    logger.info(f"成功！共 {total_bits} 位、{writer.frames_written} 个采样点，音频文件已保存到 '{output_filename}'")
+    return True
+
+def multiplex_to_audio(streams, output_filename, profile=None, metadata=None, chunk_bits=STREAM_CHUNK_BITS):
+    """
+    把几路独立的比特流分别放在频分复用参数的各个子信道上，合成为一个 WAV 文件。
 
-    # 3. 连接片段
-    print("连接音频片段...")
-    final_wave = np.concatenate(audio_segments)
+    第 i 路占用子信道 i；某一路结束后其子信道保持静音，音频长度由最长的一路决定。
+    按块合成并直接写入文件，内存占用与输入长度无关。解码见 translator 中的
+    STREAM_SEPARATOR。
 
-    # 4. 格式转换 (16-bit integer)
-    print("转换为 16 位整数格式...")
-    scaled_wave = np.int16(final_wave * 32767)
+    Args:
+        streams (list[BitSequence | np.ndarray]): 各路比特序列或 0/1 数组，路数不超过子信道数。
+        output_filename (str): 输出 WAV 文件路径。
+        profile (str | ModemProfile | None): 调制参数，见 active_profile。
+        metadata (dict | None): 额外写入注释块的字段 (路数会自动记录)。
+        chunk_bits (int): 每路每批合成的比特数 (约数)。
 
-    # 5. 写入 WAV 文件
+    Returns:
+        bool: 成功返回 True，否则返回 False。
+    """
     try:
-        print(f"写入 WAV 文件: {output_filename}...")
-        wavfile.write(output_filename, SAMPLE_RATE, scaled_wave)
-        print(f"成功！音频文件已保存到 '{output_filename}'")
-        return True
+        profile = active_profile(profile)
+    except ValueError as e:
+        logger.error(f"错误 (Audio): {e}")
+        return False
+    if not 0 < len(streams) <= profile.subchannels:
+        logger.error(f"错误 (Audio): 调制参数 '{profile.name}' 有 {profile.subchannels} 个子信道，"
+                     f"无法容纳 {len(streams)} 路数据。")
+        return False
+    bits_per_symbol = profile.bits_per_symbol
+    # 每路每块取相同的整字节数且是整数个符号，各路的块逐周期对齐
+    stream_bits = 8 * bits_per_symbol * max(1, chunk_bits // (8 * bits_per_symbol))
+    chunk_iterators = [iter_bit_chunks(stream, stream_bits) for stream in streams]
+    total_bits = sum(len(stream) for stream in streams)
+    if not total_bits:
+        logger.error("错误 (Audio): 所有输入都为空，无法生成音频。")
+        return False
+
+    logger.info(f"音频模块 (复用) 开始写入: {output_filename}，{len(streams)} 路数据，调制参数: {profile.name}。")
+    done_bits = 0
+    try:
+        with WavStreamWriter(output_filename, profile.sample_rate,
+                             format_metadata(profile, **streams_metadata(len(streams)), **(metadata or {}))) as writer:
+            while True:
+                chunks = [next(chunk_iterator, None) for chunk_iterator in chunk_iterators]
+                if all(chunk is None for chunk in chunks):
+                    break
+                columns = [None if chunk is None else bits_to_symbols(chunk, bits_per_symbol) for chunk in chunks]
+                symbols = np.full((max(len(column) for column in columns if column is not None), len(streams)), -1,
+                                  dtype=np.int64)
+                for index, column in enumerate(columns):
+                    if column is not None:
+                        symbols[:len(column), index] = column
+                done_bits += sum(len(chunk) for chunk in chunks if chunk is not None)
+                writer.write_frames(synthesize_symbols(symbols, leading_silence=writer.frames_written > 0,
+                                                       profile=profile))
+                progress("audio", done_bits, total_bits)
     except Exception as e:
-        print(f"错误 (Audio): 无法写入 WAV 文件 '{output_filename}': {e}")
+        logger.error(f"错误 (Audio): 无法写入 WAV 文件 '{output_filename}': {e}")
         return False
+    count("bits_encoded", total_bits)
+    count("samples_written", writer.frames_written)
+    logger.info(f"成功！共 {len(streams)} 路、{total_bits} 位、{writer.frames_written} 个采样点，"
+                f"音频文件已保存到 '{output_filename}'")
+    return True
+
 if __name__ == "__main__":
+    configure_logging()
     print("--- Running audio.py Standalone for Testing ---")
 
     # Example binary string for testing
@@ -0,0 +1,252 @@
+# 性能基准测试: Scriptor / audio / translator 的主要路径
+# -*- coding: utf-8 -*-
+
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from Scriptor import text_to_binary_string
+from audio import binary_string_to_audio
+from instrument import configure_logging, get_logger
+from translator import binary_string_to_text, decode_audio_to_binary, normalization_scale, read_wav_mmap
+
+logger = get_logger("benchmark")
+
+# --- Configuration ---
+BENCHMARK_CORPORA = ("ascii", "cjk", "random") # Synthetic corpus kinds, see make_corpus
+BENCHMARK_SIZES = (64, 256, 1024) # Corpus sizes in encoded bytes
+BENCHMARK_PROFILE = "classic" # Modem profile (see modem.PROFILES); faster profiles allow larger sizes
+BENCHMARK_REPEAT = 3 # Each stage is run this many times and the fastest run is kept
+BENCHMARK_SEED = 1234 # Corpora are generated deterministically so runs are comparable
+BENCHMARK_OUTPUT = "benchmark_results.json" # Where results are saved
+BENCHMARK_BASELINE = None # Earlier results file to compare against, or None
+BENCHMARK_TOLERANCE = 0.10 # A stage more than 10% slower than the baseline is a regression
+
+
+# --- Corpora ---
+def make_corpus(kind, size_bytes, seed=BENCHMARK_SEED):
+    """
+    Builds a synthetic text whose encoded form is about `size_bytes` long.
+
+    "ascii": printable ASCII, 1 byte per character (utf-8).
+    "cjk": CJK ideographs, 3 bytes per character (utf-8).
+    "random": uniformly random bytes, carried as latin-1 text so every byte value occurs.
+
+    Returns:
+        tuple: (text, encoding)
+    """
+    rng = random.Random(f"{seed}-{kind}-{size_bytes}")
+    if kind == "ascii":
+        alphabet = [chr(c) for c in range(32, 127)] + ["\n"]
+        return "".join(rng.choice(alphabet) for _ in range(size_bytes)), "utf-8"
+    if kind == "cjk":
+        return "".join(chr(rng.randint(0x4E00, 0x9FFF)) for _ in range(max(1, size_bytes // 3))), "utf-8"
+    if kind == "random":
+        return bytes(rng.getrandbits(8) for _ in range(size_bytes)).decode("latin-1"), "latin-1"
+    raise ValueError(f"未知的语料类型: {kind}")
+
+
+# --- Measurement ---
+def peak_rss_bytes():
+    """
+    Peak resident set size of the current process in bytes, or None if the platform
+    offers no way to read it.
+    """
+    try:
+        import resource
+    except ImportError:
+        try:
+            import psutil # Optional; only used where the resource module is missing (Windows)
+        except ImportError:
+            return None
+        memory = psutil.Process().memory_info()
+        return getattr(memory, "peak_wset", memory.rss)
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024 # Linux reports kilobytes
+
+
+def _best_time(function, repeat):
+    """Runs function() `repeat` times; returns (best seconds, last result)."""
+    best = None
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = function()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def _rates(seconds, n_bits, n_samples):
+    return {
+        "seconds": seconds,
+        "bits_per_s": n_bits / seconds if seconds > 0 else None,
+        "samples_per_s": n_samples / seconds if seconds > 0 else None,
+    }
+
+
+def run_case(case):
+    """
+    Benchmarks one (corpus, size) case: every stage separately, then the whole
+    text -> binary -> WAV -> binary -> text pipeline end to end.
+
+    Meant to run in a fresh worker process (see run_benchmarks), so the reported peak
+    RSS belongs to this case alone.
+    """
+    kind, size_bytes, profile, repeat = case
+    text, encoding = make_corpus(kind, size_bytes)
+    rss_before = peak_rss_bytes()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        wav_path = os.path.join(workdir, "benchmark.wav")
+        stages = {}
+
+        seconds, binary_string = _best_time(lambda: text_to_binary_string(text, encoding), repeat)
+        stages["text_to_binary_string"] = seconds
+
+        seconds, ok = _best_time(lambda: binary_string_to_audio(binary_string, wav_path, profile=profile), repeat)
+        if not ok:
+            raise RuntimeError(f"音频生成失败: {kind} / {size_bytes}")
+        stages["binary_string_to_audio"] = seconds
+
+        sample_rate, audio_data = read_wav_mmap(wav_path)
+        n_samples = len(audio_data)
+        scale_factor = normalization_scale(audio_data.dtype)
+        seconds, decoded = _best_time(
+            lambda: decode_audio_to_binary(audio_data, sample_rate, scale_factor, profile=profile), repeat)
+        del audio_data
+        stages["decode_audio_to_binary"] = seconds
+
+        seconds, recovered = _best_time(lambda: binary_string_to_text(decoded, encoding), repeat)
+        stages["binary_string_to_text"] = seconds
+
+        def end_to_end():
+            binary = text_to_binary_string(text, encoding)
+            binary_string_to_audio(binary, wav_path, profile=profile)
+            rate, samples = read_wav_mmap(wav_path)
+            bits = decode_audio_to_binary(samples, rate, normalization_scale(samples.dtype), profile=profile)
+            del samples
+            return binary_string_to_text(bits, encoding)
+
+        end_to_end_seconds, _ = _best_time(end_to_end, repeat)
+
+    n_bits = len(text.encode(encoding)) * 8
+    return {
+        "corpus": kind,
+        "size_bytes": n_bits // 8,
+        "bits": n_bits,
+        "samples": n_samples,
+        "audio_seconds": n_samples / sample_rate,
+        "roundtrip_ok": recovered == text,
+        "stages": {name: _rates(seconds, n_bits, n_samples) for name, seconds in stages.items()},
+        "end_to_end": _rates(end_to_end_seconds, n_bits, n_samples),
+        "peak_rss_bytes": peak_rss_bytes(),
+        "baseline_rss_bytes": rss_before,
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(corpora=BENCHMARK_CORPORA, sizes=BENCHMARK_SIZES, profile=BENCHMARK_PROFILE,
+                   repeat=BENCHMARK_REPEAT):
+    """
+    Runs every (corpus, size) case, each in its own short-lived worker process.
+
+    Returns:
+        dict: {"meta": run information, "results": list of run_case results}
+    """
+    results = []
+    for kind in corpora:
+        for size_bytes in sizes:
+            # A fresh process per case keeps peak RSS from carrying over between cases
+            with ProcessPoolExecutor(max_workers=1) as executor:
+                result = executor.submit(run_case, (kind, size_bytes, profile, repeat)).result()
+            results.append(result)
+            e2e = result["end_to_end"]
+            rss = result["peak_rss_bytes"]
+            rss_text = f"{rss / 2**20:.1f} MiB" if rss else "未知"
+            logger.info(f"  {kind:>6} {result['size_bytes']:>7} B: 端到端 {e2e['seconds']:.3f} 秒, "
+                  f"{e2e['bits_per_s']:.0f} bit/s, {e2e['samples_per_s']:.0f} 样本/s, 峰值内存 {rss_text}")
+            if not result["roundtrip_ok"]:
+                logger.warning(f"  警告: {kind} / {size_bytes} 往返结果与原文不一致!")
+    return {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "commit": _git_commit(),
+            "profile": getattr(profile, "name", profile),
+            "repeat": repeat,
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+        },
+        "results": results,
+    }
+
+
+def compare_benchmarks(baseline, current, tolerance=BENCHMARK_TOLERANCE):
+    """
+    Compares two benchmark reports case by case.
+
+    Returns:
+        list[str]: One message per stage (or end-to-end run) that got more than
+                   `tolerance` slower than in the baseline.
+    """
+    if baseline["meta"].get("profile") != current["meta"].get("profile"):
+        logger.warning(f"警告: 基准使用的调制参数不同 ({baseline['meta'].get('profile')} vs {current['meta'].get('profile')})。")
+    previous = {(r["corpus"], r["size_bytes"]): r for r in baseline["results"]}
+    regressions = []
+    for result in current["results"]:
+        old = previous.get((result["corpus"], result["size_bytes"]))
+        if old is None:
+            continue
+        timings = dict(result["stages"], end_to_end=result["end_to_end"])
+        old_timings = dict(old["stages"], end_to_end=old["end_to_end"])
+        for name, timing in timings.items():
+            if name not in old_timings:
+                continue
+            before, after = old_timings[name]["seconds"], timing["seconds"]
+            if before > 0 and after > before * (1 + tolerance):
+                regressions.append(f"{result['corpus']} / {result['size_bytes']} B / {name}: "
+                                   f"{before:.4f} 秒 -> {after:.4f} 秒 (+{(after / before - 1) * 100:.0f}%)")
+    return regressions
+
+
+# --- Execute the Benchmarks ---
+if __name__ == "__main__":
+    configure_logging()
+    # Optional arguments: [output.json] [baseline.json]
+    output_path = sys.argv[1] if len(sys.argv) > 1 else BENCHMARK_OUTPUT
+    baseline_path = sys.argv[2] if len(sys.argv) > 2 else BENCHMARK_BASELINE
+
+    print("-" * 50)
+    print(f" 性能基准测试 (调制参数: {BENCHMARK_PROFILE}, 每项重复 {BENCHMARK_REPEAT} 次)")
+    print("-" * 50)
+    report = run_benchmarks()
+
+    with open(output_path, 'w', encoding='utf-8') as outfile:
+        json.dump(report, outfile, ensure_ascii=False, indent=2)
+    print(f"结果已保存到: {output_path}")
+
+    if baseline_path:
+        with open(baseline_path, 'r', encoding='utf-8') as infile:
+            regressions = compare_benchmarks(json.load(infile), report)
+        if regressions:
+            print(f"与基准 {baseline_path} 相比发现 {len(regressions)} 项性能回退:")
+            for message in regressions:
+                print(f"  {message}")
+            sys.exit(1)
+        print(f"与基准 {baseline_path} 相比未发现性能回退。")
@@ -0,0 +1,146 @@
+# 紧凑的比特序列类型，在 Scriptor / audio / translator 之间传递比特
+# -*- coding: utf-8 -*-
+
+import re
+
+# 预先计算的 256 项查找表：字节值 -> 8 位二进制字符串
+_BYTE_TO_BINARY = tuple(format(value, '08b') for value in range(256))
+
+def format_binary_string(byte_data, sep=' '):
+    """
+    把字节序列格式化为 "01010101 ..." 文本形式（查表实现，无逐位运算）。
+
+    Args:
+        byte_data (bytes | bytearray): 输入字节序列。
+        sep (str): 字节之间的分隔符，默认为空格。
+
+    Returns:
+        str: 每个字节 8 位的二进制字符串。
+    """
+    return sep.join(map(_BYTE_TO_BINARY.__getitem__, byte_data))
+
+
+class BitSequence:
+    """
+    以 bytes 打包存储的比特序列（高位在前），每比特只占 1/8 字节。
+
+    length 记录有效比特数，最后一个字节中多余的低位恒为 0。
+    numpy 只在 from_array / to_array 中按需导入，其余操作只依赖标准库。
+    """
+
+    __slots__ = ('data', 'length')
+
+    def __init__(self, data=b'', length=None):
+        """
+        Args:
+            data (bytes | bytearray): 打包后的比特数据。
+            length (int | None): 有效比特数；None 表示 len(data) * 8。
+        """
+        data = bytes(data)
+        if length is None:
+            length = len(data) * 8
+        if len(data) != (length + 7) // 8:
+            raise ValueError(f"比特数 {length} 与数据长度 {len(data)} 字节不符")
+        self.data = data
+        self.length = length
+
+    # --- 构造 ---
+    @classmethod
+    def from_bytes(cls, byte_data):
+        """每个字节对应 8 个比特。"""
+        return cls(byte_data)
+
+    @classmethod
+    def from_string(cls, binary_string):
+        """
+        旧版字符串接口的适配器：解析 "01010101 ..." 形式的文本，忽略所有非 '0'/'1' 字符。
+        """
+        cleaned = re.sub(r'[^01]', '', binary_string)
+        if not cleaned:
+            return cls()
+        padding = -len(cleaned) % 8
+        value = int(cleaned + '0' * padding, 2)
+        return cls(value.to_bytes((len(cleaned) + padding) // 8, 'big'), len(cleaned))
+
+    @classmethod
+    def from_array(cls, bits):
+        """由取值 0/1 的 numpy 数组构造 (np.packbits)。"""
+        import numpy as np
+        bits = np.asarray(bits, dtype=np.uint8)
+        return cls(np.packbits(bits).tobytes(), len(bits))
+
+    # --- 转换 ---
+    def to_bytes(self):
+        """返回完整字节部分；末尾不足 8 位的比特被丢弃。"""
+        return self.data[:self.length // 8]
+
+    def to_array(self):
+        """展开为取值 0/1 的 numpy uint8 数组 (np.unpackbits)。"""
+        import numpy as np
+        return np.unpackbits(np.frombuffer(self.data, dtype=np.uint8), count=self.length)
+
+    def to_string(self, sep=' '):
+        """格式化为文本形式，每 8 位之间插入 sep（旧版字符串接口）。"""
+        text = format_binary_string(self.data, sep)
+        tail = -len(self.data) * 8 + self.length # 最后一个字节中多余的位数 (<= 0)
+        return text[:len(text) + tail] if tail else text
+
+    def iter_text(self, sep=' ', chunk_bits=1 << 19):
+        """
+        按块产出文本形式，拼接结果等于 to_string(sep)；写入 .bin.txt 时无需一次性构造整个字符串。
+        """
+        for index, chunk in enumerate(self.iter_chunks(chunk_bits)):
+            yield (sep if index else '') + chunk.to_string(sep)
+
+    def head(self, n_bits):
+        """返回前 n_bits 位组成的新序列 (用于预览，不展开整个序列)。"""
+        n_bits = max(0, min(n_bits, self.length))
+        n_bytes = (n_bits + 7) // 8
+        data = bytearray(self.data[:n_bytes])
+        if n_bits % 8:
+            data[-1] &= (0xFF << (8 - n_bits % 8)) & 0xFF
+        return BitSequence(data, n_bits)
+
+    def iter_chunks(self, chunk_bits):
+        """
+        按块产出子序列，每块最多 chunk_bits 位 (向上取整到整字节)，用于流式处理。
+        """
+        chunk_bytes = max(1, chunk_bits // 8)
+        for start in range(0, len(self.data), chunk_bytes):
+            piece = self.data[start:start + chunk_bytes]
+            yield BitSequence(piece, min(len(piece) * 8, self.length - start * 8))
+
+    # --- 容器协议 ---
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, key):
+        """支持取单个比特和切片；从头开始的切片 ([:n]) 不经过 numpy。"""
+        if isinstance(key, slice):
+            start, stop, step = key.indices(self.length)
+            if start == 0 and step == 1:
+                return self.head(stop)
+            return BitSequence.from_array(self.to_array()[key])
+        if key < 0:
+            key += self.length
+        if not 0 <= key < self.length:
+            raise IndexError("BitSequence index out of range")
+        return (self.data[key // 8] >> (7 - key % 8)) & 1
+
+    def __bool__(self):
+        return self.length > 0
+
+    def __eq__(self, other):
+        if not isinstance(other, BitSequence):
+            return NotImplemented
+        return self.length == other.length and self.data == other.data
+
+    def __hash__(self):
+        return hash((self.data, self.length))
+
+    def __str__(self):
+        return self.to_string()
+
+    def __repr__(self):
+        preview = self.to_string('')[:32]
+        return f"BitSequence({preview!r}{'...' if self.length > 32 else ''}, length={self.length})"
@@ -0,0 +1,206 @@
+# 按内容寻址的磁盘缓存 (文本 -> WAV, WAV -> 文本)
+# -*- coding: utf-8 -*-
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+from instrument import count, get_logger
+
+logger = get_logger("cache")
+
+# --- Cache Configuration ---
+CACHE_DIR = os.environ.get("SBA_CACHE_DIR") or os.path.join(os.path.expanduser("~"), ".cache", "sba")
+CACHE_MAX_BYTES = 2 << 30 # Least recently used entries are evicted above this total size (2 GiB)
+CACHE_LINK_MODE = "copy" # "copy" or "hardlink" (see ContentCache)
+CACHE_VERSION = 1 # Bump when an output format changes, so old entries stop matching
+
+
+def file_digest(path, block_size=1 << 20):
+    """sha256 hex digest of a file's bytes, read in blocks."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as infile:
+        for block in iter(lambda: infile.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class ContentCache:
+    """
+    On-disk cache of finished outputs, keyed by the sha256 of the input plus every
+    parameter that affects the output (see make_key).
+
+    Entries are plain files under `directory`, written atomically (temp file + rename),
+    so several processes can share one cache. Recency is the entry's modification time,
+    refreshed on every hit; when the total size exceeds max_bytes the least recently
+    used entries are deleted.
+
+    link_mode "copy" hands out private copies. "hardlink" makes a hit cost one link
+    instead of a copy, but the output then shares its inode with the cache entry: the
+    entries are made read-only, and outputs must be replaced, not rewritten in place.
+    """
+
+    def __init__(self, directory=None, max_bytes=CACHE_MAX_BYTES, link_mode=CACHE_LINK_MODE):
+        if link_mode not in ("copy", "hardlink"):
+            raise ValueError(f"未知的缓存链接方式 '{link_mode}'，可选 'copy' 或 'hardlink'")
+        self.directory = directory or CACHE_DIR
+        self.max_bytes = max_bytes
+        self.link_mode = link_mode
+
+    @staticmethod
+    def make_key(digest, **params):
+        """Combines an input digest and the output-affecting parameters into one key."""
+        material = json.dumps({"version": CACHE_VERSION, "input": digest, **params}, sort_keys=True, default=str)
+        return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+    def path_for(self, key, kind):
+        """Location of the `kind` entry ("wav", "bin", "txt", ...) for a key."""
+        return os.path.join(self.directory, key[:2], f"{key}.{kind}")
+
+    def fetch(self, key, kind, target_path):
+        """
+        Materializes a cached entry at target_path (copy or hard link).
+
+        Returns:
+            bool: True on a hit, False if there is no such entry.
+        """
+        entry = self.path_for(key, kind)
+        try:
+            target_dir = os.path.dirname(target_path)
+            if target_dir:
+                os.makedirs(target_dir, exist_ok=True)
+            if self.link_mode == "hardlink":
+                if os.path.lexists(target_path):
+                    os.remove(target_path)
+                os.link(entry, target_path)
+            else:
+                shutil.copyfile(entry, target_path)
+            os.utime(entry) # Mark as recently used
+        except FileNotFoundError:
+            count("cache_misses")
+            return False
+        except OSError as e:
+            logger.warning(f"警告: 读取缓存条目失败 ({entry}): {e}")
+            count("cache_misses")
+            return False
+        count("cache_hits")
+        return True
+
+    def read_text(self, key, kind="txt"):
+        """Returns a cached text entry, or None on a miss."""
+        entry = self.path_for(key, kind)
+        try:
+            with open(entry, 'r', encoding='utf-8', newline='') as infile:
+                text = infile.read()
+            os.utime(entry)
+        except FileNotFoundError:
+            count("cache_misses")
+            return None
+        except (OSError, UnicodeDecodeError) as e:
+            logger.warning(f"警告: 读取缓存条目失败 ({entry}): {e}")
+            count("cache_misses")
+            return None
+        count("cache_hits")
+        return text
+
+    def store(self, key, kind, source_path):
+        """Copies (or links) a finished output file into the cache."""
+        entry = self.path_for(key, kind)
+        try:
+            with self._atomic_entry(entry) as temp_path:
+                if self.link_mode == "hardlink":
+                    os.remove(temp_path)
+                    os.link(source_path, temp_path)
+                    os.chmod(temp_path, 0o444)
+                else:
+                    shutil.copyfile(source_path, temp_path)
+        except OSError as e:
+            logger.warning(f"警告: 写入缓存失败 ({entry}): {e}")
+            return
+        self.evict()
+
+    def store_text(self, key, text, kind="txt"):
+        """Stores a text entry."""
+        entry = self.path_for(key, kind)
+        try:
+            with self._atomic_entry(entry) as temp_path:
+                with open(temp_path, 'w', encoding='utf-8', newline='') as outfile:
+                    outfile.write(text)
+        except OSError as e:
+            logger.warning(f"警告: 写入缓存失败 ({entry}): {e}")
+            return
+        self.evict()
+
+    def _atomic_entry(self, entry):
+        os.makedirs(os.path.dirname(entry), exist_ok=True)
+        return _AtomicFile(entry)
+
+    def entries(self):
+        """Lists (mtime, size, path) for every entry, oldest first."""
+        found = []
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if name.startswith(".tmp"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError: # Evicted by another process meanwhile
+                    continue
+                found.append((stat.st_mtime, stat.st_size, path))
+        found.sort()
+        return found
+
+    def evict(self):
+        """Deletes least recently used entries until the cache fits in max_bytes."""
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+                count("cache_evictions")
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    def clear(self):
+        """Removes every entry."""
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def size(self):
+        """Total size of all entries in bytes."""
+        return sum(size for _, size, _ in self.entries())
+
+
+class _AtomicFile:
+    """Context manager yielding a temp path that is renamed onto `path` on success."""
+
+    def __init__(self, path):
+        self.path = path
+        fd, self.temp_path = tempfile.mkstemp(prefix=".tmp", dir=os.path.dirname(path))
+        os.close(fd)
+
+    def __enter__(self):
+        return self.temp_path
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            os.replace(self.temp_path, self.path)
+        elif os.path.exists(self.temp_path):
+            os.remove(self.temp_path)
+        return False
+
+
+def resolve_cache(cache):
+    """
+    Normalizes the `cache` argument accepted by the library functions:
+    None/False disables caching, True uses the default cache, and a ContentCache is
+    used as is.
+    """
+    if cache is True:
+        return ContentCache()
+    return cache or None
@@ -0,0 +1,363 @@
+# 统一命令行入口: encode / decode / verify / to-binary / from-binary
+# -*- coding: utf-8 -*-
+
+import time
+
+_STARTED = time.perf_counter() # Start of this module's own imports, for --import-time
+
+import argparse
+import contextlib
+import importlib
+import os
+import sys
+
+from instrument import configure_logging, get_logger, instrumented
+from modem import PROFILES
+
+logger = get_logger("cli")
+
+# --- CLI Configuration ---
+LOG_LEVEL = "WARNING" # Console log level; -v switches to "INFO" (progress messages go to stderr)
+HEAVY_MODULES = ("numpy", "scipy") # Reported by --import-time when a command loaded them
+
+_STARTUP_SECONDS = time.perf_counter() - _STARTED
+_import_times = [] # (module name, seconds, number of modules it loaded), in import order
+
+
+def load(module_name):
+    """
+    Imports a project module on first use and records how long that took.
+
+    Subcommands import what they need through this, so e.g. to-binary never loads numpy
+    or scipy; --import-time reports the recorded times.
+    """
+    before = len(sys.modules)
+    started = time.perf_counter()
+    module = importlib.import_module(module_name)
+    loaded = len(sys.modules) - before
+    if loaded:
+        _import_times.append((module_name, time.perf_counter() - started, loaded))
+    return module
+
+
+def import_time_report():
+    """
+    Formats the recorded import times in the style of `python -X importtime`
+    (cumulative microseconds per deferred import). Run the interpreter with
+    -X importtime for a per-module breakdown.
+    """
+    lines = ["import time: cumulative [us] | modules | deferred import",
+             f"import time: {_STARTUP_SECONDS * 1e6:>15.0f} | {'':>7} | cli (startup)"]
+    for module_name, seconds, loaded in _import_times:
+        lines.append(f"import time: {seconds * 1e6:>15.0f} | {loaded:>7} | {module_name}")
+    heavy = [name for name in HEAVY_MODULES if name in sys.modules]
+    lines.append(f"import time: heavy modules loaded: {', '.join(heavy) or 'none'}")
+    return "\n".join(lines)
+
+
+# --- Helpers ---
+def _read_input(path, encoding):
+    """Reads a whole text input; "-" reads stdin."""
+    if path == "-":
+        with open(sys.stdin.fileno(), 'r', encoding=encoding, closefd=False) as infile:
+            return infile.read()
+    with open(path, 'r', encoding=encoding) as infile:
+        return infile.read()
+
+
+def _write_output(path, text, encoding='utf-8'):
+    """Writes text to a file, or to stdout when path is None or "-"."""
+    if path in (None, "-"):
+        sys.stdout.write(text)
+        sys.stdout.flush()
+        return
+    output_dir = os.path.dirname(path)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+    with open(path, 'w', encoding=encoding) as outfile:
+        outfile.write(text)
+
+
+# --- Subcommands ---
+def cmd_encode(args):
+    """Text file (or stdin, or a batch directory / manifest, or several files to multiplex) -> WAV."""
+    main = load("main")
+    load("audio") # main defers this import to the render itself; load it here so it is timed
+    source = args.input[0] if args.input else main.BATCH_SOURCE or main.SOURCE_TEXT_FILE
+    encoding = args.encoding or main.TEXT_ENCODING
+    profile = args.profile or main.MODEM_PROFILE
+    cache = main.CACHE_ENABLED if args.cache is None else args.cache
+    save_binary = main.SAVE_BINARY_FILE if args.save_binary is None else args.save_binary
+    framing = main.FRAMING_ENABLED if args.framing is None else args.framing
+    compression = main.COMPRESSION if args.compression is None else args.compression
+    if compression == "none":
+        compression = None
+    incremental = main.INCREMENTAL_ENABLED if args.incremental is None else args.incremental
+
+    if len(args.input) > 1:
+        audio_path = args.output or main.FINAL_AUDIO_FILE
+        output_dir = os.path.dirname(audio_path)
+        if output_dir:
+            os.makedirs(output_dir, exist_ok=True)
+        with instrumented() as collector:
+            success = main.run_multiplex_pipeline(args.input, audio_path, encoding, profile, framing, compression)
+        if args.timings:
+            print(collector.summary(), file=sys.stderr)
+        if success:
+            print(audio_path, file=sys.stderr)
+        return 0 if success else 1
+
+    if args.batch or os.path.isdir(source):
+        results = main.run_batch_conversion(source, args.output or main.BATCH_OUTPUT_DIR, encoding, save_binary,
+                                            args.workers or main.BATCH_WORKERS,
+                                            None if args.skip == "none" else (args.skip or main.BATCH_SKIP_MODE),
+                                            profile, cache, framing, compression, incremental)
+        failed = [r for r in results if r["status"] == "failed"]
+        for result in failed:
+            logger.error(f"失败: {result['text']}: {' | '.join(result['error'] or [])}")
+        return 1 if failed else 0
+
+    if args.output:
+        audio_path = args.output
+    elif source == "-":
+        audio_path = main.FINAL_AUDIO_FILE
+    else:
+        audio_path = os.path.splitext(source)[0] + ".wav"
+    output_dir = os.path.dirname(audio_path)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+
+    with instrumented() as collector:
+        success = main.run_conversion_pipeline(source, audio_path, encoding, save_binary, args.binary_output,
+                                               args.stream, profile, cache, framing, compression, incremental)
+    if args.timings:
+        print(collector.summary(), file=sys.stderr)
+    if success:
+        print(audio_path, file=sys.stderr)
+    return 0 if success else 1
+
+
+def cmd_decode(args):
+    """WAV file -> text (stdout or -o)."""
+    translator = load("translator")
+    if args.live:
+        with _open_text_output(args.output) as output:
+            text = translator.decode_live(args.input, output, args.profile, args.backend, channel=args.channel)
+        return 0 if text is not None else 1
+
+    with instrumented() as collector:
+        text = translator.decode_audio_file(args.input, args.output, args.backend, args.workers, args.profile,
+                                            args.cache, args.diagnostics, args.calibrate, args.channel)
+    if args.timings:
+        print(collector.summary(), file=sys.stderr)
+    if text is None:
+        return 1
+    if args.output is None:
+        _write_output(None, text)
+    return 0
+
+
+def _open_text_output(path):
+    """Opens the text output of a live decode: a file, or stdout for None / "-"."""
+    if path in (None, "-"):
+        return contextlib.nullcontext(sys.stdout)
+    output_dir = os.path.dirname(path)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+    return open(path, 'w', encoding='utf-8')
+
+
+def cmd_verify(args):
+    """Text file (or stdin, or a corpus directory / manifest) -> in-memory audio -> bits; reports BER."""
+    loopback = load("loopback")
+    source = args.input
+    options = {"profile": args.profile, "framing": args.framing, "streaming": args.stream,
+               "compression": None if args.compression in (None, "none") else args.compression}
+    if args.snr is not None:
+        options["snr_db"] = args.snr
+    options = {name: value for name, value in options.items() if value is not None}
+
+    if args.batch or os.path.isdir(source):
+        results = loopback.verify_corpus(source, args.encoding, args.workers, **options)
+        for result in results:
+            _write_output(None, _verify_line(result["status"], result["loopback"], result["text"]))
+        totals = loopback.corpus_totals(results)
+        print(f"total: {totals['files']} files, {totals['bit_errors']}/{totals['bits']} bit errors "
+              f"(BER {totals['ber']:.3e}), {totals['bits_per_second']:.0f} bit/s per process, "
+              f"{totals['realtime_factor']:.1f}x realtime", file=sys.stderr)
+        return 0 if all(r["status"] == "ok" for r in results) else 1
+
+    try:
+        text = _read_input(source, args.encoding)
+    except (OSError, UnicodeDecodeError) as e:
+        logger.error(f"错误: 无法读取输入 '{source}': {e}")
+        return 1
+    with instrumented() as collector:
+        try:
+            report = loopback.verify_text(text, args.encoding, **options)
+        except ValueError as e:
+            logger.error(f"错误: {e}")
+            return 1
+    if args.timings:
+        print(collector.summary(), file=sys.stderr)
+    ok = report.bit_errors == 0 and report.text_ok
+    _write_output(None, _verify_line("ok" if ok else "mismatch", report.as_dict(), source))
+    return 0 if ok else 1
+
+
+def _verify_line(status, report, name):
+    """One line of verify output: status, BER, errors / bits, throughput, input."""
+    if report is None:
+        return f"{status:<8} {'-':>9} {'-':>17} {'-':>12} {'-':>8}  {name}\n"
+    errors = f"{report['bit_errors']}/{report['bits']}"
+    return (f"{status:<8} {report['ber']:>9.3e} {errors:>17} {report['bits_per_second']:>8.0f} b/s "
+            f"{report['realtime_factor']:>7.1f}x  {name}\n")
+
+
+def cmd_to_binary(args):
+    """Text -> "01010101 ..." (standard library only)."""
+    scriptor = load("Scriptor")
+    try:
+        text = _read_input(args.input, args.encoding)
+    except (OSError, UnicodeDecodeError) as e:
+        logger.error(f"错误: 无法读取输入 '{args.input}': {e}")
+        return 1
+    binary_string = scriptor.text_to_binary_string(text, args.encoding)
+    if binary_string is None:
+        return 1
+    _write_output(args.output, binary_string + "\n", encoding='ascii')
+    return 0
+
+
+def cmd_from_binary(args):
+    """ "01010101 ..." -> text (standard library only)."""
+    scriptor = load("Scriptor")
+    try:
+        binary_string = _read_input(args.input, 'ascii')
+    except (OSError, UnicodeDecodeError) as e:
+        logger.error(f"错误: 无法读取输入 '{args.input}': {e}")
+        return 1
+    text = scriptor.bits_to_text(binary_string, args.encoding)
+    if text is None:
+        return 1
+    _write_output(args.output, text)
+    return 0
+
+
+def _channel(value):
+    """argparse type of --channel: a channel index, "mix" or "best"."""
+    return value if value in ("mix", "best") else int(value)
+
+
+def _add_global_options(parser, default=None):
+    # Added to every subcommand too (with SUPPRESS defaults), so they work on either side of it
+    flag_default = False if default is None else default
+    parser.add_argument("-v", "--verbose", action="store_true", default=flag_default,
+                        help="log progress messages (INFO) to stderr")
+    parser.add_argument("--log-level", default=default, help=f"console log level (default {LOG_LEVEL})")
+    parser.add_argument("--timings", action="store_true", default=flag_default,
+                        help="print per-phase timings and counters to stderr")
+    parser.add_argument("--import-time", action="store_true", default=flag_default,
+                        help="print how long the deferred imports took to stderr")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="sba", description="Scriptor-Binarius-Auditivus: text <-> binary <-> beep/boop audio.")
+    _add_global_options(parser)
+    commands = parser.add_subparsers(dest="command", required=True)
+    profiles = sorted(PROFILES)
+
+    encode = commands.add_parser("encode", help="text -> WAV")
+    encode.add_argument("input", nargs="*",
+                        help="text file, '-' for stdin, or a directory / manifest to render in batch "
+                             "(default: main.SOURCE_TEXT_FILE); several files are multiplexed into one WAV, "
+                             "one per subchannel of an FDM profile (e.g. --profile fdm8)")
+    encode.add_argument("-o", "--output", help="WAV file (batch: output directory); default next to the input")
+    encode.add_argument("--encoding", help="text encoding (default: main.TEXT_ENCODING)")
+    encode.add_argument("--profile", choices=profiles, help="modem profile (default: main.MODEM_PROFILE)")
+    encode.add_argument("--save-binary", action=argparse.BooleanOptionalAction,
+                        help="also write the .bin.txt file (default: main.SAVE_BINARY_FILE)")
+    encode.add_argument("--binary-output", help="path of the .bin.txt file")
+    encode.add_argument("--stream", action=argparse.BooleanOptionalAction,
+                        help="force (or disable) the streaming pipeline; default depends on the input size")
+    encode.add_argument("--cache", action=argparse.BooleanOptionalAction,
+                        help="reuse earlier renders from the content cache (default: main.CACHE_ENABLED)")
+    encode.add_argument("--framing", action=argparse.BooleanOptionalAction,
+                        help="render error-corrected frames (default: main.FRAMING_ENABLED)")
+    encode.add_argument("--compression", choices=("zlib", "bz2", "lzma", "none"),
+                        help="compress the text bytes before rendering (default: main.COMPRESSION)")
+    encode.add_argument("--incremental", action=argparse.BooleanOptionalAction,
+                        help="patch only the changed samples of an earlier render, using the manifest next to "
+                             "the WAV (default: main.INCREMENTAL_ENABLED)")
+    encode.add_argument("--batch", action="store_true", help="treat the input as a batch manifest file")
+    encode.add_argument("--workers", type=int, help="batch worker processes")
+    encode.add_argument("--skip", choices=("mtime", "hash", "none"), help="batch skip mode")
+    _add_global_options(encode, argparse.SUPPRESS)
+    encode.set_defaults(handler=cmd_encode)
+
+    decode = commands.add_parser("decode", help="WAV -> text")
+    decode.add_argument("input", help="WAV file ('-' with --live: raw 16-bit PCM on stdin)")
+    decode.add_argument("-o", "--output", help="text file (default: stdout)")
+    decode.add_argument("--profile", choices=profiles, help="modem profile (default: from the WAV metadata)")
+    decode.add_argument("--backend", choices=("dft", "fft"), help="bit classifier backend")
+    decode.add_argument("--workers", type=int, help="decode with this many processes")
+    decode.add_argument("--channel", type=_channel, metavar="N|mix|best",
+                        help="channel to decode: an index, 'mix' or 'best' by SNR (default: translator.CHANNEL_MODE)")
+    decode.add_argument("--live", action="store_true", help="follow a growing file and print text as it arrives")
+    decode.add_argument("--cache", action="store_true", help="reuse text decoded earlier from the same WAV bytes")
+    decode.add_argument("--diagnostics", metavar="NPY",
+                        help="save per-symbol energies, SNR and confidence to this .npy file")
+    decode.add_argument("--calibrate", action=argparse.BooleanOptionalAction,
+                        help="calibrate the amplitude threshold on the recording (default: translator.AUTO_CALIBRATE)")
+    _add_global_options(decode, argparse.SUPPRESS)
+    decode.set_defaults(handler=cmd_decode)
+
+    verify = commands.add_parser("verify", help="text -> audio -> text in memory; report bit error rate and throughput")
+    verify.add_argument("input", help="text file, '-' for stdin, or a directory / manifest to verify as a corpus")
+    verify.add_argument("--encoding", default="utf-8", help="text encoding (default utf-8)")
+    verify.add_argument("--profile", choices=profiles, help="modem profile (default: the audio module constants, i.e. classic)")
+    verify.add_argument("--framing", action=argparse.BooleanOptionalAction,
+                        help="send error-corrected frames (default off)")
+    verify.add_argument("--compression", choices=("zlib", "bz2", "lzma", "none"),
+                        help="compress the text bytes before rendering (default none)")
+    verify.add_argument("--stream", action=argparse.BooleanOptionalAction,
+                        help="decode block by block (default: loopback.LOOPBACK_STREAMING); "
+                             "--no-stream decodes one buffer with symbol sync")
+    verify.add_argument("--snr", type=float, metavar="DB", help="add white noise at this SNR in dB")
+    verify.add_argument("--batch", action="store_true", help="treat the input as a manifest file")
+    verify.add_argument("--workers", type=int, help="corpus worker processes")
+    _add_global_options(verify, argparse.SUPPRESS)
+    verify.set_defaults(handler=cmd_verify)
+
+    to_binary = commands.add_parser("to-binary", help="text -> '01010101 ...'")
+    to_binary.add_argument("input", nargs="?", default="-", help="text file (default: stdin)")
+    to_binary.add_argument("-o", "--output", help="output file (default: stdout)")
+    to_binary.add_argument("--encoding", default="utf-8", help="text encoding (default utf-8)")
+    _add_global_options(to_binary, argparse.SUPPRESS)
+    to_binary.set_defaults(handler=cmd_to_binary)
+
+    from_binary = commands.add_parser("from-binary", help="'01010101 ...' -> text")
+    from_binary.add_argument("input", nargs="?", default="-", help="binary text file (default: stdin)")
+    from_binary.add_argument("-o", "--output", help="output file (default: stdout)")
+    from_binary.add_argument("--encoding", default="utf-8", help="text encoding (default utf-8)")
+    _add_global_options(from_binary, argparse.SUPPRESS)
+    from_binary.set_defaults(handler=cmd_from_binary)
+    return parser
+
+
+def main(argv=None):
+    """Runs the CLI; returns the process exit code."""
+    args = build_parser().parse_args(argv)
+    configure_logging(args.log_level or ("INFO" if args.verbose else LOG_LEVEL), stream=sys.stderr)
+    try:
+        status = args.handler(args)
+    except KeyboardInterrupt:
+        status = 130
+    if args.import_time:
+        print(import_time_report(), file=sys.stderr)
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,188 @@
+# 压缩层: 调制前用标准库压缩字节，减少需要合成、存储和分析的比特数
+# -*- coding: utf-8 -*-
+
+import bz2
+import lzma
+import zlib
+
+from bitseq import BitSequence
+from instrument import count, get_logger
+
+logger = get_logger("compression")
+
+# --- Compression Configuration ---
+CODECS = ("zlib", "bz2", "lzma") # Codecs that can be selected (all from the standard library)
+COMPRESSION_LEVELS = {"zlib": 9, "bz2": 9, "lzma": 6} # Level (lzma: preset) used when none is given
+DECOMPRESS_CHUNK_BYTES = 256 # Compressed bytes per decompressor call; bounds what damaged data costs
+
+# The compressed payload starts with one header byte naming the codec, so the decoder
+# needs nothing else to undo it. "stored" marks data that did not get smaller.
+_HEADERS = {"stored": b'N', "zlib": b'Z', "bz2": b'B', "lzma": b'X'}
+_CODEC_OF_HEADER = {header: codec for codec, header in _HEADERS.items()}
+
+
+def _compressor(codec, level=None):
+    if codec not in CODECS:
+        raise ValueError(f"未知的压缩算法: {codec} (可选 {', '.join(CODECS)})")
+    level = COMPRESSION_LEVELS[codec] if level is None else level
+    if codec == "zlib":
+        return zlib.compressobj(level)
+    if codec == "bz2":
+        return bz2.BZ2Compressor(level)
+    return lzma.LZMACompressor(preset=level)
+
+
+def _decompressor(codec):
+    """The decompressor object for a codec (None for stored data)."""
+    if codec == "zlib":
+        return zlib.decompressobj()
+    if codec == "bz2":
+        return bz2.BZ2Decompressor()
+    if codec == "lzma":
+        return lzma.LZMADecompressor()
+    return None
+
+
+def compress_bytes(data, codec, level=None):
+    """
+    Compresses bytes into a header byte followed by the codec's stream.
+
+    Data that does not get smaller (e.g. a short text) is stored as it is, behind the
+    "stored" header, so enabling compression never costs more than one byte.
+
+    Raises:
+        ValueError: If codec is not one of CODECS.
+    """
+    compressor = _compressor(codec, level)
+    packed = compressor.compress(data) + compressor.flush()
+    if len(packed) < len(data):
+        result = _HEADERS[codec] + packed
+    else:
+        codec, result = "stored", _HEADERS["stored"] + data
+    _log_ratio(codec, len(data), len(result))
+    return result
+
+
+def iter_compressed_bits(bit_chunks, codec, level=None):
+    """
+    Streaming compress_bytes: compresses byte-aligned BitSequence chunks (as produced by
+    Scriptor.iter_text_bits) as they arrive and yields the compressed stream as
+    byte-aligned BitSequence chunks. The compressors buffer internally, so output comes
+    in bursts; there is no "stored" fallback because the total size is not known in
+    advance.
+    """
+    compressor = _compressor(codec, level)
+    plain_bytes = 0
+    packed_bytes = 1
+    yield BitSequence.from_bytes(_HEADERS[codec])
+    for bits in bit_chunks:
+        data = bits.to_bytes()
+        plain_bytes += len(data)
+        data = compressor.compress(data)
+        if data:
+            packed_bytes += len(data)
+            yield BitSequence.from_bytes(data)
+    data = compressor.flush()
+    packed_bytes += len(data)
+    if data:
+        yield BitSequence.from_bytes(data)
+    _log_ratio(codec, plain_bytes, packed_bytes)
+
+
+def _log_ratio(codec, plain_bytes, packed_bytes):
+    count("compression_input_bytes", plain_bytes)
+    count("compression_output_bytes", packed_bytes)
+    ratio = f"{plain_bytes / packed_bytes:.2f}×" if packed_bytes else "-"
+    logger.info(f"压缩 ({codec}): {plain_bytes} -> {packed_bytes} 字节 ({ratio})")
+
+
+class Decompressor:
+    """
+    Incremental decompressor for the output of compress_bytes / iter_compressed_bits:
+    feed() takes compressed bytes as they are decoded and returns the plain bytes
+    available so far. The first byte selects the codec; bytes after the end of the
+    compressed stream (padding bits) are ignored.
+    """
+
+    def __init__(self):
+        self.codec = None
+        self._inner = None
+
+    def feed(self, data):
+        """
+        Raises:
+            ValueError: If the header is unknown or the stream is corrupt.
+        """
+        if not data:
+            return b''
+        if self.codec is None:
+            header, data = data[:1], data[1:]
+            if header not in _CODEC_OF_HEADER:
+                raise ValueError(f"未知的压缩头字节: {header!r}")
+            self.codec = _CODEC_OF_HEADER[header]
+            self._inner = _decompressor(self.codec)
+        if self._inner is None:
+            return data
+        if self._inner.eof:
+            return b''
+        try:
+            return self._inner.decompress(data)
+        except (zlib.error, lzma.LZMAError, OSError, EOFError) as e:
+            raise ValueError(f"压缩数据损坏 ({self.codec}): {e}") from e
+
+    @property
+    def complete(self):
+        """Whether the end of the compressed stream has been reached."""
+        return self.codec is not None and (self._inner is None or self._inner.eof)
+
+
+def decompress_bytes(data):
+    """
+    Undoes compress_bytes / iter_compressed_bits.
+
+    Damaged or truncated input does not raise: whatever was decompressed before the
+    damage was detected is returned and a warning is logged. Detection can lag (zlib
+    only checks its checksum at the end, bz2 works in 900 kB blocks), so enable framing
+    on noisy channels; a frame that is lost anyway still ends the usable stream there.
+
+    Returns:
+        bytes: The plain bytes.
+
+    Raises:
+        ValueError: If the header byte names no known codec.
+    """
+    decompressor = Decompressor()
+    pieces = []
+    try:
+        for start in range(0, len(data), DECOMPRESS_CHUNK_BYTES):
+            pieces.append(decompressor.feed(data[start:start + DECOMPRESS_CHUNK_BYTES]))
+    except ValueError as e:
+        if decompressor.codec is None:
+            raise
+        logger.warning(f"警告: {e}")
+    plain = b''.join(pieces)
+    count("decompressed_bytes", len(plain))
+    if data and not decompressor.complete:
+        logger.warning(f"警告: 压缩数据不完整或已损坏，只恢复了前 {len(plain)} 字节。")
+    return plain
+
+
+def compression_metadata(codec):
+    """Metadata fields identifying compressed audio (see modem.format_metadata)."""
+    return {"compression": codec}
+
+
+def compression_from_metadata(fields):
+    """
+    Returns the codec recorded in WAV metadata fields, or None if the payload is not
+    compressed.
+
+    Raises:
+        ValueError: If the metadata names a codec this version does not know.
+    """
+    codec = (fields or {}).get("compression")
+    if codec is None:
+        return None
+    if codec not in CODECS:
+        raise ValueError(f"未知的压缩算法: {codec}")
+    return codec
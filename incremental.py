@@ -0,0 +1,229 @@
+# 增量渲染: 源文本小改动时只重写受影响的采样区间，而不是重新合成整个 WAV
+# -*- coding: utf-8 -*-
+
+import base64
+import json
+import os
+import zlib
+
+import numpy as np
+
+from audio import active_profile, synthesize_pcm, synthesized_frames
+from bitseq import format_binary_string
+from instrument import count, get_logger
+
+logger = get_logger("incremental")
+
+# --- Incremental Rendering Configuration ---
+MANIFEST_SUFFIX = ".manifest.json" # Sidecar next to the WAV (like the batch ".sha256" sidecar)
+MANIFEST_VERSION = 1 # Bump when the manifest layout or the rendering changes
+BLOCK_BYTES = 256 # Bytes per checksummed block; a changed block is re-rendered as a whole
+
+# Every symbol period of the WAV is rendered from its own bits only (table lookup, no
+# state carried between symbols), and period p starts at the fixed sample
+# p * cycle_samples - silence_samples. So as long as the payload keeps its length, the
+# samples of unchanged blocks are already correct and changed blocks can be overwritten
+# in place. The same holds for the .bin.txt file: byte i is the 8 characters at 9 * i.
+
+
+def manifest_path(audio_filepath):
+    """Location of the manifest that belongs to a WAV file."""
+    return audio_filepath + MANIFEST_SUFFIX
+
+
+def render_parameters(encoding, profile, framing):
+    """Everything besides the text that determines the rendered samples, as JSON values."""
+    return json.loads(json.dumps({"encoding": encoding, "profile": active_profile(profile)._asdict(),
+                                  "framing": bool(framing)}))
+
+
+def block_checksums(data, block_bytes=BLOCK_BYTES):
+    """CRC-32 of every block_bytes block of data (the last block may be shorter)."""
+    view = memoryview(data)
+    return np.array([zlib.crc32(view[start:start + block_bytes]) for start in range(0, len(view), block_bytes)],
+                    dtype='<u4')
+
+
+def _pack_checksums(checksums):
+    return base64.b64encode(checksums.astype('<u4').tobytes()).decode('ascii')
+
+
+def _unpack_checksums(text):
+    return np.frombuffer(base64.b64decode(text), dtype='<u4')
+
+
+def _file_state(path):
+    """Size and modification time, to notice outputs rewritten behind the manifest's back."""
+    stat = os.stat(path)
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def build_manifest(source_digest, parameters, text_bits, payload, audio_filepath, binary_filepath=None,
+                   block_bytes=BLOCK_BYTES):
+    """
+    Describes a finished render: the source digest, the rendering parameters, block
+    checksums of the text and payload bytes, and the state of the output files.
+
+    Args:
+        source_digest (str): sha256 of the source file (cache.file_digest).
+        parameters (dict): render_parameters(...).
+        text_bits (BitSequence): The encoded text (what the .bin.txt file holds).
+        payload (BitSequence): The bits that were rendered (the text, framed or not).
+        audio_filepath (str): The WAV file.
+        binary_filepath (str | None): The .bin.txt file, if one was written.
+    """
+    return {
+        "version": MANIFEST_VERSION,
+        "complete": True,
+        "source": source_digest,
+        "parameters": parameters,
+        "block_bytes": block_bytes,
+        "text_bytes": len(text_bits) // 8,
+        "text_blocks": _pack_checksums(block_checksums(text_bits.data, block_bytes)),
+        "payload_bits": len(payload),
+        "payload_blocks": _pack_checksums(block_checksums(payload.data, block_bytes)),
+        "audio": _file_state(audio_filepath),
+        "binary": dict(path=os.path.abspath(binary_filepath), **_file_state(binary_filepath)) if binary_filepath else None,
+    }
+
+
+def write_manifest(audio_filepath, manifest):
+    """Writes the manifest atomically (temp file + rename)."""
+    path = manifest_path(audio_filepath)
+    temp_path = path + ".tmp"
+    with open(temp_path, 'w', encoding='utf-8') as outfile:
+        json.dump(manifest, outfile)
+    os.replace(temp_path, path)
+
+
+def load_manifest(audio_filepath, parameters, binary_filepath=None):
+    """
+    Reads the manifest of a WAV file and checks that it still describes the outputs on
+    disk with these parameters.
+
+    Returns:
+        dict | None: The manifest, or None (with the reason logged) if the outputs need a
+                     full render.
+    """
+    path = manifest_path(audio_filepath)
+    try:
+        with open(path, 'r', encoding='utf-8') as infile:
+            manifest = json.load(infile)
+    except FileNotFoundError:
+        logger.info(f"增量模式: 未找到清单文件 {path}，执行完整渲染。")
+        return None
+    except (OSError, ValueError) as e:
+        logger.warning(f"警告: 无法读取清单文件 {path}: {e}，执行完整渲染。")
+        return None
+
+    reason = None
+    if manifest.get("version") != MANIFEST_VERSION:
+        reason = "清单版本不同"
+    elif not manifest.get("complete"):
+        reason = "上一次增量更新未完成"
+    elif manifest.get("parameters") != parameters or manifest.get("block_bytes") != BLOCK_BYTES:
+        reason = "渲染参数已改变"
+    elif not os.path.exists(audio_filepath) or _file_state(audio_filepath) != manifest.get("audio"):
+        reason = "WAV 文件已被替换或修改"
+    elif any(os.stat(output).st_nlink > 1 for output in (audio_filepath, binary_filepath) if output and os.path.exists(output)):
+        reason = "输出文件是硬链接 (可能与缓存条目共享)，不能原地修改"
+    elif binary_filepath:
+        recorded = manifest.get("binary")
+        if (not recorded or recorded.get("path") != os.path.abspath(binary_filepath) or not os.path.exists(binary_filepath)
+                or _file_state(binary_filepath) != {key: recorded.get(key) for key in ("size", "mtime_ns")}):
+            reason = "二进制文本文件与清单不符"
+    if reason:
+        logger.info(f"增量模式: {reason}，执行完整渲染。")
+        return None
+    return manifest
+
+
+def changed_blocks(manifest, key, data):
+    """Indices of the blocks of data whose checksum differs from the manifest's `key` list."""
+    old = _unpack_checksums(manifest[key])
+    new = block_checksums(data, manifest["block_bytes"])
+    if len(old) != len(new):
+        raise ValueError("块数不同，无法增量更新")
+    return np.flatnonzero(old != new)
+
+
+def _block_runs(blocks):
+    """Groups sorted block indices into (first, last + 1) runs of consecutive blocks."""
+    if not len(blocks):
+        return []
+    breaks = np.flatnonzero(np.diff(blocks) > 1)
+    starts = np.concatenate(([blocks[0]], blocks[breaks + 1]))
+    stops = np.concatenate((blocks[breaks], [blocks[-1]])) + 1
+    return list(zip(starts.tolist(), stops.tolist()))
+
+
+def patch_audio(audio_filepath, payload, blocks, profile, block_bytes=BLOCK_BYTES):
+    """
+    Re-renders the symbol periods covering the given payload blocks and overwrites
+    their samples in the WAV file.
+
+    Args:
+        audio_filepath (str): WAV file rendered from a payload of the same length.
+        payload (BitSequence): The new payload.
+        blocks (np.ndarray): Indices of the changed block_bytes blocks of payload.
+        profile (str | ModemProfile): The profile the WAV was rendered with.
+
+    Returns:
+        int: Number of samples rewritten.
+
+    Raises:
+        ValueError: If the WAV does not have the expected format or length.
+    """
+    from translator import read_wav_format # Deferred: translator is only needed to locate the samples
+    profile = active_profile(profile)
+    period_bits = profile.bits_per_period
+    packed = np.frombuffer(payload.data, dtype=np.uint8)
+    rewritten = 0
+    with open(audio_filepath, 'r+b') as wav_file:
+        sample_rate, channels, dtype, _ = read_wav_format(wav_file)
+        data_offset = wav_file.tell()
+        # The file size, not the data chunk size, which saturates above 4 GiB (WAV_MAX_DATA_BYTES)
+        if (sample_rate, channels, dtype) != (profile.sample_rate, 1, np.dtype('<i2')) or \
+                os.fstat(wav_file.fileno()).st_size != data_offset + synthesized_frames(len(payload), profile) * 2:
+            raise ValueError("WAV 文件的格式或长度与清单不符")
+        for first, stop in _block_runs(blocks):
+            # Widen the changed bits to whole symbol periods
+            first_period = first * block_bytes * 8 // period_bits
+            stop_period = -(-min(len(payload), stop * block_bytes * 8) // period_bits)
+            start_bit = first_period * period_bits
+            stop_bit = min(len(payload), stop_period * period_bits)
+            bits = np.unpackbits(packed[start_bit // 8:-(-stop_bit // 8)], count=stop_bit - start_bit // 8 * 8)
+            pcm = synthesize_pcm(bits[start_bit % 8:], leading_silence=first_period > 0, profile=profile)
+            offset = max(0, first_period * profile.cycle_samples - profile.silence_samples)
+            wav_file.seek(data_offset + offset * 2)
+            wav_file.write(pcm.astype('<i2').tobytes())
+            rewritten += len(pcm)
+    count("samples_patched", rewritten)
+    return rewritten
+
+
+def patch_binary_file(binary_filepath, text_bits, blocks, block_bytes=BLOCK_BYTES):
+    """
+    Overwrites the given blocks of a .bin.txt file ("01010101 ..." text, byte i at
+    character 9 * i) with the new text bits.
+
+    Returns:
+        int: Number of bytes rewritten.
+    """
+    data = text_bits.data
+    rewritten = 0
+    with open(binary_filepath, 'r+b') as outfile:
+        for first, stop in _block_runs(blocks):
+            start, end = first * block_bytes, min(len(data), stop * block_bytes)
+            outfile.seek(start * 9)
+            outfile.write(format_binary_string(data[start:end]).encode('ascii'))
+            rewritten += end - start
+    return rewritten
+
+
+def mark_incomplete(audio_filepath, manifest):
+    """
+    Flags the manifest before the outputs are patched, so an interrupted update forces a
+    full render next time instead of trusting half-written outputs.
+    """
+    write_manifest(audio_filepath, dict(manifest, complete=False))
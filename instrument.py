@@ -0,0 +1,168 @@
+# 日志与性能计量 (logging, phase timings, counters, progress)
+# -*- coding: utf-8 -*-
+
+import contextlib
+import contextvars
+import logging
+import sys
+import time
+
+# --- Configuration ---
+LOGGER_NAME = "sba" # Parent logger of every module (sba.audio, sba.translator, ...)
+LOG_FORMAT = "%(message)s" # Console output looks like the old print() output
+LOG_LEVEL = logging.INFO
+
+# Library modules never print; without configure_logging() their messages go nowhere
+logging.getLogger(LOGGER_NAME).addHandler(logging.NullHandler())
+
+
+def get_logger(module_name):
+    """Returns the logger for a module, e.g. get_logger("audio") -> 'sba.audio'."""
+    return logging.getLogger(f"{LOGGER_NAME}.{module_name}")
+
+
+def configure_logging(level=LOG_LEVEL, stream=None):
+    """
+    Sends log messages to the console (stdout by default, or `stream`). Meant for the
+    `__main__` entry points; calling it again replaces the previous console handler.
+    """
+    logger = logging.getLogger(LOGGER_NAME)
+    for handler in [h for h in logger.handlers if getattr(h, "_sba_console", False)]:
+        logger.removeHandler(handler)
+    handler = logging.StreamHandler(stream or sys.stdout)
+    handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    handler._sba_console = True
+    logger.addHandler(handler)
+    logger.setLevel(level)
+    return logger
+
+
+class _ListHandler(logging.Handler):
+    def __init__(self, records):
+        super().__init__()
+        self.records = records
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+@contextlib.contextmanager
+def capture_logs(level=logging.DEBUG):
+    """
+    Diverts all sba.* log records into a list for the duration of the block, instead of
+    the configured handlers (used by worker processes so parallel output does not
+    interleave).
+
+    Yields:
+        list[logging.LogRecord]: The captured records.
+    """
+    logger = logging.getLogger(LOGGER_NAME)
+    records = []
+    handler = _ListHandler(records)
+    handler.setLevel(level)
+    saved_handlers, saved_level, saved_propagate = logger.handlers[:], logger.level, logger.propagate
+    logger.handlers = [handler]
+    logger.setLevel(level)
+    logger.propagate = False
+    try:
+        yield records
+    finally:
+        logger.handlers = saved_handlers
+        logger.setLevel(saved_level)
+        logger.propagate = saved_propagate
+
+
+# --- Instrumentation ---
+class Instrumentation:
+    """
+    Collects per-phase wall-clock timings and counters for one run.
+
+    Activated with `instrumented()`; while none is active, phase() / count() /
+    progress() return immediately, so instrumented code costs next to nothing.
+    """
+
+    def __init__(self, progress=None):
+        self.timings = {}    # phase name -> seconds (summed if a phase runs repeatedly)
+        self.counters = {}   # counter name -> total
+        self.progress = progress # Optional callback(stage, done, total)
+
+    def report(self):
+        """Returns the collected timings and counters as a plain dict."""
+        return {"timings": dict(self.timings), "counters": dict(self.counters)}
+
+    def summary(self):
+        """One-line human readable summary."""
+        timings = ", ".join(f"{name} {seconds:.3f} 秒" for name, seconds in self.timings.items())
+        counters = ", ".join(f"{name}={value}" for name, value in self.counters.items())
+        return f"阶段耗时: {timings or '无'}; 计数: {counters or '无'}"
+
+
+_active = contextvars.ContextVar("sba_instrumentation", default=None)
+
+
+@contextlib.contextmanager
+def instrumented(progress=None):
+    """
+    Activates a fresh Instrumentation for the block (per thread / asyncio task).
+
+    Args:
+        progress (callable | None): Called as progress(stage, done, total) by long
+                                    running loops (synthesis, decoding).
+
+    Yields:
+        Instrumentation: The collector; read its timings/counters after the block.
+    """
+    collector = Instrumentation(progress)
+    token = _active.set(collector)
+    try:
+        yield collector
+    finally:
+        _active.reset(token)
+
+
+def active():
+    """The Instrumentation of the current context, or None."""
+    return _active.get()
+
+
+class _Phase:
+    __slots__ = ("collector", "name", "started")
+
+    def __init__(self, collector, name):
+        self.collector = collector
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        elapsed = time.perf_counter() - self.started
+        timings = self.collector.timings
+        timings[self.name] = timings.get(self.name, 0.0) + elapsed
+        return False
+
+
+_NO_PHASE = contextlib.nullcontext()
+
+
+def phase(name):
+    """Context manager timing the enclosed block as phase `name` (no-op when inactive)."""
+    collector = _active.get()
+    if collector is None:
+        return _NO_PHASE
+    return _Phase(collector, name)
+
+
+def count(name, amount=1):
+    """Adds `amount` to counter `name` (no-op when inactive)."""
+    collector = _active.get()
+    if collector is not None:
+        collector.counters[name] = collector.counters.get(name, 0) + amount
+
+
+def progress(stage, done, total=None):
+    """Reports progress of a long loop to the active progress callback, if any."""
+    collector = _active.get()
+    if collector is not None and collector.progress is not None:
+        collector.progress(stage, done, total)
@@ -0,0 +1,332 @@
+# 回环校验: 合成的 PCM 直接在内存中交给解码器，不经过磁盘，报告误码率与吞吐量
+# -*- coding: utf-8 -*-
+
+import itertools
+import logging
+import os
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from Scriptor import text_to_bits
+from audio import PCM_SCALE, STREAM_CHUNK_BITS, active_profile, align_to_symbols, iter_bit_chunks, synthesize_pcm, \
+    synthesized_frames
+from bitseq import BitSequence
+from compression import compress_bytes, decompress_bytes
+from framing import frame_bytes, unframe_bits
+from instrument import capture_logs, count, get_logger, instrumented, phase
+from main import collect_batch_jobs
+from translator import StreamingDecoder, decode_audio_to_bits, normalization_scale
+
+logger = get_logger("loopback")
+
+# --- Loopback Configuration ---
+LOOPBACK_CHUNK_BITS = STREAM_CHUNK_BITS # Bits synthesized per PCM block handed to the streaming decoder
+LOOPBACK_STREAMING = True # Decode block by block (bounded memory); False decodes one whole in-memory buffer
+LOOPBACK_SNR_DB = None # Add white noise at this SNR (dB, relative to the tone power); None keeps the signal clean
+LOOPBACK_SEED = 1234 # Noise is generated deterministically so runs are comparable
+LOOPBACK_WORKERS = None # Worker processes for verify_corpus; None uses os.cpu_count()
+
+
+# --- Report ---
+_LoopbackReportBase = namedtuple(
+    "_LoopbackReportBase",
+    ["bits", "bit_errors", "text_ok", "samples", "sample_rate", "synth_seconds", "decode_seconds"],
+)
+
+
+class LoopbackReport(_LoopbackReportBase):
+    """
+    Result of one loopback run.
+
+    bits: payload bits sent (after compression and framing).
+    bit_errors: sent bits that were decoded wrongly or not at all.
+    text_ok: whether the text recovered from the decoded bits equals the input.
+    samples: PCM samples synthesized and decoded, at sample_rate.
+    synth_seconds / decode_seconds: wall-clock time spent in each half of the loop.
+    """
+
+    __slots__ = ()
+
+    @property
+    def ber(self):
+        """Bit error rate (0.0 for an empty payload)."""
+        return self.bit_errors / self.bits if self.bits else 0.0
+
+    @property
+    def audio_seconds(self):
+        return self.samples / self.sample_rate
+
+    @property
+    def seconds(self):
+        return self.synth_seconds + self.decode_seconds
+
+    @property
+    def bits_per_second(self):
+        """Payload bits pushed through synthesis and decoding per wall-clock second."""
+        return self.bits / self.seconds if self.seconds else 0.0
+
+    @property
+    def realtime_factor(self):
+        """Seconds of audio verified per wall-clock second."""
+        return self.audio_seconds / self.seconds if self.seconds else 0.0
+
+    def as_dict(self):
+        """The fields plus the derived figures, as a plain (picklable, JSON-ready) dict."""
+        return {**self._asdict(), "ber": self.ber, "audio_seconds": self.audio_seconds,
+                "bits_per_second": self.bits_per_second, "realtime_factor": self.realtime_factor}
+
+
+# --- Loopback ---
+def payload_bits(text, encoding='utf-8', framing=False, compression=None):
+    """
+    The bits the encoder renders for a text: Scriptor bits, then the optional
+    compression and framing stages, exactly as main.run_conversion_pipeline applies them.
+
+    Raises:
+        ValueError: If the text cannot be encoded or the codec is unknown.
+    """
+    bits = text_to_bits(text, encoding)
+    if bits is None:
+        raise ValueError(f"无法使用 '{encoding}' 对文本进行编码")
+    if compression:
+        bits = BitSequence.from_bytes(compress_bytes(bits.to_bytes(), compression))
+    if framing:
+        bits = frame_bytes(bits.to_bytes())
+    return bits
+
+
+def recover_text(bits, encoding='utf-8', framing=False, compression=None):
+    """Undoes payload_bits on decoded bits (damaged parts become U+FFFD or are lost)."""
+    if framing:
+        data = unframe_bits(bits).data
+    else:
+        data = bits.to_bytes()[:len(bits) // 8]
+    if compression:
+        data = decompress_bytes(data)
+    return data.decode(encoding, errors='replace')
+
+
+def add_noise(pcm, snr_db, amplitude, rng):
+    """
+    Adds white Gaussian noise to 16-bit PCM.
+
+    Args:
+        snr_db (float): Ratio of the tone power (amplitude**2 / 2) to the noise power.
+        amplitude (float): Tone amplitude of the profile (0.0 to 1.0).
+        rng (np.random.Generator): Noise source.
+
+    Returns:
+        np.ndarray: int16 samples, clipped to the 16-bit range.
+    """
+    sigma = amplitude * PCM_SCALE / np.sqrt(2) * 10 ** (-snr_db / 20)
+    noisy = pcm + rng.normal(0.0, sigma, len(pcm))
+    return np.clip(np.rint(noisy), -32768, 32767).astype(np.int16)
+
+
+def iter_loopback_pcm(bits, profile, chunk_bits=LOOPBACK_CHUNK_BITS, snr_db=None, seed=LOOPBACK_SEED):
+    """
+    Synthesizes bits chunk by chunk, as audio.binary_string_to_audio_stream does, and
+    yields the int16 blocks instead of writing them to a WAV file. The concatenated
+    blocks equal the samples of the rendered file (plus noise if snr_db is given).
+    """
+    rng = np.random.default_rng(seed) if snr_db is not None else None
+    chunks = align_to_symbols(iter_bit_chunks(bits, chunk_bits), profile.bits_per_period)
+    for index, chunk in enumerate(chunks):
+        with phase("audio"):
+            pcm = synthesize_pcm(chunk, leading_silence=index > 0, profile=profile)
+            if rng is not None:
+                pcm = add_noise(pcm, snr_db, profile.amplitude, rng)
+        yield pcm
+
+
+def verify_text(text, encoding='utf-8', profile=None, framing=False, compression=None, streaming=LOOPBACK_STREAMING,
+                snr_db=LOOPBACK_SNR_DB, chunk_bits=LOOPBACK_CHUNK_BITS, seed=LOOPBACK_SEED):
+    """
+    Renders a text to PCM and decodes it again without touching the disk.
+
+    Args:
+        text (str): The text to send.
+        encoding (str): Text encoding, as for main.run_conversion_pipeline.
+        profile (str | ModemProfile | None): Modem profile, see audio.active_profile.
+        framing (bool): Send error-corrected frames, see framing.frame_bytes.
+        compression (str | None): Compression codec, see compression.CODECS.
+        streaming (bool): Feed the blocks to a translator.StreamingDecoder as they are
+                          synthesized (memory bounded by chunk_bits). False collects
+                          them into one buffer for translator.decode_audio_to_bits, which
+                          also exercises symbol synchronization.
+        snr_db (float | None): Add white noise at this SNR, see add_noise.
+        chunk_bits (int): Bits synthesized per block.
+        seed (int): Noise seed.
+
+    Returns:
+        LoopbackReport
+
+    Raises:
+        ValueError: If the text cannot be encoded, or the profile or codec is unknown.
+    """
+    profile = active_profile(profile)
+    bits = payload_bits(text, encoding, framing, compression)
+    sent = bits.to_array()
+    blocks = iter_loopback_pcm(bits, profile, chunk_bits, snr_db, seed)
+    synth_seconds = decode_seconds = 0.0
+
+    def timed_blocks():
+        nonlocal synth_seconds
+        while True:
+            started = time.perf_counter()
+            pcm = next(blocks, None)
+            synth_seconds += time.perf_counter() - started
+            if pcm is None:
+                return
+            yield pcm
+
+    samples = 0
+    if streaming:
+        decoder = StreamingDecoder(profile.sample_rate, profile, encoding, lock=False)
+        received = np.zeros(len(sent), dtype=np.uint8)
+        decoded = 0
+        for pcm in itertools.chain(timed_blocks(), [None]):
+            started = time.perf_counter()
+            with phase("decode"):
+                got = decoder.finish_bits() if pcm is None else decoder.feed_bits(pcm)
+            decode_seconds += time.perf_counter() - started
+            samples += 0 if pcm is None else len(pcm)
+            got = got[:len(received) - decoded] # Bits padding the last symbol were never sent
+            received[decoded:decoded + len(got)] = got
+            decoded += len(got)
+        received = received[:decoded]
+    else:
+        pcm = np.empty(synthesized_frames(len(bits), profile), dtype=np.int16)
+        for block in timed_blocks():
+            pcm[samples:samples + len(block)] = block
+            samples += len(block)
+        started = time.perf_counter()
+        decoded_bits = None
+        if samples:
+            with phase("decode"):
+                decoded_bits = decode_audio_to_bits(pcm, profile.sample_rate, normalization_scale(pcm.dtype),
+                                                    profile=profile)
+        decode_seconds = time.perf_counter() - started
+        received = decoded_bits.to_array()[:len(sent)] if decoded_bits is not None else sent[:0]
+
+    bit_errors = int(np.count_nonzero(received != sent[:len(received)])) + len(sent) - len(received)
+    recovered = recover_text(BitSequence.from_array(received), encoding, framing, compression)
+    count("loopback_bits", len(sent))
+    count("loopback_bit_errors", bit_errors)
+    report = LoopbackReport(len(sent), bit_errors, recovered == text, samples, profile.sample_rate,
+                            synth_seconds, decode_seconds)
+    logger.info(f"回环校验 ({profile.name}): {report.bits} 位，{report.bit_errors} 个错误 (BER {report.ber:.3e})，"
+                f"文本{'一致' if report.text_ok else '不一致'}；{report.bits_per_second:.0f} 位/秒，"
+                f"{report.realtime_factor:.1f}× 实时。")
+    return report
+
+
+def verify_file(text_filepath, encoding='utf-8', **options):
+    """Reads a text file and runs verify_text on it (options as for verify_text)."""
+    with phase("read"), open(text_filepath, 'r', encoding=encoding) as infile:
+        text = infile.read()
+    return verify_text(text, encoding, **options)
+
+
+def _verify_corpus_job(job):
+    """
+    Worker entry point: verifies one file with its log output captured, like
+    main._convert_batch_job. Never raises; failures are reported in the result.
+    """
+    text_filepath, encoding, options = job
+    started = time.perf_counter()
+    report = error = None
+    try:
+        with capture_logs() as records, instrumented() as collector:
+            result = verify_file(text_filepath, encoding, **options)
+        report = collector.report()
+        status = "ok" if result.bit_errors == 0 and result.text_ok else "mismatch"
+        result = result.as_dict()
+        if status != "ok":
+            error = [record.getMessage() for record in records if record.levelno >= logging.WARNING][-3:] or None
+    except Exception as e:
+        status, result, error = "failed", None, [f"{type(e).__name__}: {e}"]
+    return {
+        "text": text_filepath,
+        "status": status,
+        "seconds": time.perf_counter() - started,
+        "loopback": result,
+        "error": error,
+        "instrumentation": report,
+    }
+
+
+def verify_corpus(batch_source, encoding='utf-8', workers=LOOPBACK_WORKERS, **options):
+    """
+    Loopback-verifies every text file of a directory or manifest across a process pool.
+
+    Each file costs one synthesis and one decode pass in its worker; no WAV is written.
+
+    Args:
+        batch_source (str): Directory or manifest file, see main.collect_batch_jobs
+                            (output paths in a manifest are ignored).
+        encoding (str): Text encoding of the sources.
+        workers (int | None): Number of worker processes; None uses the core count.
+        options: Passed to verify_text (profile, framing, compression, streaming, snr_db, ...).
+
+    Returns:
+        list[dict]: One result per file, in job order, with "text", "status" ("ok",
+                    "mismatch" or "failed"), "seconds", "loopback" (LoopbackReport.as_dict,
+                    None on failure), "error" and "instrumentation".
+    """
+    jobs = [(text_filepath, encoding, options) for text_filepath, _ in collect_batch_jobs(batch_source)]
+    workers = workers or os.cpu_count() or 1
+    logger.info(f"回环校验: {batch_source}，共 {len(jobs)} 个文件，工作进程数: {workers}")
+
+    results = []
+    started = time.perf_counter()
+    if jobs:
+        with ProcessPoolExecutor(max_workers=min(workers, len(jobs))) as executor:
+            futures = [executor.submit(_verify_corpus_job, job) for job in jobs]
+            for future in as_completed(futures):
+                result = future.result()
+                results.append(result)
+                if result["status"] == "ok":
+                    logger.info(f"  [通过] {result['text']} ({result['seconds']:.2f} 秒)")
+                elif result["status"] == "mismatch":
+                    logger.warning(f"  [误码] {result['text']}: BER {result['loopback']['ber']:.3e}，"
+                                   f"文本{'一致' if result['loopback']['text_ok'] else '不一致'}")
+                else:
+                    logger.warning(f"  [失败] {result['text']}: {' | '.join(result['error'])}")
+
+    job_order = {job[0]: index for index, job in enumerate(jobs)}
+    results.sort(key=lambda r: job_order[r["text"]])
+    log_corpus_summary(results, time.perf_counter() - started)
+    return results
+
+
+def corpus_totals(results):
+    """Sums the loopback figures of verify_corpus results (files that failed are skipped)."""
+    reports = [r["loopback"] for r in results if r["loopback"] is not None]
+    bits = sum(r["bits"] for r in reports)
+    bit_errors = sum(r["bit_errors"] for r in reports)
+    seconds = sum(r["synth_seconds"] + r["decode_seconds"] for r in reports)
+    audio_seconds = sum(r["audio_seconds"] for r in reports)
+    return {
+        "files": len(results),
+        "bits": bits,
+        "bit_errors": bit_errors,
+        "ber": bit_errors / bits if bits else 0.0,
+        "audio_seconds": audio_seconds,
+        "cpu_seconds": seconds,
+        "bits_per_second": bits / seconds if seconds else 0.0,
+        "realtime_factor": audio_seconds / seconds if seconds else 0.0,
+    }
+
+
+def log_corpus_summary(results, wall_seconds):
+    """Logs the outcome of verify_corpus."""
+    totals = corpus_totals(results)
+    counts = {status: sum(1 for r in results if r["status"] == status) for status in ("ok", "mismatch", "failed")}
+    logger.info(f"回环校验结束: 通过 {counts['ok']}，误码 {counts['mismatch']}，失败 {counts['failed']}，"
+                f"耗时 {wall_seconds:.2f} 秒。")
+    logger.info(f"共 {totals['bits']} 位，{totals['bit_errors']} 个错误 (BER {totals['ber']:.3e})，"
+                f"{totals['bits_per_second']:.0f} 位/秒 (每进程)，{totals['realtime_factor']:.1f}× 实时。")
@@ -1,15 +1,25 @@
 # main_controller.py
 # -*- coding: utf-8 -*-
 
+import contextlib
+import glob
+import logging
 import os
 import sys
-from scriptor import text_to_binary_string  # Import from Scriptor.py
-from audio import binary_string_to_audio   # Import from audio.py
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from bitseq import BitSequence
+from Scriptor import TEXT_CHUNK_CHARS, iter_text_bits, iter_text_chunks, text_to_bits  # Import from Scriptor.py
+from cache import ContentCache, file_digest, resolve_cache
+from instrument import capture_logs, get_logger, instrumented, phase
+
+logger = get_logger("main")
 
 # --- Master Configuration ---
-# Use raw strings (r"...") or double backslashes ("\\") for Windows paths
-SOURCE_TEXT_FILE = r"C:\Computer\Code666\python\Scriptor-Binarius-Auditivus\input.txt" # Input High Gothic text file
-FINAL_AUDIO_FILE = r"C:\Computer\Code666\python\Scriptor-Binarius-Auditivus\Omnissiah_Vox_Output.wav" # Final audio output file
+# Defaults of the `encode` command (see cli.py); relative paths are resolved against the
+# working directory. Use raw strings (r"...") or double backslashes ("\\") for Windows paths.
+SOURCE_TEXT_FILE = "input.txt" # Input High Gothic text file, or "-" for stdin
+FINAL_AUDIO_FILE = "Omnissiah_Vox_Output.wav" # Audio output when reading stdin (otherwise next to the input)
 TEXT_ENCODING = "utf-8" # Encoding for reading the source text file
 
 # --- NEW: Binary Output Configuration ---
@@ -18,8 +28,51 @@ SAVE_BINARY_FILE = True # Set to True to save the binary string, False to skip
 # If None, it will be saved next to the audio file with a .bin.txt extension
 BINARY_OUTPUT_FILE_PATH = None # Example: r"C:\path\to\binary_output.txt" or None
 
+# --- Audio Output Configuration ---
+# Sources larger than this (in bits, i.e. 8x the file size) go through the streaming
+# pipeline: text is read, encoded and rendered chunk by chunk, so peak memory stays
+# constant instead of holding the text, its bits and the whole waveform at once.
+STREAM_AUDIO_THRESHOLD = 4096
+# Modem profile (see modem.PROFILES): "classic" (original 440/880 Hz, ~6.7 bit/s), "fast",
+# "cpfsk", "mfsk4" or "mfsk16" (1764 bit/s). The decoder reads it back from the WAV metadata.
+MODEM_PROFILE = "classic"
+# Wrap the bytes in numbered frames with a CRC and Hamming(7,4) error correction (see
+# framing.py) before rendering: a misread or skipped tone then costs one frame instead of
+# shifting every later bit. Costs 1.75x the audio length plus a 32-bit marker per frame.
+FRAMING_ENABLED = False
+# Compress the encoded bytes before rendering (see compression.py): "zlib", "bz2", "lzma"
+# or None. Every byte saved is 8 fewer symbols to synthesize, store and decode; the
+# codec is recorded in the WAV metadata and undone by the decoder.
+COMPRESSION = None
+
+# --- Batch Configuration ---
+# Set BATCH_SOURCE to a directory of .txt files, or to a manifest file listing one
+# source per line ("input.txt" or "input.txt<TAB>output.wav"), to render many files at once.
+BATCH_SOURCE = None # Example: r"C:\path\to\texts" or None for single-file mode
+BATCH_OUTPUT_DIR = None # Where batch WAVs go; None puts each next to its source
+BATCH_WORKERS = None # Worker processes; None uses os.cpu_count()
+BATCH_SKIP_MODE = "mtime" # "mtime", "hash" (sha256 of the source) or None to always render
+BATCH_SIDECAR_SUFFIX = ".sha256" # Skip key of the last render, next to each WAV (see batch_skip_key)
+
+# --- Logging / Instrumentation ---
+LOG_LEVEL = "INFO" # "DEBUG", "INFO", "WARNING" (errors and warnings only) or "ERROR"
+LOG_TIMINGS = True # Log per-phase timings and counters at the end of a single-file run
+
+# --- Cache Configuration ---
+# Reuse earlier renders of identical input (same text bytes, encoding and modem profile)
+# from the on-disk cache (see cache.py for its location and size limit).
+CACHE_ENABLED = False
+
+# --- Incremental Rendering ---
+# Keep a manifest next to the WAV (see incremental.py) and, when the source is edited
+# without changing its encoded length, rewrite only the samples of the changed blocks
+# instead of rendering the whole document again. Ignored with compression.
+INCREMENTAL_ENABLED = False
+
 # --- Main Workflow ---
-def run_conversion_pipeline(text_filepath, audio_filepath, encoding, save_binary_flag, binary_output_path_override=None):
+def run_conversion_pipeline(text_filepath, audio_filepath, encoding, save_binary_flag, binary_output_path_override=None, stream_audio=None,
+                            profile=MODEM_PROFILE, cache=None, framing=FRAMING_ENABLED, compression=COMPRESSION,
+                            incremental=INCREMENTAL_ENABLED):
     """
     Orchestrates the text -> binary -> (optional binary file) -> audio conversion process.
 
@@ -30,64 +83,97 @@ def run_conversion_pipeline(text_filepath, audio_filepath, encoding, save_binary
         save_binary_flag (bool): Whether to save the intermediate binary string to a file.
         binary_output_path_override (str | None): Specific path to save the binary file,
                                                  or None to derive it automatically.
+        stream_audio (bool | None): Force the streaming pipeline (True, see
+                                    run_streaming_pipeline) or the in-memory one (False).
+                                    None streams sources larger than STREAM_AUDIO_THRESHOLD bits.
+        profile (str | ModemProfile): Modem profile used to render the audio.
+        cache (ContentCache | bool | None): Serve repeated conversions from this cache
+                                            (True uses the default one), see
+                                            run_cached_conversion.
+        framing (bool): Render the bytes as error-corrected frames (see framing.py); the
+                        decoder detects this from the WAV metadata.
+        compression (str | None): Compress the bytes first with this codec (see
+                                  compression.py); the .bin.txt file keeps the
+                                  uncompressed bits.
+        incremental (bool): Patch the outputs of an earlier render in place when the
+                            edit allows it, see run_incremental_conversion.
     """
-    print("-" * 50)
-    print(" Initiating Scriptor-Binarius-Auditivus Protocol")
-    print("-" * 50)
-    print(f"输入文本文件: {text_filepath}")
-    print(f"目标音频文件: {audio_filepath}")
-    print(f"文本编码: {encoding}")
-    print(f"是否保存二进制文本文件: {'是' if save_binary_flag else '否'}") # Indicate if binary file will be saved
-    print("-" * 50)
+    if incremental and text_filepath != "-":
+        return run_incremental_conversion(text_filepath, audio_filepath, encoding, save_binary_flag,
+                                          binary_output_path_override, stream_audio, profile, cache, framing,
+                                          compression)
+    cache = resolve_cache(cache)
+    if cache is not None and text_filepath != "-":
+        return run_cached_conversion(cache, text_filepath, audio_filepath, encoding, save_binary_flag,
+                                     binary_output_path_override, stream_audio, profile, framing, compression)
+    if stream_audio is None:
+        stream_audio = text_filepath == "-" or (os.path.isfile(text_filepath) and
+                                                os.path.getsize(text_filepath) * 8 > STREAM_AUDIO_THRESHOLD)
+    if stream_audio:
+        return run_streaming_pipeline(text_filepath, audio_filepath, encoding, save_binary_flag,
+                                      binary_output_path_override, profile, framing=framing, compression=compression)
+
+    logger.info("-" * 50)
+    logger.info(" Initiating Scriptor-Binarius-Auditivus Protocol")
+    logger.info("-" * 50)
+    logger.info(f"输入文本文件: {text_filepath}")
+    logger.info(f"目标音频文件: {audio_filepath}")
+    logger.info(f"文本编码: {encoding}")
+    logger.info(f"调制参数: {_describe_payload(profile, framing, compression)}")
+    logger.info(f"是否保存二进制文本文件: {'是' if save_binary_flag else '否'}") # Indicate if binary file will be saved
+    logger.info("-" * 50)
 
     # 1. Read Source Text File
-    print("[Phase 1: Reading Source Text]")
+    logger.info("[Phase 1: Reading Source Text]")
     if not os.path.exists(text_filepath):
-        print(f"错误: 输入文本文件未找到: {text_filepath}")
+        logger.error(f"错误: 输入文本文件未找到: {text_filepath}")
         return False
 
     original_text = ""
     try:
-        with open(text_filepath, 'r', encoding=encoding) as infile:
+        with phase("read"), open(text_filepath, 'r', encoding=encoding) as infile:
             original_text = infile.read()
-        print(f"成功读取文件。文本长度: {len(original_text)} 字符。")
+        logger.info(f"成功读取文件。文本长度: {len(original_text)} 字符。")
         if not original_text.strip():
-             print(f"警告: 输入文件 '{text_filepath}' 为空或只包含空白字符。")
+             logger.warning(f"警告: 输入文件 '{text_filepath}' 为空或只包含空白字符。")
              # Decide if processing should continue for empty input
              # return False # Or proceed to generate empty audio if desired
 
     except IOError as e:
-        print(f"错误: 读取文件时发生 IO 错误: {e}")
+        logger.error(f"错误: 读取文件时发生 IO 错误: {e}")
         return False
     except UnicodeDecodeError:
-        print(f"错误: 无法使用 '{encoding}' 编码解码文件。请检查文件编码。")
+        logger.error(f"错误: 无法使用 '{encoding}' 编码解码文件。请检查文件编码。")
         return False
     except Exception as e:
-        print(f"错误: 读取文件时发生未知错误: {e}")
+        logger.error(f"错误: 读取文件时发生未知错误: {e}")
         return False
 
-    print("-" * 50)
+    logger.info("-" * 50)
 
     # 2. Convert Text to Binary String (using Scriptor module)
-    print("[Phase 2: Text to Binary Conversion (Scriptor Module)]")
-    binary_string_data = text_to_binary_string(original_text, encoding)
+    logger.info("[Phase 2: Text to Binary Conversion (Scriptor Module)]")
+    # Bits stay packed (BitSequence) between stages; the '0'/'1' text form is only
+    # produced when writing the optional .bin.txt file.
+    with phase("scriptor"):
+        binary_string_data = text_to_bits(original_text, encoding)
 
     if binary_string_data is None:
-        print("错误: 文本到二进制转换失败。请检查 Scriptor 模块的错误输出。")
+        logger.error("错误: 文本到二进制转换失败。请检查 Scriptor 模块的错误输出。")
         return False
     elif not binary_string_data:
-         print("信息: 源文本为空或无法编码，生成空的二进制数据。")
+         logger.info("信息: 源文本为空或无法编码，生成空的二进制数据。")
          # Handle empty binary data - maybe stop or generate silent audio?
          # For now, we'll proceed, audio module should handle empty binary string.
 
-    print("文本到二进制转换完成。")
+    logger.info("文本到二进制转换完成。")
     # print(f"  Binary Sample (first 100 chars): {binary_string_data[:100]}{'...' if len(binary_string_data)>100 else ''}") # Optional
-    print("-" * 50)
+    logger.info("-" * 50)
 
 
     # --- NEW: Phase 2.5: Optionally Save Binary String to File ---
     if save_binary_flag:
-        print("[Phase 2.5: Saving Binary Data to Text File]")
+        logger.info("[Phase 2.5: Saving Binary Data to Text File]")
         if binary_string_data is not None: # Only save if conversion was successful
             # Determine the output path for the binary file
             if binary_output_path_override:
@@ -97,69 +183,606 @@ def run_conversion_pipeline(text_filepath, audio_filepath, encoding, save_binary
                 base_path, _ = os.path.splitext(audio_filepath)
                 binary_file_save_path = base_path + ".bin.txt"
 
-            print(f"尝试将二进制字符串保存到: {binary_file_save_path}")
+            logger.info(f"尝试将二进制字符串保存到: {binary_file_save_path}")
             try:
                 # Ensure the directory exists (might be redundant if already created for audio, but safe)
                 binary_output_dir = os.path.dirname(binary_file_save_path)
                 if binary_output_dir and not os.path.exists(binary_output_dir):
                      os.makedirs(binary_output_dir, exist_ok=True)
-                     print(f"已创建二进制文件输出目录: {binary_output_dir}")
+                     logger.info(f"已创建二进制文件输出目录: {binary_output_dir}")
 
                 # Write the binary string to the file (using ascii is fine)
-                with open(binary_file_save_path, 'w', encoding='ascii') as bin_outfile:
-                    bin_outfile.write(binary_string_data)
-                print(f"二进制字符串已成功保存到: {binary_file_save_path}")
+                with phase("save_binary"), open(binary_file_save_path, 'w', encoding='ascii') as bin_outfile:
+                    bin_outfile.writelines(binary_string_data.iter_text())
+                logger.info(f"二进制字符串已成功保存到: {binary_file_save_path}")
 
             except IOError as e:
-                print(f"警告: 无法将二进制字符串写入文件 '{binary_file_save_path}': {e}")
+                logger.warning(f"警告: 无法将二进制字符串写入文件 '{binary_file_save_path}': {e}")
                 # Continue processing even if saving fails? Or return False? Decide based on requirements.
                 # For now, we just print a warning and continue.
             except Exception as e:
-                print(f"警告: 保存二进制文件时发生未知错误: {e}")
+                logger.warning(f"警告: 保存二进制文件时发生未知错误: {e}")
                 # Continue processing
         else:
-            print("警告: 二进制数据为空或转换失败，跳过保存二进制文件。")
-        print("-" * 50)
+            logger.warning("警告: 二进制数据为空或转换失败，跳过保存二进制文件。")
+        logger.info("-" * 50)
     # --- End Phase 2.5 ---
 
 
     # 3. Convert Binary String to Audio (using audio module)
-    print("[Phase 3: Binary to Audio Conversion (Audio Module)]")
-    audio_success = binary_string_to_audio(binary_string_data if binary_string_data is not None else "", audio_filepath) # Pass empty string if None
+    logger.info("[Phase 3: Binary to Audio Conversion (Audio Module)]")
+    from audio import binary_string_to_audio # Deferred: audio pulls in numpy
+    binary_input = binary_string_data if binary_string_data is not None else BitSequence() # Pass empty bits if None
+    metadata = {}
+    if compression:
+        from compression import compress_bytes, compression_metadata
+        with phase("compression"):
+            binary_input = BitSequence.from_bytes(compress_bytes(binary_input.to_bytes(), compression))
+        metadata.update(compression_metadata(compression))
+    if framing:
+        from framing import frame_bytes, framing_metadata
+        with phase("framing"):
+            binary_input = frame_bytes(binary_input.to_bytes())
+        metadata.update(framing_metadata())
+    with phase("audio"):
+        audio_success = binary_string_to_audio(binary_input, audio_filepath, profile=profile,
+                                               metadata=metadata or None)
 
     if not audio_success:
-        print("错误: 二进制到音频转换失败。请检查 Audio 模块的错误输出。")
+        logger.error("错误: 二进制到音频转换失败。请检查 Audio 模块的错误输出。")
         return False
 
-    print("-" * 50)
-    print("转换流程成功完成!")
-    print(f"最终音频文件已生成: {audio_filepath}")
+    logger.info("-" * 50)
+    logger.info("转换流程成功完成!")
+    logger.info(f"最终音频文件已生成: {audio_filepath}")
     if save_binary_flag and binary_string_data is not None:
          # Re-calculate path in case it was generated automatically, to show the user
          binary_file_path_final = binary_output_path_override or (os.path.splitext(audio_filepath)[0] + ".bin.txt")
          if os.path.exists(binary_file_path_final): # Check if it was actually saved successfully before printing
-              print(f"二进制文本文件已生成: {binary_file_path_final}")
-    print("+" * 50)
+              logger.info(f"二进制文本文件已生成: {binary_file_path_final}")
+    logger.info("+" * 50)
     return True
 
-# --- Execute the Main Workflow ---
-if __name__ == "__main__":
-    # Ensure the output directory for the *audio* file exists
-    # The binary saving logic will handle its own directory if needed
-    output_dir = os.path.dirname(FINAL_AUDIO_FILE)
-    if output_dir and not os.path.exists(output_dir):
-        print(f"创建输出目录: {output_dir}")
+
+def _describe_payload(profile, framing, compression):
+    """Profile name plus the payload stages, for the pipeline banners."""
+    stages = [f"{compression} 压缩"] if compression else []
+    if framing:
+        stages.append("帧校验")
+    return "，".join([getattr(profile, 'name', profile), *stages])
+
+
+def run_streaming_pipeline(text_source, audio_filepath, encoding, save_binary_flag, binary_output_path_override=None,
+                           profile=MODEM_PROFILE, chunk_chars=TEXT_CHUNK_CHARS, framing=FRAMING_ENABLED,
+                           compression=COMPRESSION):
+    """
+    Streaming variant of run_conversion_pipeline: the text is read in chunks, encoded
+    incrementally (Scriptor.iter_text_bits) and each chunk's bits are written to the
+    optional .bin.txt file and synthesized into the WAV before the next chunk is read.
+
+    Only one chunk is held in memory at a time, and audio is on disk before the whole
+    input has been read, so this also works for unbounded input such as a pipe on stdin.
+    The output files are identical to those of the in-memory pipeline.
+
+    Phase timings overlap here: "audio" covers the whole streamed run and includes the
+    "read", "scriptor" and "save_binary" time of every chunk.
+
+    Args:
+        text_source (str): Path to the source text file, or "-" to read stdin.
+        chunk_chars (int): Characters read per chunk.
+        (other arguments as for run_conversion_pipeline)
+    """
+    from_stdin = text_source == "-"
+    logger.info("-" * 50)
+    logger.info(" Initiating Scriptor-Binarius-Auditivus Protocol (Streaming)")
+    logger.info("-" * 50)
+    logger.info(f"输入文本: {'标准输入 (stdin)' if from_stdin else text_source}")
+    logger.info(f"目标音频文件: {audio_filepath}")
+    logger.info(f"文本编码: {encoding}，每块 {chunk_chars} 字符")
+    logger.info(f"调制参数: {_describe_payload(profile, framing, compression)}")
+    logger.info(f"是否保存二进制文本文件: {'是' if save_binary_flag else '否'}")
+    logger.info("-" * 50)
+
+    if not from_stdin and not os.path.exists(text_source):
+        logger.error(f"错误: 输入文本文件未找到: {text_source}")
+        return False
+
+    binary_file_save_path = None
+    if save_binary_flag:
+        binary_file_save_path = binary_output_path_override or (os.path.splitext(audio_filepath)[0] + ".bin.txt")
+        binary_output_dir = os.path.dirname(binary_file_save_path)
+        if binary_output_dir:
+            os.makedirs(binary_output_dir, exist_ok=True)
+
+    totals = {"chars": 0, "bits": 0}
+    failures = []
+
+    def counted_chunks(infile):
+        chunks = iter_text_chunks(infile, chunk_chars)
+        while True:
+            with phase("read"):
+                chunk = next(chunks, None)
+            if chunk is None:
+                return
+            totals["chars"] += len(chunk)
+            yield chunk
+
+    def bit_stream(infile, bin_outfile):
+        # Errors end the stream early; they are recorded here, where the cause is known
+        bit_chunks = iter_text_bits(counted_chunks(infile), encoding)
         try:
-            os.makedirs(output_dir, exist_ok=True)
+            while True:
+                with phase("scriptor"):
+                    bits = next(bit_chunks, None)
+                if bits is None:
+                    return
+                if bin_outfile is not None:
+                    with phase("save_binary"):
+                        for index, text in enumerate(bits.iter_text()):
+                            bin_outfile.write(' ' + text if totals["bits"] and not index else text)
+                totals["bits"] += len(bits)
+                yield bits
+        except UnicodeDecodeError:
+            failures.append(f"错误: 无法使用 '{encoding}' 编码解码输入。请检查文件编码。")
+        except UnicodeEncodeError:
+            failures.append(f"错误 (Scriptor): 无法使用 '{encoding}' 对提供的文本进行编码。")
         except OSError as e:
-            print(f"错误: 无法创建输出目录 '{output_dir}': {e}")
-            sys.exit(1) # Exit if cannot create output directory
-
-    # Run the main process, passing the configuration flags
-    run_conversion_pipeline(
-        text_filepath=SOURCE_TEXT_FILE,
-        audio_filepath=FINAL_AUDIO_FILE,
-        encoding=TEXT_ENCODING,
-        save_binary_flag=SAVE_BINARY_FILE, # Pass the flag
-        binary_output_path_override=BINARY_OUTPUT_FILE_PATH # Pass the specific path or None
-    )
\ No newline at end of file
+            failures.append(f"错误: 读取输入或写入二进制文件时发生 IO 错误: {e}")
+
+    logger.info("[Streaming: Text -> Binary -> Audio]")
+    from audio import binary_string_to_audio_stream
+    metadata = {}
+    if compression:
+        from compression import compression_metadata, iter_compressed_bits
+        metadata.update(compression_metadata(compression))
+    if framing:
+        from framing import framing_metadata, iter_framed_bits
+        metadata.update(framing_metadata())
+    try:
+        with contextlib.ExitStack() as stack:
+            if from_stdin:
+                infile = stack.enter_context(open(sys.stdin.fileno(), 'r', encoding=encoding, closefd=False))
+            else:
+                infile = stack.enter_context(open(text_source, 'r', encoding=encoding))
+            bin_outfile = None
+            if binary_file_save_path:
+                bin_outfile = stack.enter_context(open(binary_file_save_path, 'w', encoding='ascii'))
+            bits = bit_stream(infile, bin_outfile)
+            if compression:
+                bits = iter_compressed_bits(bits, compression)
+            if framing:
+                bits = iter_framed_bits(bits)
+            with phase("audio"):
+                audio_success = binary_string_to_audio_stream(bits, audio_filepath, profile=profile,
+                                                              metadata=metadata or None)
+    except OSError as e:
+        logger.error(f"错误: 打开输入或输出文件时发生 IO 错误: {e}")
+        return False
+
+    if failures:
+        for message in failures:
+            logger.error(message)
+        logger.error("错误: 输入未能完整处理，已删除不完整的输出文件。")
+        for partial_path in (audio_filepath, binary_file_save_path):
+            if partial_path and os.path.exists(partial_path):
+                os.remove(partial_path)
+        return False
+    if not audio_success:
+        logger.error("错误: 二进制到音频转换失败。请检查 Audio 模块的错误输出。")
+        return False
+
+    logger.info("-" * 50)
+    logger.info(f"流式转换成功完成! 共 {totals['chars']} 字符，{totals['bits']} 位。")
+    logger.info(f"最终音频文件已生成: {audio_filepath}")
+    if binary_file_save_path:
+        logger.info(f"二进制文本文件已生成: {binary_file_save_path}")
+    logger.info("+" * 50)
+    return True
+
+def run_multiplex_pipeline(text_filepaths, audio_filepath, encoding, profile=MODEM_PROFILE, framing=FRAMING_ENABLED,
+                           compression=COMPRESSION):
+    """
+    Renders several text files into one WAV, each on its own subchannel of a
+    frequency-division multiplexed profile (see audio.multiplex_to_audio).
+
+    Every document goes through the same optional compression and framing stages as in
+    run_conversion_pipeline, independently of the others. The decoder returns the
+    documents joined with translator.STREAM_SEPARATOR.
+
+    Args:
+        text_filepaths (list[str]): Source text files, at most profile.subchannels.
+        (other arguments as for run_conversion_pipeline)
+    """
+    logger.info("-" * 50)
+    logger.info(" Initiating Scriptor-Binarius-Auditivus Protocol (Multiplex)")
+    logger.info("-" * 50)
+    logger.info(f"输入文本: {', '.join(text_filepaths)}")
+    logger.info(f"目标音频文件: {audio_filepath}")
+    logger.info(f"调制参数: {_describe_payload(profile, framing, compression)}")
+    logger.info("-" * 50)
+
+    streams = []
+    for text_filepath in text_filepaths:
+        try:
+            with phase("read"), open(text_filepath, 'r', encoding=encoding) as infile:
+                text = infile.read()
+        except FileNotFoundError:
+            logger.error(f"错误: 输入文本文件未找到: {text_filepath}")
+            return False
+        except (OSError, UnicodeDecodeError) as e:
+            logger.error(f"错误: 无法读取输入文本文件 '{text_filepath}': {e}")
+            return False
+        with phase("scriptor"):
+            bits = text_to_bits(text, encoding)
+        if bits is None:
+            logger.error(f"错误: 文本到二进制转换失败: {text_filepath}")
+            return False
+        if compression:
+            from compression import compress_bytes
+            with phase("compression"):
+                bits = BitSequence.from_bytes(compress_bytes(bits.to_bytes(), compression))
+        if framing:
+            from framing import frame_bytes
+            with phase("framing"):
+                bits = frame_bytes(bits.to_bytes())
+        logger.info(f"  第 {len(streams) + 1} 路: {text_filepath}，{len(bits)} 位")
+        streams.append(bits)
+
+    from audio import multiplex_to_audio
+    metadata = {}
+    if compression:
+        from compression import compression_metadata
+        metadata.update(compression_metadata(compression))
+    if framing:
+        from framing import framing_metadata
+        metadata.update(framing_metadata())
+    with phase("audio"):
+        audio_success = multiplex_to_audio(streams, audio_filepath, profile=profile, metadata=metadata or None)
+    if not audio_success:
+        logger.error("错误: 二进制到音频转换失败。请检查 Audio 模块的错误输出。")
+        return False
+
+    logger.info("-" * 50)
+    logger.info(f"复用转换成功完成! 共 {len(streams)} 个文档。")
+    logger.info(f"最终音频文件已生成: {audio_filepath}")
+    logger.info("+" * 50)
+    return True
+
+def run_cached_conversion(cache, text_filepath, audio_filepath, encoding, save_binary_flag,
+                          binary_output_path_override=None, stream_audio=None, profile=MODEM_PROFILE,
+                          framing=FRAMING_ENABLED, compression=COMPRESSION):
+    """
+    run_conversion_pipeline through a ContentCache: the outputs are keyed by the sha256
+    of the source bytes, the encoding and the full modem profile. A hit costs hashing
+    the source plus copying (or hard linking) the cached WAV and .bin.txt; a miss runs
+    the normal pipeline and stores its outputs.
+
+    Args:
+        cache (ContentCache): The cache to use.
+        (other arguments as for run_conversion_pipeline)
+    """
+    if not os.path.isfile(text_filepath):
+        logger.error(f"错误: 输入文本文件未找到: {text_filepath}")
+        return False
+    binary_file_save_path = None
+    if save_binary_flag:
+        binary_file_save_path = binary_output_path_override or (os.path.splitext(audio_filepath)[0] + ".bin.txt")
+
+    from audio import active_profile
+    with phase("cache"):
+        key = cache.make_key(file_digest(text_filepath), kind="encode", encoding=encoding,
+                             profile=active_profile(profile)._asdict(), framing=bool(framing),
+                             compression=compression or None)
+        hit = cache.fetch(key, "wav", audio_filepath)
+        if hit and binary_file_save_path:
+            hit = cache.fetch(key, "bin", binary_file_save_path)
+    if hit:
+        logger.info(f"缓存命中: {text_filepath} -> {audio_filepath}")
+        if binary_file_save_path:
+            logger.info(f"二进制文本文件已生成: {binary_file_save_path}")
+        return True
+
+    if cache.link_mode == "hardlink":
+        # Earlier outputs may be links to cache entries; never write through them
+        for output_path in (audio_filepath, binary_file_save_path):
+            if output_path and os.path.exists(output_path):
+                os.remove(output_path)
+    success = run_conversion_pipeline(text_filepath, audio_filepath, encoding, save_binary_flag,
+                                      binary_output_path_override, stream_audio, profile, framing=framing,
+                                      compression=compression)
+    if success:
+        with phase("cache"):
+            cache.store(key, "wav", audio_filepath)
+            if binary_file_save_path and os.path.exists(binary_file_save_path):
+                cache.store(key, "bin", binary_file_save_path)
+    return success
+
+
+def run_incremental_conversion(text_filepath, audio_filepath, encoding, save_binary_flag,
+                               binary_output_path_override=None, stream_audio=None, profile=MODEM_PROFILE,
+                               cache=None, framing=FRAMING_ENABLED, compression=COMPRESSION):
+    """
+    run_conversion_pipeline that updates the outputs of an earlier render in place.
+
+    A manifest next to the WAV (see incremental.py) records the source digest, the
+    rendering parameters and checksums of fixed-size blocks of the text and of the
+    rendered payload. When the source is edited without changing its encoded length,
+    only the changed blocks are re-synthesized and written over their samples (and
+    their characters in the .bin.txt file), so the cost follows the size of the edit
+    instead of the document; the outputs are byte-identical to a full render. An
+    unchanged source costs one hash. Anything else (no or stale manifest, different
+    parameters, a length change, compression) runs the normal pipeline and records a
+    new manifest.
+
+    Args:
+        (as for run_conversion_pipeline)
+    """
+    if not os.path.isfile(text_filepath):
+        logger.error(f"错误: 输入文本文件未找到: {text_filepath}")
+        return False
+    binary_file_save_path = None
+    if save_binary_flag:
+        binary_file_save_path = binary_output_path_override or (os.path.splitext(audio_filepath)[0] + ".bin.txt")
+
+    def full_render(record=True):
+        success = run_conversion_pipeline(text_filepath, audio_filepath, encoding, save_binary_flag,
+                                          binary_output_path_override, stream_audio, profile, cache, framing,
+                                          compression, incremental=False)
+        if success and record:
+            saved_binary = binary_file_save_path if binary_file_save_path and os.path.exists(binary_file_save_path) else None
+            try:
+                incremental.write_manifest(audio_filepath, incremental.build_manifest(
+                    digest, parameters, text_bits, payload, audio_filepath, saved_binary))
+            except OSError as e:
+                logger.warning(f"警告: 无法写入清单文件: {e}")
+        return success
+
+    if compression:
+        logger.info("增量模式: 压缩后的字节流随任何修改整体改变，执行完整渲染。")
+        return full_render(record=False)
+    import incremental
+    try:
+        parameters = incremental.render_parameters(encoding, profile, framing)
+    except ValueError:
+        return full_render(record=False) # Reports the unknown profile
+    with phase("incremental"):
+        digest = file_digest(text_filepath)
+        manifest = incremental.load_manifest(audio_filepath, parameters, binary_file_save_path)
+        if manifest is not None and manifest["source"] == digest:
+            logger.info(f"增量模式: 源文本未变化，输出已是最新: {audio_filepath}")
+            return True
+        try:
+            with open(text_filepath, 'r', encoding=encoding) as infile:
+                text_bits = text_to_bits(infile.read(), encoding)
+        except (OSError, UnicodeError):
+            text_bits = None
+    if not text_bits:
+        return full_render(record=False) # Reports the read or encoding error
+    payload = text_bits
+    if framing:
+        from framing import frame_bytes
+        with phase("framing"):
+            payload = frame_bytes(text_bits.to_bytes())
+
+    if manifest is not None and (manifest["text_bytes"] != len(text_bits) // 8 or manifest["payload_bits"] != len(payload)):
+        logger.info("增量模式: 编码后的长度已改变，执行完整渲染。")
+        manifest = None
+    if manifest is None:
+        return full_render()
+
+    logger.info(f"增量模式: 更新 {audio_filepath}")
+    with phase("incremental"):
+        try:
+            text_blocks = incremental.changed_blocks(manifest, "text_blocks", text_bits.data)
+            payload_blocks = incremental.changed_blocks(manifest, "payload_blocks", payload.data)
+            incremental.mark_incomplete(audio_filepath, manifest)
+            samples = incremental.patch_audio(audio_filepath, payload, payload_blocks, profile)
+            if binary_file_save_path:
+                incremental.patch_binary_file(binary_file_save_path, text_bits, text_blocks)
+            incremental.write_manifest(audio_filepath, incremental.build_manifest(
+                digest, parameters, text_bits, payload, audio_filepath, binary_file_save_path))
+        except (OSError, ValueError) as e:
+            logger.warning(f"警告: 增量更新失败 ({e})，执行完整渲染。")
+            return full_render()
+    logger.info(f"增量更新完成: {len(payload_blocks)} 个块已改变，重写 {samples} 个采样点。")
+    if binary_file_save_path:
+        logger.info(f"二进制文本文件已更新: {binary_file_save_path}")
+    return True
+
+# --- Batch Workflow ---
+def collect_batch_jobs(batch_source, output_dir=None):
+    """
+    Builds the list of (text_path, audio_path) jobs for a batch run.
+
+    Args:
+        batch_source (str): A directory (every *.txt file in it is rendered) or a manifest
+                            file with one "input.txt" or "input.txt<TAB>output.wav" per line.
+                            Blank lines and lines starting with '#' are ignored.
+        output_dir (str | None): Directory for WAVs without an explicit path; None puts
+                                 each WAV next to its source.
+
+    Returns:
+        list[tuple[str, str]]: The jobs, in a stable order.
+    """
+    if os.path.isdir(batch_source):
+        entries = [(path, None) for path in sorted(glob.glob(os.path.join(batch_source, "*.txt")))]
+    else:
+        entries = []
+        base_dir = os.path.dirname(os.path.abspath(batch_source))
+        with open(batch_source, 'r', encoding='utf-8') as manifest:
+            for line in manifest:
+                line = line.strip()
+                if not line or line.startswith('#'):
+                    continue
+                text_path, _, audio_path = line.partition('\t')
+                text_path = os.path.join(base_dir, text_path.strip())
+                audio_path = os.path.join(base_dir, audio_path.strip()) if audio_path.strip() else None
+                entries.append((text_path, audio_path))
+
+    jobs = []
+    for text_path, audio_path in entries:
+        if audio_path is None:
+            stem = os.path.splitext(os.path.basename(text_path))[0]
+            audio_path = os.path.join(output_dir or os.path.dirname(text_path), stem + ".wav")
+        jobs.append((text_path, audio_path))
+    return jobs
+
+
+def batch_skip_key(text_filepath, skip_mode, encoding=TEXT_ENCODING, profile=MODEM_PROFILE, framing=FRAMING_ENABLED,
+                   compression=COMPRESSION):
+    """
+    The key a batch job records in the sidecar next to its WAV: every parameter that
+    affects the outputs, plus the sha256 of the source in "hash" mode (built like
+    ContentCache.make_key).
+
+    Raises:
+        ValueError: If the profile is unknown.
+    """
+    from audio import active_profile
+    digest = file_digest(text_filepath) if skip_mode == "hash" else None
+    return ContentCache.make_key(digest, kind="batch", encoding=encoding, profile=active_profile(profile)._asdict(),
+                                 framing=bool(framing), compression=compression or None)
+
+
+def is_output_up_to_date(text_filepath, audio_filepath, skip_mode, encoding=TEXT_ENCODING, save_binary_flag=False,
+                         profile=MODEM_PROFILE, framing=FRAMING_ENABLED, compression=COMPRESSION):
+    """
+    Decides whether a batch job can be skipped.
+
+    "mtime": the WAV exists and is newer than the source.
+    "hash": the WAV exists and the source content is the one it was rendered from.
+    In both modes the sidecar must show that the WAV was rendered with the same
+    parameters (see batch_skip_key), and with save_binary_flag the .bin.txt file must
+    exist and be newer than the source.
+    """
+    if not skip_mode or not os.path.exists(audio_filepath):
+        return False
+    if skip_mode not in ("mtime", "hash"):
+        raise ValueError(f"未知的跳过模式: {skip_mode}")
+    source_mtime = os.path.getmtime(text_filepath)
+    if skip_mode == "mtime" and os.path.getmtime(audio_filepath) < source_mtime:
+        return False
+    if save_binary_flag:
+        binary_filepath = os.path.splitext(audio_filepath)[0] + ".bin.txt"
+        if not os.path.exists(binary_filepath) or os.path.getmtime(binary_filepath) < source_mtime:
+            return False
+    try:
+        with open(audio_filepath + BATCH_SIDECAR_SUFFIX, 'r', encoding='ascii') as sidecar:
+            recorded = sidecar.read().strip()
+        return recorded == batch_skip_key(text_filepath, skip_mode, encoding, profile, framing, compression)
+    except (OSError, ValueError): # An unknown profile fails in the job itself, where it is reported
+        return False
+
+
+def _convert_batch_job(job):
+    """
+    Worker entry point: runs one conversion with its log output captured, so parallel
+    jobs do not interleave. Never raises; failures are reported in the result.
+    """
+    (text_filepath, audio_filepath, encoding, save_binary_flag, skip_mode, profile, cache, framing, compression,
+     incremental) = job
+    started = time.perf_counter()
+    report = None
+    try:
+        output_dir = os.path.dirname(audio_filepath)
+        if output_dir:
+            os.makedirs(output_dir, exist_ok=True)
+        with capture_logs() as records, instrumented() as collector:
+            success = run_conversion_pipeline(text_filepath, audio_filepath, encoding, save_binary_flag,
+                                              profile=profile, cache=cache, framing=framing,
+                                              compression=compression, incremental=incremental)
+        report = collector.report()
+        if success and skip_mode:
+            with open(audio_filepath + BATCH_SIDECAR_SUFFIX, 'w', encoding='ascii') as sidecar:
+                sidecar.write(batch_skip_key(text_filepath, skip_mode, encoding, profile, framing, compression))
+        if success:
+            error = None
+        else:
+            messages = [record.getMessage() for record in records]
+            error = [record.getMessage() for record in records if record.levelno >= logging.ERROR][-3:] or messages[-3:]
+    except Exception as e:
+        success, error = False, [f"{type(e).__name__}: {e}"]
+    return {
+        "text": text_filepath,
+        "audio": audio_filepath,
+        "status": "ok" if success else "failed",
+        "seconds": time.perf_counter() - started,
+        "error": error,
+        "instrumentation": report,
+    }
+
+
+def run_batch_conversion(batch_source, output_dir=None, encoding=TEXT_ENCODING, save_binary_flag=False,
+                         workers=None, skip_mode=BATCH_SKIP_MODE, profile=MODEM_PROFILE, cache=None,
+                         framing=FRAMING_ENABLED, compression=COMPRESSION, incremental=INCREMENTAL_ENABLED):
+    """
+    Renders every text file of a directory or manifest to WAV across a process pool.
+
+    A failure in one file is reported and does not stop the rest of the batch; outputs that
+    are already up to date (see is_output_up_to_date) are skipped.
+
+    Args:
+        batch_source (str): Directory or manifest file, see collect_batch_jobs.
+        output_dir (str | None): Output directory for WAVs, see collect_batch_jobs.
+        encoding (str): Text encoding of the sources.
+        save_binary_flag (bool): Whether to also write each .bin.txt file.
+        workers (int | None): Number of worker processes; None uses the core count.
+        skip_mode (str | None): "mtime", "hash" or None.
+        profile (str | ModemProfile): Modem profile used for every file.
+        cache (ContentCache | bool | None): Content cache shared by the workers, see
+                                            run_cached_conversion.
+        framing (bool): Render error-corrected frames, see run_conversion_pipeline.
+        compression (str | None): Compression codec, see run_conversion_pipeline.
+        incremental (bool): Patch earlier outputs in place, see run_incremental_conversion.
+
+    Returns:
+        list[dict]: One result per job with "text", "audio", "status" ("ok", "skipped" or
+                    "failed"), "seconds", "error" and "instrumentation" (phase timings and
+                    counters, see instrument.Instrumentation.report).
+    """
+    logger.info("-" * 50)
+    logger.info(" Initiating Scriptor-Binarius-Auditivus Protocol (Batch)")
+    logger.info("-" * 50)
+    jobs = collect_batch_jobs(batch_source, output_dir)
+    workers = workers or os.cpu_count() or 1
+    cache = resolve_cache(cache)
+    logger.info(f"批处理来源: {batch_source}，共 {len(jobs)} 个文件，工作进程数: {workers}")
+
+    results = []
+    pending = []
+    for text_filepath, audio_filepath in jobs:
+        if is_output_up_to_date(text_filepath, audio_filepath, skip_mode, encoding, save_binary_flag, profile, framing,
+                                compression):
+            results.append({"text": text_filepath, "audio": audio_filepath, "status": "skipped",
+                            "seconds": 0.0, "error": None, "instrumentation": None})
+            logger.info(f"  [跳过] {text_filepath} (输出已是最新)")
+        else:
+            pending.append((text_filepath, audio_filepath, encoding, save_binary_flag, skip_mode, profile, cache,
+                            framing, compression, incremental))
+
+    batch_started = time.perf_counter()
+    if pending:
+        with ProcessPoolExecutor(max_workers=min(workers, len(pending))) as executor:
+            futures = [executor.submit(_convert_batch_job, job) for job in pending]
+            for future in as_completed(futures):
+                result = future.result()
+                results.append(result)
+                if result["status"] == "ok":
+                    logger.info(f"  [完成] {result['text']} -> {result['audio']} ({result['seconds']:.2f} 秒)")
+                else:
+                    logger.warning(f"  [失败] {result['text']} ({result['seconds']:.2f} 秒): {' | '.join(result['error'] or [])}")
+
+    job_order = {audio_filepath: index for index, (_, audio_filepath) in enumerate(jobs)}
+    results.sort(key=lambda r: job_order[r["audio"]])
+    counts = {status: sum(1 for r in results if r["status"] == status) for status in ("ok", "skipped", "failed")}
+    logger.info("-" * 50)
+    logger.info(f"批处理结束: 成功 {counts['ok']}，跳过 {counts['skipped']}，失败 {counts['failed']}，"
+          f"耗时 {time.perf_counter() - batch_started:.2f} 秒。")
+    logger.info("+" * 50)
+    return results
+
+# --- Execute the Main Workflow ---
+if __name__ == "__main__":
+    # `python main.py [input] [options]` is `python cli.py encode [input] [options]`
+    from cli import main as cli_main
+    sys.exit(cli_main(["--log-level", LOG_LEVEL, *(["--timings"] if LOG_TIMINGS else []), "encode", *sys.argv[1:]]))
@@ -0,0 +1,221 @@
+# 调制解调参数 (modem profiles)，由 audio.py 与 translator.py 共享
+# -*- coding: utf-8 -*-
+
+import math
+from collections import namedtuple
+
+# --- Profile Definition ---
+_ModemProfileBase = namedtuple(
+    "_ModemProfileBase",
+    ["name", "sample_rate", "frequencies", "tone_duration", "silence_duration", "amplitude", "subchannels"],
+    defaults=(1,),
+)
+
+
+class ModemProfile(_ModemProfileBase):
+    """
+    One complete set of modulation parameters.
+
+    frequencies holds 2**k tones; each symbol carries k bits (MSB first) and is sent as
+    the tone at that index. A symbol is tone_duration seconds long and is followed by
+    silence_duration seconds of silence (0 for gap-less FSK). When there is no gap, every
+    tone must complete a whole number of cycles per symbol, so each symbol starts and
+    ends at phase 0 and the signal stays phase-continuous across symbol boundaries.
+
+    With subchannels > 1 the profile is frequency-division multiplexed: frequencies is
+    split into that many equal, consecutive tone groups, and every symbol period sends
+    one symbol on each group at once (the tones are summed, each at amplitude /
+    subchannels). A period then carries subchannels * bits_per_symbol bits, in
+    subchannel order.
+    """
+
+    __slots__ = ()
+
+    @property
+    def tones_per_subchannel(self):
+        return len(self.frequencies) // self.subchannels
+
+    def subchannel_frequencies(self, index):
+        """The tone group of one subchannel."""
+        n_tones = self.tones_per_subchannel
+        return self.frequencies[index * n_tones:(index + 1) * n_tones]
+
+    @property
+    def bits_per_symbol(self):
+        """Bits per symbol of one subchannel."""
+        return int(math.log2(self.tones_per_subchannel))
+
+    @property
+    def bits_per_period(self):
+        """Bits sent per symbol period, over all subchannels."""
+        return self.bits_per_symbol * self.subchannels
+
+    @property
+    def tone_samples(self):
+        return round(self.tone_duration * self.sample_rate)
+
+    @property
+    def silence_samples(self):
+        return round(self.silence_duration * self.sample_rate)
+
+    @property
+    def cycle_samples(self):
+        return self.tone_samples + self.silence_samples
+
+    @property
+    def bit_rate(self):
+        """Payload bits per second."""
+        return self.bits_per_period * self.sample_rate / self.cycle_samples
+
+    def validate(self):
+        """
+        Raises ValueError if the parameters cannot be encoded/decoded reliably.
+        Returns the profile itself so it can be chained.
+        """
+        if not isinstance(self.subchannels, int) or self.subchannels < 1 \
+                or len(self.frequencies) % self.subchannels:
+            raise ValueError(f"调制参数 '{self.name}': 频率个数 ({len(self.frequencies)}) "
+                             f"必须能被子信道数 ({self.subchannels}) 整除")
+        n_tones = self.tones_per_subchannel
+        if n_tones < 2 or n_tones & (n_tones - 1):
+            raise ValueError(f"调制参数 '{self.name}': 每个子信道的频率个数必须是 2 的幂 (当前 {n_tones})")
+        if len(set(self.frequencies)) != len(self.frequencies):
+            raise ValueError(f"调制参数 '{self.name}': 频率不能重复")
+        if self.tone_samples <= 0 or self.silence_samples < 0:
+            raise ValueError(f"调制参数 '{self.name}': 音调/静音样本数无效")
+        if max(self.frequencies) >= self.sample_rate / 2:
+            raise ValueError(f"调制参数 '{self.name}': 最高频率超过奈奎斯特频率")
+        if self.silence_samples == 0:
+            for frequency in self.frequencies:
+                cycles = frequency * self.tone_samples / self.sample_rate
+                if abs(cycles - round(cycles)) > 1e-9:
+                    raise ValueError(f"调制参数 '{self.name}': 无间隔模式下 {frequency} Hz "
+                                     f"在每个符号内必须是整数个周期")
+        return self
+
+
+# --- Named Profiles ---
+_SYMBOL_441_BAUD = 1 / 441 # 100 samples at 44.1 kHz; tones at multiples of 441 Hz are orthogonal
+
+PROFILES = {
+    # The original parameters: 1 bit per 0.15 s (about 6.7 bit/s)
+    "classic": ModemProfile("classic", 44100, (440, 880), 0.1, 0.05, 0.6),
+    # Same binary FSK with 10 ms tones and short gaps (about 81 bit/s); still synchronizable
+    "fast": ModemProfile("fast", 44100, (1000, 2000), 0.01, _SYMBOL_441_BAUD, 0.6),
+    # Continuous-phase binary FSK without silence gaps (441 bit/s)
+    "cpfsk": ModemProfile("cpfsk", 44100, (2205, 2646), _SYMBOL_441_BAUD, 0, 0.6),
+    # 4-ary FSK, 2 bits per symbol (882 bit/s)
+    "mfsk4": ModemProfile("mfsk4", 44100, tuple(441 * k for k in range(5, 9)), _SYMBOL_441_BAUD, 0, 0.6),
+    # 16-ary FSK, 4 bits per symbol (1764 bit/s)
+    "mfsk16": ModemProfile("mfsk16", 44100, tuple(441 * k for k in range(5, 21)), _SYMBOL_441_BAUD, 0, 0.6),
+    # Classic timing with 8 binary FSK subchannels at 440 Hz spacing (about 53 bit/s, 8x classic)
+    "fdm8": ModemProfile("fdm8", 44100, tuple(440 * k for k in range(1, 17)), 0.1, 0.05, 0.6, 8),
+    # cpfsk timing with 16 binary FSK subchannels, 2205-15876 Hz (7056 bit/s, 16x cpfsk)
+    "fdm16": ModemProfile("fdm16", 44100, tuple(441 * k for k in range(5, 37)), _SYMBOL_441_BAUD, 0, 0.6, 16),
+}
+
+DEFAULT_PROFILE = "classic" # Used when nothing else is specified or recorded in the file
+
+
+def get_profile(profile=None):
+    """
+    Resolves a profile name (or an existing ModemProfile) to a validated ModemProfile.
+
+    Raises:
+        ValueError: If the name is unknown or the parameters are invalid.
+    """
+    if profile is None:
+        profile = DEFAULT_PROFILE
+    if isinstance(profile, ModemProfile):
+        return profile.validate()
+    try:
+        return PROFILES[profile].validate()
+    except KeyError:
+        raise ValueError(f"未知的调制参数 '{profile}'，可选: {', '.join(PROFILES)}") from None
+
+
+# --- Metadata ---
+# The profile is recorded in the WAV file (LIST/INFO 'ICMT' comment) as key=value pairs,
+# so the decoder can pick it up without being told. Full parameters are written, so
+# custom profiles round-trip too.
+METADATA_TAG = "SBA1"
+
+
+def format_metadata(profile, **extra):
+    """
+    Serializes a profile (plus any extra key=value fields) into the metadata string.
+    """
+    fields = {
+        "profile": profile.name,
+        "sample_rate": profile.sample_rate,
+        "frequencies": ",".join(repr(f) for f in profile.frequencies),
+        "tone_duration": repr(profile.tone_duration),
+        "silence_duration": repr(profile.silence_duration),
+        "amplitude": repr(profile.amplitude),
+    }
+    if profile.subchannels > 1:
+        fields["subchannels"] = profile.subchannels
+    fields.update(extra)
+    return METADATA_TAG + " " + " ".join(f"{key}={value}" for key, value in fields.items())
+
+
+def parse_metadata(text):
+    """
+    Parses a metadata string written by format_metadata.
+
+    Returns:
+        dict | None: The key=value fields, or None if the string is not ours.
+    """
+    parts = (text or "").split()
+    if not parts or parts[0] != METADATA_TAG:
+        return None
+    return dict(part.split("=", 1) for part in parts[1:] if "=" in part)
+
+
+def profile_from_metadata(fields):
+    """
+    Rebuilds the ModemProfile described by parsed metadata fields.
+    """
+    def number(value):
+        return float(value) if any(c in value for c in ".eE") else int(value)
+
+    if "frequencies" not in fields:
+        return get_profile(fields.get("profile"))
+    return ModemProfile(
+        fields.get("profile", "custom"),
+        int(fields["sample_rate"]),
+        tuple(number(f) for f in fields["frequencies"].split(",")),
+        float(fields["tone_duration"]),
+        float(fields["silence_duration"]),
+        float(fields["amplitude"]),
+        int(fields.get("subchannels", 1)),
+    ).validate()
+
+
+def profile_from_constants(sample_rate, frequencies, tone_duration, silence_duration, amplitude):
+    """
+    Builds a profile from loose module-level constants (audio.py / translator.py).
+    It is named after the built-in profile it matches, or "custom" otherwise.
+    """
+    profile = ModemProfile("custom", sample_rate, tuple(frequencies), tone_duration, silence_duration, amplitude)
+    for name, known in PROFILES.items():
+        if known._replace(name="custom") == profile:
+            return known.validate()
+    return profile.validate()
+
+
+def streams_metadata(n_streams):
+    """
+    Metadata fields of audio whose subchannels carry independent documents (see
+    audio.multiplex_to_audio) instead of one payload split across them.
+    """
+    return {"streams": n_streams}
+
+
+def streams_from_metadata(fields):
+    """
+    Returns the number of independent documents recorded in WAV metadata fields, or
+    None if the audio carries a single payload.
+    """
+    streams = (fields or {}).get("streams")
+    return int(streams) if streams is not None else None
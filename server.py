@@ -0,0 +1,368 @@
+# 常驻服务: 通过本地 HTTP (TCP 或 Unix 套接字) 提供编码 / 解码
+# -*- coding: utf-8 -*-
+
+import asyncio
+import io
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import parse_qs, urlsplit
+
+from audio import STREAM_CHUNK_BITS, synthesize_pcm, synthesized_frames, wav_header
+from bitseq import BitSequence
+from compression import CODECS, compress_bytes, compression_from_metadata, compression_metadata, decompress_bytes
+from framing import frame_bytes, framing_from_metadata, framing_metadata, log_frame_report, unframe_bits
+from instrument import capture_logs, configure_logging, get_logger
+from main import COMPRESSION, FRAMING_ENABLED
+from modem import get_profile, profile_from_metadata, streams_from_metadata
+from translator import (STREAM_SEPARATOR, active_profile, binary_string_to_text, decode_audio_to_bits,
+                        demultiplex_bits, normalization_scale, pcm_frames, read_wav_format, read_wav_metadata,
+                        sample_dtype, select_channel_blocks)
+
+logger = get_logger("server")
+
+# --- Server Configuration ---
+SERVER_HOST = "127.0.0.1" # Only local clients by default
+SERVER_PORT = 8765
+SERVER_UNIX_SOCKET = None # Example: "/tmp/sba.sock"; when set, listen there instead of on TCP
+SERVER_WORKERS = None # Worker processes for the CPU-bound work; None uses os.cpu_count()
+MAX_CONCURRENT_REQUESTS = 8 # Requests processed at once; others wait up to QUEUE_TIMEOUT
+QUEUE_TIMEOUT = 5.0 # Seconds a request may wait for a free slot before getting 503
+MAX_ENCODE_BYTES = 1 << 20 # Largest text body accepted by /encode
+MAX_DECODE_BYTES = 64 << 20 # Largest WAV body accepted by /decode
+MAX_HEADER_BYTES = 16 << 10
+RESPONSE_CHUNK_BITS = STREAM_CHUNK_BITS * 32 # Bits synthesized per chunk of a streamed /encode response
+RESPONSE_CHUNK_BYTES = 1 << 16 # Size of the pieces a /decode response is written in
+IDLE_TIMEOUT = 30.0 # Close keep-alive connections idle for this long
+
+_REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 411: "Length Required",
+            413: "Payload Too Large", 422: "Unprocessable Entity", 500: "Internal Server Error",
+            503: "Service Unavailable"}
+
+
+class RequestError(Exception):
+    """A request that is answered with an HTTP error status."""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+# --- Worker Jobs (run in the process pool) ---
+def _payload_job(job):
+    """
+    Applies the optional payload stages of main.run_conversion_pipeline to the encoded
+    text bytes.
+
+    Returns:
+        tuple: (packed bits, number of bits, WAV metadata fields)
+    """
+    data, framing, compression = job
+    bits = BitSequence.from_bytes(data)
+    metadata = {}
+    if compression:
+        bits = BitSequence.from_bytes(compress_bytes(bits.to_bytes(), compression))
+        metadata.update(compression_metadata(compression))
+    if framing:
+        bits = frame_bytes(bits.to_bytes())
+        metadata.update(framing_metadata())
+    return bits.data, len(bits), metadata
+
+
+def _synthesize_job(job):
+    """Synthesizes one chunk of packed bits to little-endian 16-bit PCM bytes."""
+    packed, n_bits, leading_silence, profile = job
+    bits = BitSequence(packed, n_bits)
+    return synthesize_pcm(bits, leading_silence=leading_silence, profile=profile).astype('<i2', copy=False).tobytes()
+
+
+def _decode_job(job):
+    """
+    Decodes a complete WAV file held in memory to text.
+
+    Returns:
+        tuple: (text or None, error message or None)
+    """
+    wav_bytes, profile, backend, encoding = job
+    with capture_logs() as records:
+        try:
+            wav_file = io.BytesIO(wav_bytes)
+            fields = read_wav_metadata(wav_file)
+            wav_file.seek(0)
+            if profile is None:
+                profile = profile_from_metadata(fields) if fields else None
+            frame_payload = framing_from_metadata(fields)
+            compression = compression_from_metadata(fields)
+            n_streams = streams_from_metadata(fields)
+            sample_rate, channels, dtype, data_bytes = read_wav_format(wav_file)
+            data = memoryview(wav_bytes)[wav_file.tell():]
+            if data_bytes:
+                data = data[:data_bytes]
+            frame_bytes = dtype.itemsize * channels
+            frames = pcm_frames(data[:len(data) - len(data) % frame_bytes], dtype, channels)
+            scale_factor = normalization_scale(sample_dtype(dtype))
+            samples = next(select_channel_blocks([frames], None, sample_rate, profile, scale_factor), frames[:, 0])
+            bits = decode_audio_to_bits(samples, sample_rate, scale_factor, backend, profile=profile,
+                                        diagnostics=bool(n_streams))
+            text = None
+            if bits is not None and n_streams:
+                bits, diagnostics = bits
+                texts = [_payload_text(stream, frame_payload, compression, encoding) if stream else ""
+                         for stream in demultiplex_bits(diagnostics, active_profile(profile).bits_per_symbol, n_streams)]
+                text = None if None in texts else STREAM_SEPARATOR.join(texts)
+            elif bits is not None:
+                text = _payload_text(bits, frame_payload, compression, encoding)
+        except (ValueError, KeyError) as e:
+            return None, str(e)
+    if text is None:
+        errors = [record.getMessage() for record in records if record.levelname == "ERROR"]
+        return None, errors[-1] if errors else "解码失败"
+    return text, None
+
+
+def _payload_text(bits, frame_payload, compression, encoding):
+    """Undoes framing and compression and decodes the text (None if no frame survived)."""
+    payload = None
+    if frame_payload:
+        report = unframe_bits(bits, frame_payload)
+        log_frame_report(report)
+        if not report.frames:
+            return None
+        payload = report.data
+    elif compression:
+        payload = bits.to_bytes()
+    if payload is not None and compression:
+        payload = decompress_bytes(payload)
+    if payload is not None:
+        return payload.decode(encoding, errors='replace')
+    return binary_string_to_text(bits, encoding) if bits else ""
+
+
+# --- HTTP Handling ---
+class SBAServer:
+    """
+    Minimal HTTP/1.1 front-end for the encoder and decoder.
+
+    Endpoints:
+        POST /encode?profile=&encoding=&framing=&compression=   text body -> WAV (streamed as it is synthesized)
+        POST /decode?profile=&backend=&encoding=   WAV body -> text/plain
+        GET  /health
+
+    All numpy work runs in a process pool, so the event loop only moves bytes. At most
+    MAX_CONCURRENT_REQUESTS requests are processed at once.
+    """
+
+    def __init__(self, workers=SERVER_WORKERS, max_concurrent=MAX_CONCURRENT_REQUESTS):
+        self.executor = ProcessPoolExecutor(max_workers=workers or os.cpu_count() or 1)
+        self.slots = asyncio.Semaphore(max_concurrent)
+        self.server = None
+
+    async def start(self, host=SERVER_HOST, port=SERVER_PORT, unix_socket=SERVER_UNIX_SOCKET):
+        """Starts listening; returns the asyncio server."""
+        # Start the workers now, so the first request does not pay for it
+        await asyncio.get_running_loop().run_in_executor(self.executor, _synthesize_job, (b'\0', 1, False, None))
+        if unix_socket:
+            self.server = await asyncio.start_unix_server(self.handle_connection, path=unix_socket,
+                                                          limit=MAX_HEADER_BYTES)
+            logger.info(f"服务已启动: unix:{unix_socket}")
+        else:
+            self.server = await asyncio.start_server(self.handle_connection, host, port, limit=MAX_HEADER_BYTES)
+            bound = self.server.sockets[0].getsockname()
+            logger.info(f"服务已启动: http://{bound[0]}:{bound[1]}")
+        return self.server
+
+    async def close(self):
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+        self.executor.shutdown(wait=True)
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                try:
+                    request = await asyncio.wait_for(self._read_request(reader), IDLE_TIMEOUT)
+                except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+                    return
+                if request is None:
+                    return
+                method, target, headers, body = request
+                keep_alive = headers.get("connection", "").lower() != "close"
+                started = time.perf_counter()
+                try:
+                    status = await self._dispatch(method, target, headers, body, writer)
+                except RequestError as e:
+                    status = e.status
+                    await self._send(writer, e.status, str(e).encode('utf-8'), "text/plain; charset=utf-8")
+                logger.info(f"{method} {target} -> {status} ({(time.perf_counter() - started) * 1000:.1f} 毫秒)")
+                if not keep_alive:
+                    return
+        except ConnectionError:
+            pass
+        except Exception as e:
+            logger.error(f"错误: 处理请求时发生未知错误: {e}")
+        finally:
+            writer.close()
+
+    async def _read_request(self, reader):
+        try:
+            head = await reader.readuntil(b"\r\n\r\n")
+        except asyncio.LimitOverrunError:
+            raise ConnectionError("header too large") from None
+        except asyncio.IncompleteReadError as e:
+            if not e.partial:
+                return None # Client closed a keep-alive connection
+            raise
+        lines = head.decode('latin-1').split("\r\n")
+        try:
+            method, target, _ = lines[0].split(" ", 2)
+        except ValueError:
+            raise ConnectionError("malformed request line") from None
+        headers = {}
+        for line in lines[1:]:
+            if ":" in line:
+                name, value = line.split(":", 1)
+                headers[name.strip().lower()] = value.strip()
+        body = b""
+        if method == "POST":
+            limit = MAX_ENCODE_BYTES if urlsplit(target).path == "/encode" else MAX_DECODE_BYTES
+            length = headers.get("content-length")
+            if length is None or not length.isdigit():
+                body = RequestError(411, "需要 Content-Length")
+            elif int(length) > limit:
+                body = RequestError(413, f"请求体过大 (上限 {limit} 字节)")
+                headers["connection"] = "close" # The body is not read, so the connection cannot be reused
+            else:
+                body = await reader.readexactly(int(length))
+        return method, target, headers, body
+
+    async def _dispatch(self, method, target, headers, body, writer):
+        if isinstance(body, RequestError):
+            raise body
+        url = urlsplit(target)
+        params = {name: values[-1] for name, values in parse_qs(url.query).items()}
+        if url.path == "/health":
+            await self._send(writer, 200, b"ok\n", "text/plain; charset=utf-8")
+            return 200
+        if url.path not in ("/encode", "/decode"):
+            raise RequestError(404, f"未知路径: {url.path}")
+        if method != "POST":
+            raise RequestError(405, "请使用 POST")
+        try:
+            await asyncio.wait_for(self.slots.acquire(), QUEUE_TIMEOUT)
+        except asyncio.TimeoutError:
+            raise RequestError(503, "服务繁忙，请稍后重试") from None
+        try:
+            if url.path == "/encode":
+                return await self._encode(params, headers, body, writer)
+            return await self._decode(params, body, writer)
+        finally:
+            self.slots.release()
+
+    async def _encode(self, params, headers, body, writer):
+        charset = _content_charset(headers.get("content-type", "")) or "utf-8"
+        encoding = params.get("encoding", "utf-8")
+        try:
+            profile = get_profile(params.get("profile"))
+        except ValueError as e:
+            raise RequestError(400, str(e)) from None
+        try:
+            data = body.decode(charset).encode(encoding)
+        except (ValueError, LookupError) as e: # Unicode errors are ValueErrors
+            raise RequestError(400, f"无法编码请求文本: {e}") from None
+        if not data:
+            raise RequestError(400, "请求文本为空")
+        framing = _flag(params, "framing", FRAMING_ENABLED)
+        compression = params.get("compression", COMPRESSION)
+        if compression == "none":
+            compression = None
+        if compression and compression not in CODECS:
+            raise RequestError(400, f"未知的压缩算法: {compression} (可选 {', '.join(CODECS)}, none)")
+
+        loop = asyncio.get_running_loop()
+        job = (data, framing, compression)
+        packed, n_bits, metadata = await loop.run_in_executor(self.executor, _payload_job, job)
+        bits = BitSequence(packed, n_bits)
+        header = wav_header(len(bits), profile, metadata)
+        content_length = len(header) + synthesized_frames(len(bits), profile) * 2
+        writer.write(_response_head(200, "audio/wav", content_length) + header)
+
+        jobs = ((chunk.data, len(chunk), index > 0, profile)
+                for index, chunk in enumerate(bits.iter_chunks(RESPONSE_CHUNK_BITS)))
+        # Keep one chunk in flight in the pool while the previous one is being sent
+        pending = loop.run_in_executor(self.executor, _synthesize_job, next(jobs))
+        for job in jobs:
+            following = loop.run_in_executor(self.executor, _synthesize_job, job)
+            writer.write(await pending)
+            await writer.drain()
+            pending = following
+        writer.write(await pending)
+        await writer.drain()
+        return 200
+
+    async def _decode(self, params, body, writer):
+        try:
+            profile = get_profile(params["profile"]) if "profile" in params else None
+        except ValueError as e:
+            raise RequestError(400, str(e)) from None
+        job = (body, profile, params.get("backend"), params.get("encoding", "utf-8"))
+        text, error = await asyncio.get_running_loop().run_in_executor(self.executor, _decode_job, job)
+        if text is None:
+            raise RequestError(422, error)
+        data = text.encode('utf-8')
+        writer.write(_response_head(200, "text/plain; charset=utf-8", len(data)))
+        for start in range(0, len(data), RESPONSE_CHUNK_BYTES):
+            writer.write(data[start:start + RESPONSE_CHUNK_BYTES])
+            await writer.drain()
+        if not data:
+            await writer.drain()
+        return 200
+
+    async def _send(self, writer, status, data, content_type):
+        writer.write(_response_head(status, content_type, len(data)) + data)
+        await writer.drain()
+
+
+def _response_head(status, content_type, content_length):
+    return (f"HTTP/1.1 {status} {_REASONS.get(status, '')}\r\n"
+            f"Content-Type: {content_type}\r\n"
+            f"Content-Length: {content_length}\r\n\r\n").encode('latin-1')
+
+
+def _flag(params, name, default):
+    """A boolean query parameter ("1"/"true"/"yes"/"on" or "0"/"false"/"no"/"off")."""
+    value = params.get(name)
+    if value is None:
+        return default
+    if value.lower() in ("1", "true", "yes", "on"):
+        return True
+    if value.lower() in ("0", "false", "no", "off"):
+        return False
+    raise RequestError(400, f"参数 {name} 的值无效: {value}")
+
+
+def _content_charset(content_type):
+    for part in content_type.split(";")[1:]:
+        name, _, value = part.strip().partition("=")
+        if name.lower() == "charset":
+            return value.strip('"')
+    return None
+
+
+async def serve(host=SERVER_HOST, port=SERVER_PORT, unix_socket=SERVER_UNIX_SOCKET, workers=SERVER_WORKERS):
+    """Runs the server until cancelled (Ctrl+C)."""
+    sba_server = SBAServer(workers)
+    server = await sba_server.start(host, port, unix_socket)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await sba_server.close()
+
+
+if __name__ == "__main__":
+    configure_logging()
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
@@ -1,26 +1,71 @@
 # 把音频转化为字符
 # -*- coding: utf-8 -*-
 
+import codecs
+import itertools
 import numpy as np
-import scipy.io.wavfile as wavfile
-import scipy.fft
 import os
+import struct
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from fractions import Fraction
+from bitseq import BitSequence
+from cache import file_digest, resolve_cache
+from compression import Decompressor, compression_from_metadata, decompress_bytes
+from framing import framing_from_metadata, log_frame_report, unframe_bits
+from instrument import capture_logs, count, get_logger, phase, progress
+from modem import PROFILES, get_profile, parse_metadata, profile_from_constants, profile_from_metadata, \
+    streams_from_metadata
 
+logger = get_logger("translator")
 
-# --- Configuration - MUST MATCH audio.py ---
-EXPECTED_SAMPLE_RATE = 44100 # Expected sample rate
-FREQ_0 = 440                 # Frequency for '0' (Hz)
-FREQ_1 = 880                 # Frequency for '1' (Hz)
-TONE_DURATION = 0.1          # Duration of each tone (seconds)
-SILENCE_DURATION = 0.05      # Duration of silence between tones (seconds)
+
+# --- Configuration ---
+# Defaults come from the shared 'classic' profile in modem.py. They are used when a WAV
+# file carries no profile metadata and no profile is passed explicitly.
+_CLASSIC = PROFILES["classic"]
+EXPECTED_SAMPLE_RATE = _CLASSIC.sample_rate   # Expected sample rate
+FREQ_0, FREQ_1 = _CLASSIC.frequencies         # Frequencies for '0' / '1' (Hz)
+TONE_DURATION = _CLASSIC.tone_duration        # Duration of each tone (seconds)
+SILENCE_DURATION = _CLASSIC.silence_duration  # Duration of silence between tones (seconds)
 # --- Decoding Parameters ---
 AMPLITUDE_THRESHOLD = 0.1 # Adjust based on generated amplitude and noise
 FREQUENCY_THRESHOLD = (FREQ_0 + FREQ_1) / 2 # Midpoint frequency
+# --- Classifier Backend ---
+# 'dft': energy at every profile tone for a whole batch of windows in one matrix product
+# 'fft': original per-window scipy.fft peak search (kept for comparison)
+CLASSIFIER_BACKEND = 'dft'
+CLASSIFIER_BATCH_WINDOWS = 256 # Windows converted to float per batch (bounds memory)
+# --- Symbol Synchronization ---
+SYNC_ENABLED = True # Locate tone onsets instead of assuming the first tone starts at sample 0
+SYNC_HOP_DURATION = 0.001 # Envelope resolution (seconds)
+SYNC_WINDOW_FRACTION = 0.8 # Part of each tone (around its center) analyzed after sync
+# --- Parallel Decoding ---
+DECODE_WORKERS = None # Worker processes for decode_audio_file; None/1 decodes serially
+PARALLEL_MIN_WINDOWS = 256 # Smallest cycle-aligned range handed to one worker
+# --- Streaming Decoder ---
+STREAM_BLOCK_FRAMES = 4096 # Samples read per block when decoding a live capture
+FOLLOW_POLL_INTERVAL = 0.2 # Seconds between checks of a growing WAV file
+FOLLOW_IDLE_TIMEOUT = 10.0 # Stop following a WAV file after this many seconds without new data
+# --- Diagnostics / Calibration ---
+DIAGNOSTICS_PATH = None # Save per-symbol diagnostics of decode_audio_file to this .npy file (see symbol_diagnostics_dtype)
+AUTO_CALIBRATE = False # Derive AMPLITUDE_THRESHOLD from the recording itself (see calibrate_amplitude_threshold)
+CALIBRATION_MIN_SEPARATION = 4.0 # Tone / noise peak levels closer than this ratio count as one group
+CALIBRATION_LEVEL_FLOOR = 1 / 32768 # Levels below one 16-bit step (e.g. leakage into idle FDM subchannels) are silence
+# --- Input Conversion ---
+CHANNEL_MODE = 0 # Channel to decode: an index, "mix" (average of all channels) or "best" (highest tone SNR)
+CHANNEL_PROBE_SECONDS = 2.0 # Audio scored per channel to pick the "best" one
+RESAMPLE_MAX_FACTOR = 1000 # Largest up/down factor for resample_poly; rarer rate ratios are approximated
+RESAMPLE_BLOCK_FRAMES = 1 << 16 # Input samples resampled per chunk
+
+STREAM_SEPARATOR = "\f" # Joins the documents of a multiplexed WAV (see audio.multiplex_to_audio) in the decoded text
 
 def analyze_tone_segment(segment, sample_rate):
     """
     Analyzes an audio segment using FFT to find the dominant frequency.
     """
+    import scipy.fft # Deferred: scipy is only needed by the 'fft' backend and for reading WAV files
     if np.max(np.abs(segment)) < AMPLITUDE_THRESHOLD:
         return 0.0 # Considered silence
 
@@ -40,52 +85,317 @@ def analyze_tone_segment(segment, sample_rate):
         # print("Warning: Could not find dominant frequency peak.") # Reduced verbosity
         return -1.0
     except Exception as e:
-        print(f"Warning: Error during FFT analysis: {e}")
+        logger.warning(f"Warning: Error during FFT analysis: {e}")
         return -1.0
 
 
 # **** MODIFIED FUNCTION ****
-def decode_audio_to_binary(audio_data, sample_rate):
+def decode_audio_to_binary(audio_data, sample_rate, scale_factor=None, backend=None, profile=None):
+    """
+    Legacy adapter around decode_audio_to_bits that returns the bits as a '0'/'1' string
+    (no separators), or None if decoding fails.
+    """
+    bits = decode_audio_to_bits(audio_data, sample_rate, scale_factor, backend, profile=profile)
+    return None if bits is None else bits.to_string('')
+
+
+def active_profile(profile=None):
+    """
+    Resolves the modem profile to decode with: a name or ModemProfile, or None for the
+    EXPECTED_SAMPLE_RATE / FREQ_0 / FREQ_1 / TONE_DURATION / SILENCE_DURATION constants.
     """
-    Decodes the audio data into a binary string based on detected frequencies.
+    if profile is not None:
+        return get_profile(profile)
+    return profile_from_constants(EXPECTED_SAMPLE_RATE, (FREQ_0, FREQ_1), TONE_DURATION,
+                                  SILENCE_DURATION, _CLASSIC.amplitude)
+
+
+def decode_audio_to_bits(audio_data, sample_rate, scale_factor=None, backend=None, sync=None, profile=None,
+                         diagnostics=False):
+    """
+    Decodes the audio data into a packed BitSequence based on detected frequencies.
     (Revised loop logic to potentially capture the last bit)
 
     Args:
-        audio_data (np.array): The audio waveform data (normalized float).
+        audio_data (np.array): The audio waveform data. Either normalized float, or raw
+                               samples (e.g. a memory-mapped int16 array) together with
+                               `scale_factor`.
         sample_rate (int): The sample rate of the audio.
+        scale_factor (float | None): If given, each analysis window is converted to float
+                                     and divided by this value on the fly, so the full
+                                     recording is never copied.
+        backend (str | None): 'dft' or 'fft'; defaults to CLASSIFIER_BACKEND.
+        sync (bool | None): Run symbol synchronization (see estimate_symbol_timing) and
+                            decode from the detected symbol centers when the recording is
+                            offset or its clock drifts; defaults to SYNC_ENABLED.
+                            Profiles without silence gaps are always decoded on the grid.
+        profile (str | ModemProfile | None): Modem profile the audio was encoded with,
+                                             see active_profile.
+        diagnostics (bool): Also return per-symbol diagnostics (see
+                            symbol_diagnostics_dtype), collected in the same pass.
+                            They come from the 'dft' classifier, which is then used
+                            whatever `backend` says.
+
+    Audio at another sample rate than the profile's is decoded with the symbol timing
+    scaled to that rate, or resampled first when the timing does not fall on whole
+    samples (see resample_plan).
 
     Returns:
-        str: The decoded binary string, or None if decoding fails.
+        BitSequence: The decoded bits, or None if decoding fails. With diagnostics=True,
+                     a (bits, diagnostics array) tuple, or None.
     """
-    if sample_rate != EXPECTED_SAMPLE_RATE:
-        print(f"错误: 音频采样率 ({sample_rate} Hz) 与预期 ({EXPECTED_SAMPLE_RATE} Hz) 不符。")
+    try:
+        profile, ratio = _planned_profile(sample_rate, profile)
+    except ValueError as e:
+        logger.error(f"错误: {e}")
+        return None
+    if ratio is not None:
+        with phase("resample"):
+            audio_data = resample_audio(audio_data, *ratio, scale_factor)
+        sample_rate, scale_factor = profile.sample_rate, None
+
+    backend = _resolve_backend(backend, diagnostics)
+    if backend is None:
+        return None
+
+    layout = _symbol_layout(sample_rate, profile)
+    if layout is None:
+        return None
+    tone_samples, silence_samples, cycle_samples = layout
+
+    count("samples_analyzed", len(audio_data))
+    logger.info(f"音频总长度: {len(audio_data)/sample_rate:.2f} 秒")
+    logger.info(f"调制参数: {describe_profile(profile)}")
+    logger.info(f"预期样本数: 音调={tone_samples}, 静音={silence_samples}, 每符号周期(估算)={cycle_samples}")
+    logger.info(f"分类后端: {backend}")
+
+    starts = None
+    window_samples = tone_samples
+    if (SYNC_ENABLED if sync is None else sync) and silence_samples > 0:
+        timing = estimate_symbol_timing(audio_data, sample_rate, scale_factor, profile)
+        if timing is not None and not _timing_is_nominal(timing, len(audio_data), sample_rate, profile):
+            offset, period = timing
+            logger.info(f"符号同步: 首个音调起点 {offset:.1f} 样本，周期 {period:.2f} 样本 (标称 {cycle_samples})。")
+            starts, window_samples = _synchronized_starts(offset, period, len(audio_data), tone_samples)
+    if diagnostics:
+        decoded_bits, uncertain_bits, analyzed_segment_count, symbol_diagnostics = _decode_windows_dft(
+            audio_data, sample_rate, scale_factor, window_samples, cycle_samples, starts, profile, diagnostics=True)
+        return _finish_decode(decoded_bits, uncertain_bits, analyzed_segment_count), symbol_diagnostics
+    decode_windows = _decode_windows_fft if backend == 'fft' else _decode_windows_dft
+    decoded_bits, uncertain_bits, analyzed_segment_count = decode_windows(
+        audio_data, sample_rate, scale_factor, window_samples, cycle_samples, starts, profile)
+
+    return _finish_decode(decoded_bits, uncertain_bits, analyzed_segment_count)
+
+
+def describe_profile(profile):
+    """One-line description of a profile's tone layout, for the decode banners."""
+    layout = f"{len(profile.frequencies)} 个音调, 每符号 {profile.bits_per_symbol} 位"
+    if profile.subchannels > 1:
+        layout += f", {profile.subchannels} 个子信道 (每周期 {profile.bits_per_period} 位)"
+    return f"{profile.name} ({layout})"
+
+
+def _resolve_backend(backend, diagnostics=False):
+    """Validates the classifier backend; returns it, or None after logging an error."""
+    backend = backend or CLASSIFIER_BACKEND
+    if backend not in ('dft', 'fft'):
+        logger.error(f"错误: 未知的分类后端 '{backend}'，可选 'dft' 或 'fft'。")
         return None
+    if diagnostics and backend != 'dft':
+        logger.info("诊断数据由 dft 分类器生成，本次改用 dft 后端。")
+        return 'dft'
+    return backend
+
+
+# --- Sample Rate Conversion ---
+def resample_plan(sample_rate, profile):
+    """
+    Decides how to decode audio recorded at `sample_rate` with `profile`.
+
+    When the tone and silence durations are whole numbers of samples at that rate (e.g.
+    48 kHz or 16 kHz for 'classic'), the symbol timing is simply scaled and the audio is
+    decoded as it is. Otherwise it is resampled to the profile's rate with
+    resample_poly, so the symbol grid does not drift.
+
+    Returns:
+        tuple: (profile to decode with, (up, down) resampling factors or None)
+
+    Raises:
+        ValueError: If a profile tone lies above the Nyquist frequency of the recording.
+    """
+    if sample_rate == profile.sample_rate:
+        return profile, None
+    if max(profile.frequencies) >= sample_rate / 2:
+        raise ValueError(f"音频采样率 ({sample_rate} Hz) 过低，无法表示调制参数 '{profile.name}' "
+                         f"的最高频率 {max(profile.frequencies)} Hz")
+    tone, silence = profile.tone_duration * sample_rate, profile.silence_duration * sample_rate
+    if abs(tone - round(tone)) < 1e-6 and abs(silence - round(silence)) < 1e-6:
+        try:
+            return profile._replace(sample_rate=sample_rate).validate(), None
+        except ValueError:
+            pass # e.g. a gap-less tone no longer completes whole cycles per symbol
+    ratio = Fraction(profile.sample_rate, sample_rate).limit_denominator(RESAMPLE_MAX_FACTOR)
+    if max(ratio.numerator, ratio.denominator) > RESAMPLE_MAX_FACTOR:
+        ratio = Fraction(round(ratio * RESAMPLE_MAX_FACTOR), RESAMPLE_MAX_FACTOR)
+    return profile, (ratio.numerator, ratio.denominator)
+
+
+def _planned_profile(sample_rate, profile):
+    """resample_plan for active_profile(profile), logging the decision."""
+    nominal = active_profile(profile)
+    profile, ratio = resample_plan(sample_rate, nominal)
+    if ratio is not None:
+        logger.info(f"重采样: {sample_rate} Hz -> {profile.sample_rate} Hz (×{ratio[0]}/{ratio[1]})。")
+    elif sample_rate != nominal.sample_rate:
+        logger.info(f"按 {sample_rate} Hz 换算符号时序 (调制参数标称 {nominal.sample_rate} Hz)。")
+    return profile, ratio
+
+
+class PolyphaseResampler:
+    """
+    scipy.signal.resample_poly applied chunk by chunk: process() takes blocks of any
+    length and returns the output samples that are final so far, finish() the rest.
+    The concatenated output matches resample_poly on the whole signal (to rounding)
+    while only about one chunk is held in memory.
+
+    Chunks are cut at multiples of `down` input samples, so each cut falls on a whole
+    output sample, and overlap their neighbours by more than the filter half-length.
+    """
+
+    def __init__(self, up, down, block_frames=RESAMPLE_BLOCK_FRAMES):
+        self.up, self.down = up, down
+        half_length = 10 * max(up, down) # resample_poly's default filter, at the upsampled rate
+        self._context = -(-(half_length // up + 2) // down) * down
+        self._step = max(block_frames // down * down, self._context)
+        self._buffer = np.empty(0)
+        self._left = 0 # Context samples at the start of the buffer (already resampled)
+
+    def process(self, block):
+        """Resamples one block; returns a float array (possibly empty)."""
+        from scipy.signal import resample_poly
+        self._buffer = np.concatenate((self._buffer, np.asarray(block, dtype=float)))
+        pieces = []
+        while len(self._buffer) >= self._left + self._step + self._context:
+            resampled = resample_poly(self._buffer[:self._left + self._step + self._context], self.up, self.down)
+            first = self._left * self.up // self.down
+            pieces.append(resampled[first:first + self._step * self.up // self.down])
+            self._buffer = self._buffer[self._left + self._step - self._context:]
+            self._left = self._context
+        return np.concatenate(pieces) if pieces else np.empty(0)
+
+    def finish(self):
+        """Resamples what is left at the end of the signal."""
+        from scipy.signal import resample_poly
+        if len(self._buffer) <= self._left:
+            tail = np.empty(0)
+        else:
+            tail = resample_poly(self._buffer, self.up, self.down)[self._left * self.up // self.down:]
+        self._buffer = np.empty(0)
+        self._left = 0
+        return tail
+
+
+def resample_audio(audio_data, up, down, scale_factor=None):
+    """
+    Resamples a whole recording by up/down in chunks (see PolyphaseResampler), so only
+    the output and one chunk are converted to float.
+
+    Returns:
+        np.ndarray: float32 samples, normalized with scale_factor.
+    """
+    resampler = PolyphaseResampler(up, down)
+    output = np.empty(-(-len(audio_data) * up // down), dtype=np.float32)
+    position = 0
+    for start in itertools.chain(range(0, len(audio_data), RESAMPLE_BLOCK_FRAMES), [None]):
+        if start is None:
+            piece = resampler.finish()
+        else:
+            block = audio_data[start:start + RESAMPLE_BLOCK_FRAMES].astype(float)
+            if scale_factor is not None:
+                block /= scale_factor
+            piece = resampler.process(block)
+        output[position:position + len(piece)] = piece
+        position += len(piece)
+    return output[:position]
+
 
+def _symbol_layout(sample_rate, profile):
+    """
+    Returns (tone_samples, silence_samples, cycle_samples) for the given sample rate,
+    or None (after printing an error) if the audio parameters are invalid.
+    """
     # Calculate expected number of samples per part
-    tone_samples = int(TONE_DURATION * sample_rate)
-    silence_samples = int(SILENCE_DURATION * sample_rate)
-    # Samples per presumed bit cycle (tone + potential silence)
+    tone_samples = round(profile.tone_duration * sample_rate)
+    silence_samples = round(profile.silence_duration * sample_rate)
+    # Samples per presumed symbol cycle (tone + potential silence)
     cycle_samples = tone_samples + silence_samples
 
     # Basic validation
     if cycle_samples <= 0 or tone_samples <= 0:
-        print("错误: 计算出的周期或音调样本数为0或负数，请检查音频参数。")
+        logger.error("错误: 计算出的周期或音调样本数为0或负数，请检查音频参数。")
         return None
+    return tone_samples, silence_samples, cycle_samples
+
+
+def _finish_decode(decoded_bits, uncertain_bits, analyzed_segment_count):
+    """Prints the decode summary and packs the decoded bit array into a BitSequence."""
+    logger.info(f"解码分析完成。共分析 {analyzed_segment_count} 个潜在周期。跳过 {uncertain_bits} 个不确定/静音周期。")
+    count("segments_analyzed", analyzed_segment_count)
+    count("uncertain_segments", uncertain_bits)
+    count("bits_decoded", len(decoded_bits))
+
+    # Check if any bits were decoded, especially if many were uncertain
+    if not len(decoded_bits) and uncertain_bits == analyzed_segment_count and analyzed_segment_count > 0:
+        logger.warning("警告：分析了周期但未能解码任何确定的比特。请检查音频质量或解码参数（特别是 AMPLITUDE_THRESHOLD）。")
+        # You might return None or empty string depending on desired behavior
+        # return None
+
+    return BitSequence.from_array(decoded_bits)
+
+
+def symbols_to_bits(symbols, bits_per_symbol):
+    """Expands symbol indices into their bits_per_symbol bits each (MSB first)."""
+    symbols = np.asarray(symbols, dtype=np.int64)
+    if bits_per_symbol == 1:
+        return symbols.astype(np.uint8)
+    shifts = np.arange(bits_per_symbol - 1, -1, -1)
+    return ((symbols[:, None] >> shifts) & 1).astype(np.uint8).ravel()
 
-    print(f"音频总长度: {len(audio_data)/sample_rate:.2f} 秒")
-    print(f"预期样本数: 音调={tone_samples}, 静音={silence_samples}, 每比特周期(估算)={cycle_samples}")
 
-    decoded_bits = []
+def _decode_windows_fft(audio_data, sample_rate, scale_factor, tone_samples, cycle_samples, starts=None,
+                        profile=None):
+    """
+    Per-window FFT loop: finds the dominant frequency of each tone window and maps it
+    to the nearest profile tone.
+
+    Windows start every cycle_samples from sample 0, or at the explicit `starts`
+    positions (from symbol synchronization) when given.
+
+    A single dominant frequency cannot describe the simultaneous tones of a
+    frequency-division multiplexed profile; those are decoded by _decode_windows_dft.
+
+    Returns:
+        tuple: (decoded bits as a uint8 array, uncertain_bits, analyzed_segment_count)
+    """
+    profile = profile or active_profile()
+    if profile.subchannels > 1:
+        return _decode_windows_dft(audio_data, sample_rate, scale_factor, tone_samples, cycle_samples, starts,
+                                   profile)
+    frequencies = np.asarray(profile.frequencies, dtype=float)
+    decoded_symbols = []
     uncertain_bits = 0
-    current_pos = 0
     analyzed_segment_count = 0 # Keep track of processed segments
+    if starts is None:
+        # As long as there is enough data remaining for at least a tone segment
+        starts = range(0, len(audio_data) - tone_samples + 1, cycle_samples)
 
     # --- Revised Loop ---
-    # Loop as long as there is enough data remaining for at least a tone segment
-    while current_pos + tone_samples <= len(audio_data):
-        start_index = current_pos
+    for start_index in starts:
         end_index = start_index + tone_samples
         segment = audio_data[start_index:end_index]
+        if scale_factor is not None:
+            segment = segment.astype(float) / scale_factor
 
         # Analyze the segment
         dominant_freq = analyze_tone_segment(segment, sample_rate)
@@ -93,16 +403,13 @@ def decode_audio_to_binary(audio_data, sample_rate):
         bit_decoded = False
         # Check if frequency is clearly identifiable and closer to one of the targets
         if dominant_freq > 0: # Check if it's not silence or FFT error (-1.0)
-            dist_to_0 = abs(dominant_freq - FREQ_0)
-            dist_to_1 = abs(dominant_freq - FREQ_1)
-            # Simple comparison: is it closer to 0 or 1?
-            if dist_to_0 < dist_to_1 and dominant_freq < FREQUENCY_THRESHOLD: # Closer to FREQ_0
-                decoded_bits.append('0')
+            distances = np.abs(frequencies - dominant_freq)
+            nearest = int(np.argmin(distances))
+            # For a binary profile this is the old "closer to FREQ_0 / FREQ_1" test
+            if np.count_nonzero(distances == distances[nearest]) == 1:
+                decoded_symbols.append(nearest)
                 bit_decoded = True
-            elif dist_to_1 < dist_to_0 and dominant_freq > FREQUENCY_THRESHOLD: # Closer to FREQ_1
-                decoded_bits.append('1')
-                bit_decoded = True
-            #else: # Frequency might be ambiguous, right in the middle, or far from both
+            #else: # Frequency might be ambiguous, right in the middle between two tones
                 # print(f"Warning: Ambiguous frequency {dominant_freq:.1f} Hz at segment {analyzed_segment_count}")
 
         if not bit_decoded:
@@ -111,191 +418,1468 @@ def decode_audio_to_binary(audio_data, sample_rate):
             # Optional: Log details about uncertain segments if needed for debugging
             # print(f"Segment {analyzed_segment_count}: Uncertain (Freq: {dominant_freq:.1f} Hz). Skipping.")
 
-        # Move to the start of the next potential cycle
-        current_pos += cycle_samples
         analyzed_segment_count += 1
 
-        # Optional: Add progress indicator
+        # Optional: Add progress indicator (see instrument.instrumented)
         if analyzed_segment_count % 50 == 0:
-             print(f"  解码进度: 已分析 {analyzed_segment_count} 个潜在周期...", end='\r')
+             progress("decode", analyzed_segment_count, len(starts))
     # --- End Revised Loop ---
 
-    print("\n" + " " * 50 + f"\r解码分析完成。共分析 {analyzed_segment_count} 个潜在周期。跳过 {uncertain_bits} 个不确定/静音周期。")
+    decoded_bits = symbols_to_bits(decoded_symbols, profile.bits_per_symbol)
+    return decoded_bits, uncertain_bits, analyzed_segment_count
+
+
+def tone_windows(audio_data, tone_samples, cycle_samples):
+    """
+    Returns a read-only 2-D strided view of all tone windows: row k is
+    audio_data[k * cycle_samples : k * cycle_samples + tone_samples]. No data is copied,
+    so this also works directly on a memory-mapped recording.
+    """
+    if len(audio_data) < tone_samples:
+        return np.empty((0, tone_samples), dtype=audio_data.dtype)
+    n_windows = (len(audio_data) - tone_samples) // cycle_samples + 1
+    stride = audio_data.strides[0]
+    return np.lib.stride_tricks.as_strided(audio_data, shape=(n_windows, tone_samples),
+                                           strides=(cycle_samples * stride, stride),
+                                           writeable=False)
+
+
+def dft_basis(frequencies, n_samples, sample_rate):
+    """
+    Precomputes the DFT basis for the given target frequencies.
+
+    Returns:
+        np.ndarray: Real array of shape (n_samples, 2 * len(frequencies)) holding the cosine
+                    columns followed by the sine columns. For a window x, (x @ basis) gives the
+                    real and imaginary parts of its spectrum at each target frequency, the same
+                    value a Goertzel filter would produce.
+    """
+    t = np.arange(n_samples) / sample_rate
+    phase = 2 * np.pi * np.outer(t, frequencies)
+    return np.hstack((np.cos(phase), np.sin(phase)))
+
+
+def target_energies(windows, basis):
+    """Energy at each target frequency for every row of `windows` (one matrix product)."""
+    projections = windows @ basis
+    n_freqs = basis.shape[1] // 2
+    return projections[:, :n_freqs] ** 2 + projections[:, n_freqs:] ** 2
+
+
+def _decode_windows_dft(audio_data, sample_rate, scale_factor, tone_samples, cycle_samples, starts=None,
+                        profile=None, diagnostics=False):
+    """
+    Vectorized classifier: picks the profile tone with the most energy for batches of
+    windows taken from a strided view of the recording, or gathered at the explicit
+    `starts` positions (from symbol synchronization) when given.
+
+    For a frequency-division multiplexed profile the energies of all subchannels' tones
+    come from the same matrix product and each subchannel is decided on its own; a
+    subchannel counts as audible when its tone level, times the number of subchannels,
+    reaches AMPLITUDE_THRESHOLD. Bits are returned window by window in subchannel order,
+    as the encoder splits them.
+
+    Returns:
+        tuple: (decoded bits as a uint8 array, uncertain_bits, analyzed_segment_count),
+               plus the per-symbol diagnostics array when diagnostics=True.
+    """
+    if starts is None:
+        windows = tone_windows(audio_data, tone_samples, cycle_samples)
+        n_windows = len(windows)
+    else:
+        offsets = np.arange(tone_samples)
+        n_windows = len(starts)
+    profile = profile or active_profile()
+    subchannels, n_tones = profile.subchannels, profile.tones_per_subchannel
+    basis = dft_basis(profile.frequencies, tone_samples, sample_rate)
+    symbols = np.empty((n_windows, subchannels), dtype=np.int16) # -1 marks an uncertain window
+    energy_scale = (tone_samples / 2) ** 2 # A full-scale tone of amplitude A has energy A**2
+    if diagnostics:
+        report = np.empty((n_windows, subchannels), dtype=symbol_diagnostics_dtype(n_tones))
+        report["offset"] = (np.arange(n_windows) * cycle_samples if starts is None else starts)[:, None]
+        report["subchannel"] = np.arange(subchannels)
+
+    for start in range(0, n_windows, CLASSIFIER_BATCH_WINDOWS):
+        if starts is None:
+            batch = windows[start:start + CLASSIFIER_BATCH_WINDOWS].astype(float)
+        else:
+            batch = audio_data[starts[start:start + CLASSIFIER_BATCH_WINDOWS, None] + offsets].astype(float)
+        if scale_factor is not None:
+            batch /= scale_factor
+        energies = target_energies(batch, basis).reshape(len(batch), subchannels, n_tones)
+        batch_symbols = np.argmax(energies, axis=2).astype(np.int16)
+        best = np.take_along_axis(energies, batch_symbols[..., None], axis=2)[..., 0]
+        ambiguous = np.count_nonzero(energies == best[..., None], axis=2) > 1
+        if subchannels == 1:
+            peaks = np.max(np.abs(batch), axis=1)[:, None]
+        else:
+            peaks = np.sqrt(best / energy_scale) * subchannels
+        audible = peaks >= AMPLITUDE_THRESHOLD
+        if diagnostics:
+            _fill_diagnostics(report[start:start + len(batch)].reshape(-1),
+                              energies.reshape(-1, n_tones) / energy_scale, best.reshape(-1) / energy_scale,
+                              batch_symbols.reshape(-1), peaks.reshape(-1), (~audible | ambiguous).reshape(-1))
+        batch_symbols[~audible | ambiguous] = -1 # Silence / ambiguous
+        symbols[start:start + len(batch)] = batch_symbols
+        progress("decode", start + len(batch), n_windows)
+
+    decoded_symbols = symbols[symbols >= 0]
+    decoded_bits = symbols_to_bits(decoded_symbols, profile.bits_per_symbol)
+    if diagnostics:
+        return decoded_bits, symbols.size - len(decoded_symbols), symbols.size, report.reshape(-1)
+    return decoded_bits, symbols.size - len(decoded_symbols), symbols.size
+
+
+# --- Symbol Diagnostics ---
+def symbol_diagnostics_dtype(n_tones):
+    """
+    Structured dtype of the per-symbol diagnostics (one record per analysis window, or
+    per window and subchannel for a frequency-division multiplexed profile, in that
+    order; n_tones is the number of tones per subchannel):
+
+        offset      sample offset of the window in the analyzed audio
+        subchannel  subchannel of the record (always 0 without multiplexing)
+        tone        index of the strongest profile tone (the decoded symbol if certain)
+        uncertain   True if the window was skipped (too quiet or a tie)
+        peak        peak absolute amplitude, compared with AMPLITUDE_THRESHOLD (with
+                    multiplexing: the subchannel's tone level times the subchannel count)
+        energy      energy at each profile tone (energy[0] at FREQ_0, energy[1] at
+                    FREQ_1); a clean tone of amplitude A scores A**2
+        snr_db      strongest tone energy over the mean of the others, in dB
+        confidence  (strongest - runner-up) / strongest: 1 is a clean tone, 0 a tie
+    """
+    return np.dtype([("offset", "<i8"), ("subchannel", "<i2"), ("tone", "<i2"), ("uncertain", "?"), ("peak", "<f4"),
+                     ("energy", "<f4", (n_tones,)), ("snr_db", "<f4"), ("confidence", "<f4")])
+
+
+def _fill_diagnostics(report, energies, best, tones, peaks, uncertain):
+    runner_up = np.partition(energies, -2, axis=1)[:, -2]
+    others = (energies.sum(axis=1) - best) / (energies.shape[1] - 1)
+    report["tone"] = tones
+    report["uncertain"] = uncertain
+    report["peak"] = peaks
+    report["energy"] = energies
+    report["snr_db"] = 10 * np.log10((best + 1e-20) / (others + 1e-20))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        report["confidence"] = np.where(best > 0, (best - runner_up) / best, 0.0)
+
+
+def classify_diagnostics(diagnostics, amplitude_threshold=None):
+    """
+    Re-derives the decoded symbols from diagnostics for another amplitude threshold,
+    without touching the audio again.
+
+    Returns:
+        np.ndarray: int16 symbols, -1 where the window would be skipped.
+    """
+    threshold = AMPLITUDE_THRESHOLD if amplitude_threshold is None else amplitude_threshold
+    keep = (diagnostics["peak"] >= threshold) & (diagnostics["confidence"] > 0)
+    return np.where(keep, diagnostics["tone"], -1).astype(np.int16)
+
+
+def calibrate_amplitude_threshold(diagnostics):
+    """
+    Suggests an AMPLITUDE_THRESHOLD for a recording from its diagnostics.
+
+    Window peaks fall into a quiet group (silence gaps, noise) and a tone group. Otsu's
+    method on the log peaks finds the split that separates them best, and the threshold
+    is placed midway (geometrically) between the two group levels. When the groups are
+    less than CALIBRATION_MIN_SEPARATION apart there is no quiet group (e.g. a gapless
+    profile), and the threshold is half the quietest tone level instead.
+
+    Returns:
+        float | None: The suggested threshold, or None if there are too few windows.
+    """
+    peaks = diagnostics["peak"].astype(float)
+    peaks = np.maximum(peaks[peaks > 0], CALIBRATION_LEVEL_FLOOR)
+    if len(peaks) < 2:
+        return None
+    levels = np.log10(peaks)
+    hist, edges = np.histogram(levels, bins=256)
+    centers = (edges[:-1] + edges[1:]) / 2
+    weight_low = np.cumsum(hist)[:-1]
+    weight_high = len(levels) - weight_low
+    sum_low = np.cumsum(hist * centers)[:-1]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean_low = sum_low / weight_low
+        mean_high = (np.sum(hist * centers) - sum_low) / weight_high
+        separation = weight_low * weight_high * (mean_high - mean_low) ** 2
+    if np.all(np.isnan(separation)):
+        return float(10 ** np.percentile(levels, 1) / 2)
+    split = int(np.nanargmax(separation))
+    if mean_high[split] - mean_low[split] < np.log10(CALIBRATION_MIN_SEPARATION):
+        return float(10 ** np.percentile(levels, 1) / 2)
+    return float(10 ** ((mean_low[split] + mean_high[split]) / 2))
+
+
+def recalibrated_bits(diagnostics, bits_per_symbol, amplitude_threshold=None):
+    """
+    Decoded bits for diagnostics under a calibrated (or the given) amplitude threshold.
+
+    Returns:
+        tuple: (BitSequence, threshold used)
+    """
+    threshold = calibrate_amplitude_threshold(diagnostics) if amplitude_threshold is None else amplitude_threshold
+    if threshold is None:
+        threshold = AMPLITUDE_THRESHOLD
+    symbols = classify_diagnostics(diagnostics, threshold)
+    decoded = symbols[symbols >= 0]
+    count("uncertain_segments_calibrated", len(symbols) - len(decoded))
+    return BitSequence.from_array(symbols_to_bits(decoded, bits_per_symbol)), threshold
+
+
+def demultiplex_bits(diagnostics, bits_per_symbol, n_streams, amplitude_threshold=None):
+    """
+    Splits the symbols of a recording made by audio.multiplex_to_audio into its
+    independent streams (stream i is subchannel i), using the diagnostics of the decode.
+
+    Returns:
+        list[BitSequence]: The bits of each stream.
+    """
+    symbols = classify_diagnostics(diagnostics, amplitude_threshold)
+    subchannels = diagnostics["subchannel"]
+    return [BitSequence.from_array(symbols_to_bits(symbols[(subchannels == index) & (symbols >= 0)], bits_per_symbol))
+            for index in range(n_streams)]
+
+
+def save_diagnostics(path, diagnostics):
+    """Saves a diagnostics array to a .npy file (load it back with np.load)."""
+    output_dir = os.path.dirname(path)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+    with phase("diagnostics"):
+        np.save(path, diagnostics)
+    logger.info(f"已保存 {len(diagnostics)} 个符号的诊断数据: {path}")
 
-    # Check if any bits were decoded, especially if many were uncertain
-    if not decoded_bits and uncertain_bits == analyzed_segment_count and analyzed_segment_count > 0:
-        print("警告：分析了周期但未能解码任何确定的比特。请检查音频质量或解码参数（特别是 AMPLITUDE_THRESHOLD）。")
-        # You might return None or empty string depending on desired behavior
-        # return None
 
-    return "".join(decoded_bits)
+def _calibrated_decode(bits, diagnostics, profile):
+    """Redoes the symbol decisions of a decode under a calibrated amplitude threshold."""
+    threshold = calibrate_amplitude_threshold(diagnostics)
+    if threshold is None:
+        logger.warning("警告: 分析窗口过少，无法校准幅度阈值，沿用原判决。")
+        return bits
+    calibrated, threshold = recalibrated_bits(diagnostics, profile.bits_per_symbol, threshold)
+    logger.info(f"校准后的幅度阈值: {threshold:.4f} (配置值 {AMPLITUDE_THRESHOLD})，"
+                f"比特数 {len(bits)} -> {len(calibrated)}")
+    return calibrated
 # **** END OF MODIFIED FUNCTION ****
 
 
+# --- Symbol Synchronization ---
+def energy_envelope(audio_data, sample_rate, scale_factor=None):
+    """
+    Peak-amplitude envelope of the recording at SYNC_HOP_DURATION resolution.
+
+    Computed in one pass over the signal, a block of frames at a time, so memory stays
+    bounded even for memory-mapped recordings.
+
+    Returns:
+        tuple: (envelope array, hop_samples)
+    """
+    hop_samples = max(1, int(SYNC_HOP_DURATION * sample_rate))
+    n_frames = len(audio_data) // hop_samples
+    envelope = np.empty(n_frames)
+    block_frames = max(1, (1 << 20) // hop_samples) # About a million samples per block
+    for first in range(0, n_frames, block_frames):
+        last = min(first + block_frames, n_frames)
+        block = np.abs(audio_data[first * hop_samples:last * hop_samples].astype(float))
+        envelope[first:last] = block.reshape(-1, hop_samples).max(axis=1)
+    if scale_factor is not None:
+        envelope /= scale_factor
+    return envelope, hop_samples
+
+
+def estimate_symbol_timing(audio_data, sample_rate, scale_factor=None, profile=None):
+    """
+    Estimates where the first tone starts and the actual bit-cycle period.
+
+    Tone onsets are the rising edges of the energy envelope (silence -> tone). Each onset
+    is assigned to its nominal cycle index, and a least-squares line through
+    (index, onset) gives the offset and the period, which absorbs leading silence,
+    trimmed starts and slight clock skew. Only meaningful for profiles with silence gaps.
+
+    Returns:
+        tuple | None: (offset_samples, period_samples) as floats, or None if too few
+                      onsets were found to synchronize.
+    """
+    layout = _symbol_layout(sample_rate, active_profile(profile))
+    if layout is None or layout[1] <= 0:
+        return None
+    tone_samples, _, cycle_samples = layout
+
+    envelope, hop_samples = energy_envelope(audio_data, sample_rate, scale_factor)
+    if not len(envelope):
+        return None
+    level = np.percentile(envelope, 90)
+    if level < AMPLITUDE_THRESHOLD:
+        return None
+    active = envelope >= level / 2
+    # A tone already running at sample 0 has no usable onset, so only count rising edges
+    onsets = np.flatnonzero(active[1:] & ~active[:-1]) + 1
+    if len(onsets) < 2:
+        return None
+    # The rising edge lies somewhere inside the first active frame
+    onsets = onsets * hop_samples + hop_samples / 2
+
+    # Rough period from neighbouring onsets (a gap may span several cycles if bits were
+    # lost), then assign every onset to its cycle index using that period so that clock
+    # skew accumulated over a long recording does not push onsets into the wrong cycle
+    gaps = np.diff(onsets)
+    gap_cycles = np.round(gaps / cycle_samples)
+    valid = gap_cycles >= 1
+    if not np.any(valid):
+        return None
+    periods = gaps[valid] / gap_cycles[valid]
+    # Onsets are quantized to the envelope hop, so average the gaps near the median
+    # rather than taking the median itself
+    periods = periods[np.abs(periods - np.median(periods)) <= 2 * hop_samples]
+    rough_period = np.mean(periods)
+    indices = np.round((onsets - onsets[0]) / rough_period)
+    keep = np.ones(len(onsets), dtype=bool)
+    for _ in range(2): # Second pass drops outliers (noise bursts, partial tones)
+        if np.count_nonzero(keep) < 2 or np.ptp(indices[keep]) == 0:
+            return None
+        period, offset = np.polyfit(indices[keep], onsets[keep], 1)
+        keep = np.abs(onsets - (offset + period * indices)) <= 2 * hop_samples
+    if np.count_nonzero(keep) < 2:
+        return None
+    # Earlier symbols may precede the first detected onset (e.g. a tone at sample 0),
+    # so report the offset of the earliest cycle that can start inside the recording
+    offset -= np.floor(offset / period) * period
+    return float(offset), float(period)
+
+
+def _timing_is_nominal(timing, n_samples, sample_rate, profile):
+    """
+    True when the estimated timing matches sample-exact framing (first tone at sample 0,
+    no drift) closely enough that the plain fixed-grid decoder can be used.
+    """
+    offset, period = timing
+    _, _, cycle_samples = _symbol_layout(sample_rate, profile)
+    tolerance = max(1, int(SYNC_HOP_DURATION * sample_rate))
+    n_cycles = n_samples / cycle_samples
+    return abs(offset) <= tolerance and abs(period - cycle_samples) * n_cycles <= tolerance
+
+
+def _synchronized_starts(offset, period, n_samples, tone_samples):
+    """
+    Window start positions centered on each detected symbol.
+
+    Returns:
+        tuple: (int64 array of start positions, window_samples)
+    """
+    window_samples = max(1, int(tone_samples * SYNC_WINDOW_FRACTION))
+    margin = (tone_samples - window_samples) / 2
+    last_index = int(np.floor((n_samples - window_samples - offset - margin) / period))
+    indices = np.arange(0, last_index + 1)
+    starts = np.round(offset + margin + indices * period).astype(np.int64)
+    # A tone cut off by a trimmed start still carries its bit if enough of it remains;
+    # analyze it from sample 0 as long as the window stays clear of the next tone
+    partial_samples = offset - period + tone_samples
+    if partial_samples >= tone_samples / 4 and window_samples <= offset:
+        starts = np.concatenate(([0], starts))
+    return starts, window_samples
+
+
+# --- Parallel Decoding ---
+def _decode_range_job(job):
+    """
+    Worker entry point: decodes windows [first_window, end_window) of a WAV file.
+
+    Each worker memory-maps the file itself, so all processes share the OS page cache
+    and no sample data is pickled or copied between them.
+
+    Returns:
+        tuple: (decoded bits as a uint8 array, uncertain_bits, analyzed_segment_count),
+               plus the range's diagnostics (offsets relative to the file) if requested.
+    """
+    input_wav_path, first_window, end_window, backend, profile, diagnostics, channel = job
+    with capture_logs(): # Log output from several workers would interleave
+        sample_rate, audio_data = read_wav_mmap(input_wav_path)
+        if audio_data.ndim > 1:
+            audio_data = audio_data[:, channel]
+        tone_samples, _, cycle_samples = _symbol_layout(sample_rate, profile)
+        window_range = audio_data[first_window * cycle_samples:(end_window - 1) * cycle_samples + tone_samples]
+        if diagnostics:
+            result = _decode_windows_dft(window_range, sample_rate, normalization_scale(audio_data.dtype),
+                                         tone_samples, cycle_samples, profile=profile, diagnostics=True)
+            result[3]["offset"] += first_window * cycle_samples
+            return result
+        decode_windows = _decode_windows_fft if backend == 'fft' else _decode_windows_dft
+        return decode_windows(window_range, sample_rate, normalization_scale(audio_data.dtype),
+                              tone_samples, cycle_samples, profile=profile)
+
+
+def decode_wav_file_parallel(input_wav_path, workers=None, backend=None, profile=None, diagnostics=False,
+                             channel=0):
+    """
+    Decodes a WAV file to a BitSequence using several worker processes.
+
+    The fixed frame layout (tone + silence per symbol) lets the recording be split into
+    contiguous ranges aligned to bit-cycle boundaries; each range is decoded independently
+    and the results are stitched back together in order. The output is identical to
+    decode_audio_to_bits on the same file.
+
+    Args:
+        input_wav_path (str): Path to the WAV file.
+        workers (int | None): Number of worker processes; None uses the core count.
+        backend (str | None): 'dft' or 'fft'; defaults to CLASSIFIER_BACKEND.
+        profile (str | ModemProfile | None): Modem profile, see active_profile.
+        diagnostics (bool): Also return per-symbol diagnostics, as decode_audio_to_bits.
+        channel (int): Channel to decode.
+
+    Returns:
+        BitSequence: The decoded bits, or None if decoding fails. With diagnostics=True,
+                     a (bits, diagnostics array) tuple, or None.
+    """
+    sample_rate, audio_data = read_wav_mmap(input_wav_path)
+    n_samples = len(audio_data)
+    del audio_data # Only the header information is needed here
+
+    try:
+        profile, ratio = _planned_profile(sample_rate, profile)
+    except ValueError as e:
+        logger.error(f"错误: {e}")
+        return None
+    if ratio is not None:
+        logger.error("错误: 需要重采样的音频不能并行解码，请使用 decode_wav_file_blocks。")
+        return None
+    backend = _resolve_backend(backend, diagnostics)
+    if backend is None:
+        return None
+    layout = _symbol_layout(sample_rate, profile)
+    if layout is None:
+        return None
+    tone_samples, silence_samples, cycle_samples = layout
+
+    n_windows = (n_samples - tone_samples) // cycle_samples + 1 if n_samples >= tone_samples else 0
+    workers = workers or os.cpu_count() or 1
+    # A few ranges per worker keeps the pool busy when ranges finish unevenly
+    range_windows = max(PARALLEL_MIN_WINDOWS, -(-n_windows // (workers * 4)))
+    jobs = [(input_wav_path, first, min(first + range_windows, n_windows), backend, profile, diagnostics, channel)
+            for first in range(0, n_windows, range_windows)]
+
+    count("samples_analyzed", n_samples)
+    logger.info(f"音频总长度: {n_samples/sample_rate:.2f} 秒")
+    logger.info(f"调制参数: {describe_profile(profile)}")
+    logger.info(f"预期样本数: 音调={tone_samples}, 静音={silence_samples}, 每符号周期(估算)={cycle_samples}")
+    logger.info(f"分类后端: {backend}，并行解码: {len(jobs)} 个区段，{min(workers, max(len(jobs), 1))} 个工作进程")
+
+    if len(jobs) <= 1:
+        results = [_decode_range_job(job) for job in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(jobs))) as executor:
+            results = list(executor.map(_decode_range_job, jobs)) # map preserves range order
+
+    decoded_bits = np.concatenate([result[0] for result in results]) if results else np.empty(0, dtype=np.uint8)
+    uncertain_bits = sum(result[1] for result in results)
+    analyzed_segment_count = sum(result[2] for result in results)
+    bits = _finish_decode(decoded_bits, uncertain_bits, analyzed_segment_count)
+    if not diagnostics:
+        return bits
+    if bits is None:
+        return None
+    if not results:
+        return bits, np.empty(0, dtype=symbol_diagnostics_dtype(profile.tones_per_subchannel))
+    return bits, np.concatenate([result[3] for result in results])
+
+
+_BINARY_DIGITS = str.maketrans('', '', '01') # Deletes '0'/'1', leaving only invalid characters
+
+
+def binary_string_to_bytes(binary_string):
+    """
+    Packs a string of '0'/'1' characters (length a multiple of 8) into bytes.
+
+    The whole string is parsed as one base-2 integer, which CPython does in linear
+    time, instead of calling int(chunk, 2) once per byte.
+
+    Raises:
+        ValueError: If the string contains characters other than '0' and '1'.
+    """
+    if not binary_string:
+        return b""
+    # int() would also accept '_', '+' and surrounding whitespace, so reject those up front
+    invalid = binary_string.translate(_BINARY_DIGITS)
+    if invalid:
+        raise ValueError(f"invalid binary digits: {invalid[:10]!r}")
+    return int(binary_string, 2).to_bytes(len(binary_string) // 8, 'big')
+
+
+def bit_array_to_bytes(bits):
+    """
+    Packs a numpy array of 0/1 values into bytes (np.packbits, MSB first).
+    Trailing bits that do not fill a whole byte are discarded.
+    """
+    bits = np.asarray(bits, dtype=np.uint8)
+    return np.packbits(bits[:len(bits) - len(bits) % 8]).tobytes()
+
+
+def bit_array_to_text(bits, encoding='utf-8'):
+    """Decodes a numpy bit array straight to text, skipping the '0'/'1' string form."""
+    return bit_array_to_bytes(bits).decode(encoding, errors='replace')
+
+
 def binary_string_to_text(binary_string, encoding='utf-8'):
     """
-    Converts a string of binary digits ('0' and '1') into text.
+    Converts a string of binary digits ('0' and '1'), or a BitSequence, into text.
+    A BitSequence is decoded straight from its packed bytes.
     """
     if not binary_string:
-        print("错误: 二进制字符串为空，无法转换为文本。")
+        logger.error("错误: 二进制字符串为空，无法转换为文本。")
         return None
 
     # Ensure length is a multiple of 8
     remainder = len(binary_string) % 8
     if remainder != 0:
-        print(f"警告: 解码后的二进制字符串长度 ({len(binary_string)}) 不是8的倍数。")
+        logger.warning(f"警告: 解码后的二进制字符串长度 ({len(binary_string)}) 不是8的倍数。")
         # Decision: Discard trailing bits or try padding? Discarding is safer.
-        print(f"将丢弃末尾的 {remainder} 个比特。")
+        logger.info(f"将丢弃末尾的 {remainder} 个比特。")
         binary_string = binary_string[:-remainder]
 
     if not binary_string:
-        print("错误: 丢弃末尾比特后，二进制字符串为空。")
+        logger.error("错误: 丢弃末尾比特后，二进制字符串为空。")
         return None
 
     try:
-        byte_list = []
-        for i in range(0, len(binary_string), 8):
-            byte_chunk = binary_string[i:i+8]
-            byte_value = int(byte_chunk, 2)
-            byte_list.append(byte_value)
-
-        recovered_bytes = bytes(byte_list)
+        if isinstance(binary_string, BitSequence):
+            recovered_bytes = binary_string.to_bytes()
+        else:
+            recovered_bytes = binary_string_to_bytes(binary_string)
         # Use 'replace' to handle potential errors if some bytes don't form valid UTF-8
         recovered_text = recovered_bytes.decode(encoding, errors='replace')
         return recovered_text
     except ValueError as e:
-         print(f"错误: 将二进制块 '{byte_chunk}' 转换为整数时出错: {e}") # Added chunk info
+         logger.error(f"错误: 二进制字符串包含非 '0'/'1' 字符，无法转换为整数: {e}")
          return None
     except UnicodeDecodeError as e:
-        print(f"错误: 使用 '{encoding}' 解码字节序列时出错: {e}")
-        print("可能原因：二进制数据损坏、编码不匹配或解码参数错误。")
+        logger.error(f"错误: 使用 '{encoding}' 解码字节序列时出错: {e}")
+        logger.error("可能原因：二进制数据损坏、编码不匹配或解码参数错误。")
         return None
     except Exception as e:
-        print(f"错误: 二进制到文本转换过程中发生未知错误: {e}")
+        logger.error(f"错误: 二进制到文本转换过程中发生未知错误: {e}")
+        return None
+
+
+def read_wav_mmap(input_wav_path):
+    """
+    Opens a WAV file with its sample data memory-mapped instead of loaded.
+
+    Falls back to a regular read for formats scipy cannot map (e.g. 24-bit PCM).
+
+    Returns:
+        tuple: (sample_rate, audio_data) as returned by scipy.io.wavfile.read.
+    """
+    import scipy.io.wavfile as wavfile
+    try:
+        return wavfile.read(input_wav_path, mmap=True)
+    except ValueError:
+        logger.info("该 WAV 格式不支持内存映射，改为完整读取。")
+        return wavfile.read(input_wav_path)
+
+
+def normalization_scale(dtype):
+    """
+    Returns the divisor that maps integer samples of `dtype` to roughly [-1, 1],
+    or None for floating point data (assumed to be normalized already).
+    """
+    if not np.issubdtype(dtype, np.integer):
+        return None
+    dtype_info = np.iinfo(dtype)
+    # Scale based on max possible deviation from zero
+    return max(abs(dtype_info.max), abs(dtype_info.min))
+
+
+def read_wav_metadata(input_wav_path):
+    """
+    Reads the modem metadata that audio.py stores in the LIST/INFO 'ICMT' chunk.
+
+    Only the chunk headers are walked (the sample data is skipped with seek), so this
+    is cheap even for very large recordings. `input_wav_path` may also be an open binary
+    file object; it is read from its current position and left open.
+
+    Returns:
+        dict | None: The parsed metadata fields (see modem.parse_metadata), or None if
+                     the file has no such metadata.
+    """
+    if hasattr(input_wav_path, 'read'):
+        return _scan_wav_metadata(input_wav_path)
+    with open(input_wav_path, 'rb') as f:
+        return _scan_wav_metadata(f)
+
+
+def _scan_wav_metadata(f):
+    riff = f.read(12)
+    if len(riff) < 12 or riff[:4] != b'RIFF' or riff[8:12] != b'WAVE':
+        return None
+    while True:
+        chunk_header = f.read(8)
+        if len(chunk_header) < 8:
+            return None
+        chunk_id, chunk_size = struct.unpack('<4sI', chunk_header)
+        if chunk_id == b'LIST':
+            body = f.read(chunk_size)
+            if body[:4] == b'INFO':
+                position = 4
+                while position + 8 <= len(body):
+                    sub_id, sub_size = struct.unpack('<4sI', body[position:position + 8])
+                    if sub_id == b'ICMT':
+                        value = body[position + 8:position + 8 + sub_size].split(b'\0', 1)[0]
+                        return parse_metadata(value.decode('utf-8', errors='replace'))
+                    position += 8 + sub_size + (sub_size & 1)
+            f.seek(chunk_size & 1, os.SEEK_CUR)
+        elif chunk_id == b'data':
+            return None # audio.py writes the metadata before the samples
+        else:
+            f.seek(chunk_size + (chunk_size & 1), os.SEEK_CUR)
+
+
+def detect_profile(input_wav_path):
+    """
+    Returns the ModemProfile recorded in a WAV file's metadata, or None if the file
+    has none (e.g. it was written before profiles existed) or it cannot be used.
+    """
+    try:
+        fields = read_wav_metadata(input_wav_path)
+        return profile_from_metadata(fields) if fields else None
+    except (OSError, KeyError, ValueError) as e:
+        logger.warning(f"警告: 无法读取音频文件中的调制参数: {e}")
+        return None
+
+
+def detect_framing(input_wav_path):
+    """
+    Returns the frame payload size if the WAV file's metadata says it carries
+    error-corrected frames (see framing.py), otherwise None.
+
+    Raises:
+        ValueError: If the file uses a framing scheme this version does not know.
+    """
+    try:
+        fields = read_wav_metadata(input_wav_path)
+    except OSError:
+        return None
+    return framing_from_metadata(fields)
+
+
+def detect_compression(input_wav_path):
+    """
+    Returns the codec if the WAV file's metadata says its payload is compressed (see
+    compression.py), otherwise None.
+
+    Raises:
+        ValueError: If the file uses a codec this version does not know.
+    """
+    try:
+        fields = read_wav_metadata(input_wav_path)
+    except OSError:
+        return None
+    return compression_from_metadata(fields)
+
+
+def detect_streams(input_wav_path):
+    """
+    Returns the number of independent documents if the WAV file's metadata says its
+    subchannels carry separate streams (see audio.multiplex_to_audio), otherwise None.
+    """
+    try:
+        fields = read_wav_metadata(input_wav_path)
+    except OSError:
+        return None
+    return streams_from_metadata(fields)
+
+
+# --- Streaming Decoder ---
+_NO_BITS = np.empty(0, dtype=np.uint8)
+
+
+class StreamingDecoder:
+    """
+    Incremental decoder for live audio: feed() accepts PCM blocks of any size and
+    returns the text decoded so far, so output lags the input by about one symbol
+    period instead of the length of the whole recording.
+
+    Incomplete symbol windows and incomplete bytes are carried over between calls, and
+    text goes through an incremental decoder, so a multi-byte character is emitted as
+    soon as its last bit has been received.
+
+    The symbol grid is locked to the first audible sample (leading silence or noise
+    below AMPLITUDE_THRESHOLD is skipped); unlike decode_audio_to_bits, clock skew is
+    not tracked. Input at another sample rate is decoded with scaled timing or resampled
+    block by block, see resample_plan.
+    """
+
+    def __init__(self, sample_rate=EXPECTED_SAMPLE_RATE, profile=None, encoding='utf-8', backend=None,
+                 scale_factor=None, lock=True, diagnostics=False, decompressor=None):
+        """
+        Args:
+            sample_rate (int): Sample rate of the incoming PCM.
+            profile (str | ModemProfile | None): Modem profile, see active_profile.
+            encoding (str): Text encoding of the transmitted bytes.
+            backend (str | None): 'dft' or 'fft'; defaults to CLASSIFIER_BACKEND.
+            scale_factor (float | None): Divisor for integer samples; None derives it from
+                                         the dtype of the first block (see normalization_scale).
+            lock (bool): Place the symbol grid at the first audible sample; False starts
+                         it at the first sample, like decode_audio_to_bits without sync.
+            diagnostics (bool): Collect per-symbol diagnostics (see diagnostics()); uses
+                                the 'dft' classifier.
+            decompressor (compression.Decompressor | None): Undo payload compression
+                                                            before the text is decoded.
+
+        Raises:
+            ValueError: If the profile, backend or sample rate cannot be used.
+        """
+        self.profile, ratio = _planned_profile(sample_rate, profile)
+        backend = backend or CLASSIFIER_BACKEND
+        if backend not in ('dft', 'fft'):
+            raise ValueError(f"未知的分类后端 '{backend}'，可选 'dft' 或 'fft'")
+        layout = _symbol_layout(self.profile.sample_rate, self.profile)
+        if layout is None:
+            raise ValueError("计算出的周期或音调样本数无效")
+        self.sample_rate = self.profile.sample_rate # The rate windows are decoded at
+        self.tone_samples, _, self.cycle_samples = layout
+        self._decode_windows = _decode_windows_fft if backend == 'fft' else _decode_windows_dft
+        self._resampler = PolyphaseResampler(*ratio) if ratio else None
+        self._input_scale = scale_factor
+        self._diagnostics = [] if diagnostics else None
+        self._decompressor = decompressor
+        self._text_decoder = codecs.getincrementaldecoder(encoding)(errors='replace')
+        self._pending = None      # Samples received but not yet consumed by a whole window
+        self._skip = 0            # Samples still to drop (rest of the last window's silence)
+        self._locked = not lock   # Whether the symbol grid has been placed
+        self._position = 0        # Offset of the next buffered sample from the grid origin
+        self._bits = np.empty(0, dtype=np.uint8) # Decoded bits not yet forming a whole byte
+        self.bits_decoded = 0
+        self.uncertain_segments = 0
+        self.segments_analyzed = 0
+        self.samples_received = 0
+
+    @property
+    def _scale_factor(self):
+        # Resampled blocks are already normalized floats
+        return None if self._resampler is not None else self._input_scale
+
+    def feed(self, block):
+        """
+        Decodes one block of PCM samples (1-D, any length).
+
+        Returns:
+            str: Text completed by this block (may be empty).
+        """
+        return self._emit(self.feed_bits(block))
+
+    def feed_bits(self, block):
+        """Like feed, but returns the decoded bits (uint8 array) instead of text."""
+        block = np.asarray(block)
+        if block.ndim > 1:
+            block = block[:, 0]
+        self.samples_received += len(block)
+        if self._input_scale is None:
+            self._input_scale = normalization_scale(block.dtype)
+        if self._resampler is not None:
+            block = block.astype(float)
+            if self._input_scale is not None:
+                block /= self._input_scale
+            block = self._resampler.process(block)
+        return self._decode_block(block)
+
+    def _decode_block(self, block):
+        if self._skip:
+            dropped = min(self._skip, len(block))
+            block = block[dropped:]
+            self._skip -= dropped
+        if not self._locked:
+            block = self._lock(block)
+        if not len(block):
+            return _NO_BITS
+        buffer = block if self._pending is None else np.concatenate((self._pending, block))
+
+        if len(buffer) < self.tone_samples:
+            self._pending = buffer
+            return _NO_BITS
+        n_windows = (len(buffer) - self.tone_samples) // self.cycle_samples + 1
+        bits = self._classify(buffer)
+        consumed = n_windows * self.cycle_samples
+        self._pending = buffer[consumed:].copy() if consumed < len(buffer) else None
+        self._skip = max(0, consumed - len(buffer))
+        self._position += consumed
+        return bits
+
+    def _classify(self, buffer):
+        if self._diagnostics is None:
+            bits, uncertain, analyzed = self._decode_windows(buffer, self.sample_rate, self._scale_factor,
+                                                             self.tone_samples, self.cycle_samples, profile=self.profile)
+        else:
+            bits, uncertain, analyzed, report = _decode_windows_dft(buffer, self.sample_rate, self._scale_factor,
+                                                                    self.tone_samples, self.cycle_samples,
+                                                                    profile=self.profile, diagnostics=True)
+            report["offset"] += self._position
+            self._diagnostics.append(report)
+        self.bits_decoded += len(bits)
+        self.uncertain_segments += uncertain
+        self.segments_analyzed += analyzed
+        return bits
+
+    def finish(self):
+        """
+        Flushes the decoder at the end of the stream.
+
+        Returns:
+            str: Any remaining text (an incomplete trailing character becomes U+FFFD).
+        """
+        text = self._emit(self.finish_bits())
+        if len(self._bits):
+            logger.warning(f"警告: 流结束时丢弃末尾不足一个字节的 {len(self._bits)} 个比特。")
+            self._bits = self._bits[:0]
+        return text + self._text_decoder.decode(b'', final=True)
+
+    def finish_bits(self):
+        """Like finish, but returns the remaining bits instead of text."""
+        pieces = [self._decode_block(self._resampler.finish())] if self._resampler is not None else []
+        if self._pending is not None and len(self._pending) >= self.tone_samples // 2:
+            # A truncated final tone: pad it with silence so it can still be classified
+            padding = np.zeros(self.tone_samples - len(self._pending), dtype=self._pending.dtype)
+            pieces.append(self._classify(np.concatenate((self._pending, padding))))
+        self._pending = None
+        return np.concatenate(pieces) if pieces else _NO_BITS
+
+    def diagnostics(self):
+        """
+        Per-symbol diagnostics collected so far (diagnostics=True); offsets are samples
+        at the decode rate from the start of the symbol grid.
+        """
+        if not self._diagnostics:
+            return np.empty(0, dtype=symbol_diagnostics_dtype(self.profile.tones_per_subchannel))
+        return np.concatenate(self._diagnostics)
+
+    def _lock(self, block):
+        """Drops samples before the first audible one and places the symbol grid there."""
+        scale = self._scale_factor or 1
+        audible = np.flatnonzero(np.abs(block) >= AMPLITUDE_THRESHOLD * scale)
+        if not len(audible):
+            return block[:0]
+        self._locked = True
+        return block[audible[0]:]
+
+    def _emit(self, bits):
+        if not len(bits):
+            return ""
+        if len(self._bits):
+            bits = np.concatenate((self._bits, bits))
+        whole = len(bits) - len(bits) % 8
+        self._bits = bits[whole:]
+        data = np.packbits(bits[:whole]).tobytes()
+        if self._decompressor is not None:
+            data = self._decompressor.feed(data)
+        return self._text_decoder.decode(data)
+
+
+_WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+PCM24 = np.dtype('V3') # Packed 24-bit PCM as stored in WAV files (no native numpy type)
+
+
+def read_wav_format(wav_file):
+    """
+    Parses a WAV header from an open binary file, leaving the file positioned at the
+    first sample.
+
+    Returns:
+        tuple: (sample_rate, channels, dtype, data_bytes); data_bytes is 0 while a
+               WavStreamWriter is still writing the file (the size is filled in on close).
+               8-bit PCM is 'u1' and 24-bit PCM is PCM24; pcm_frames converts both.
+
+    Raises:
+        ValueError: If the file is not a PCM / float WAV file.
+    """
+    riff = wav_file.read(12)
+    if len(riff) < 12 or riff[:4] != b'RIFF' or riff[8:12] != b'WAVE':
+        raise ValueError("不是有效的 WAV 文件")
+    fmt = None
+    while True:
+        chunk_header = wav_file.read(8)
+        if len(chunk_header) < 8:
+            raise ValueError("WAV 文件缺少 data 块")
+        chunk_id, chunk_size = struct.unpack('<4sI', chunk_header)
+        if chunk_id == b'data':
+            break
+        body = wav_file.read(chunk_size + (chunk_size & 1))
+        if chunk_id == b'fmt ':
+            fmt = struct.unpack('<HHIIHH', body[:16])
+            if len(body) >= 26:
+                fmt += struct.unpack('<H', body[24:26]) # WAVE_FORMAT_EXTENSIBLE sub-format
+    if fmt is None:
+        raise ValueError("WAV 文件缺少 fmt 块")
+    format_tag, channels, sample_rate, _, _, bits_per_sample = fmt[:6]
+    if format_tag == _WAVE_FORMAT_EXTENSIBLE and len(fmt) > 6:
+        format_tag = fmt[6] # First two bytes of the sub-format GUID
+    dtypes = {(1, 8): 'u1', (1, 16): '<i2', (1, 24): PCM24, (1, 32): '<i4', (3, 32): '<f4', (3, 64): '<f8'}
+    dtype = dtypes.get((format_tag, bits_per_sample))
+    if dtype is None:
+        raise ValueError(f"不支持的 WAV 采样格式 (格式 {format_tag}, {bits_per_sample} 位)")
+    return sample_rate, channels, np.dtype(dtype), chunk_size
+
+
+def sample_dtype(dtype):
+    """The dtype pcm_frames produces for WAV samples of `dtype`."""
+    dtype = np.dtype(dtype)
+    if dtype == PCM24:
+        return np.dtype('<i4')
+    if dtype == np.uint8:
+        return np.dtype('<i2')
+    return dtype
+
+
+def pcm_frames(data, dtype, channels=1):
+    """
+    Converts raw interleaved WAV sample bytes to a (frames, channels) array of signed
+    samples: 8-bit PCM (unsigned, centered on 128) becomes int16 and packed 24-bit PCM
+    becomes left-justified int32, the way scipy.io.wavfile reads them, so
+    normalization_scale(sample_dtype(dtype)) applies to every format.
+    """
+    dtype = np.dtype(dtype)
+    if dtype == PCM24:
+        raw = np.frombuffer(data, dtype=np.uint8).reshape(-1, 3).astype(np.uint32)
+        samples = (raw[:, 0] << 8 | raw[:, 1] << 16 | raw[:, 2] << 24).view('<i4')
+    elif dtype == np.uint8:
+        samples = (np.frombuffer(data, dtype=np.uint8).astype(np.int16) - 128) << 8
+    else:
+        samples = np.frombuffer(data, dtype=dtype)
+    return samples.reshape(-1, channels)
+
+
+# --- Channel Selection ---
+def best_channel(frames, sample_rate, profile=None, scale_factor=None):
+    """
+    Returns the index of the channel of a (frames, channels) array whose tones stand
+    out most: the highest median per-symbol SNR over its audible windows (see
+    symbol_diagnostics_dtype). Channels without audible windows score lowest.
+    """
+    profile = active_profile(profile)
+    tone_samples = max(1, round(profile.tone_duration * sample_rate))
+    cycle_samples = tone_samples + round(profile.silence_duration * sample_rate)
+    scores = []
+    for channel in range(frames.shape[1]):
+        *_, report = _decode_windows_dft(frames[:, channel], sample_rate, scale_factor, tone_samples,
+                                         cycle_samples, profile=profile, diagnostics=True)
+        snr = report["snr_db"][~report["uncertain"]]
+        scores.append(float(np.median(snr)) if len(snr) else -np.inf)
+    channel = int(np.argmax(scores))
+    logger.info(f"声道信噪比 (dB): {', '.join(f'{score:.1f}' for score in scores)}；选用声道 {channel}。")
+    return channel
+
+
+def select_channel_blocks(blocks, mode, sample_rate, profile=None, scale_factor=None):
+    """
+    Turns blocks of all channels ((frames, channels) arrays) into blocks of one signal.
+
+    Args:
+        mode (int | str | None): A channel index, "mix" (average of all channels) or
+                                 "best" (see best_channel, scored on the first
+                                 CHANNEL_PROBE_SECONDS); None uses CHANNEL_MODE.
+
+    Returns:
+        iterator: 1-D blocks. "mix" yields float32 blocks in the input's sample units.
+    """
+    mode = CHANNEL_MODE if mode is None else mode
+    blocks = iter(blocks)
+    if mode == "mix":
+        return (block.mean(axis=1, dtype=np.float32) if block.shape[1] > 1 else block[:, 0] for block in blocks)
+    if mode == "best":
+        probe_frames = max(1, int(CHANNEL_PROBE_SECONDS * sample_rate))
+        held = []
+        for block in blocks:
+            held.append(block)
+            if sum(len(held_block) for held_block in held) >= probe_frames:
+                break
+        if not held:
+            return iter(())
+        mode = best_channel(np.concatenate(held)[:probe_frames], sample_rate, profile, scale_factor)
+        blocks = itertools.chain(held, blocks)
+    return _iter_channel(blocks, mode)
+
+
+def _iter_channel(blocks, channel):
+    for block in blocks:
+        if channel >= block.shape[1]:
+            raise ValueError(f"声道 {channel} 不存在 (共 {block.shape[1]} 个声道)")
+        yield block[:, channel]
+
+
+def iter_pcm_blocks(stream, dtype='<i2', channels=1, block_frames=STREAM_BLOCK_FRAMES, max_bytes=None, channel=0):
+    """
+    Reads raw interleaved PCM from a binary stream (e.g. sys.stdin.buffer) in blocks.
+
+    Samples are converted with pcm_frames, so the blocks have sample_dtype(dtype).
+
+    Yields:
+        np.ndarray: Channel `channel` of each block, or all channels as a
+                    (frames, channels) array for channel=None (the last block may
+                    be shorter).
+    """
+    dtype = np.dtype(dtype)
+    frame_bytes = dtype.itemsize * channels
+    carry = b''
+    remaining = max_bytes
+    while remaining is None or remaining > 0:
+        want = block_frames * frame_bytes
+        if remaining is not None:
+            want = min(want, remaining)
+        data = stream.read(want)
+        if not data:
+            break
+        if remaining is not None:
+            remaining -= len(data)
+        data = carry + data
+        usable = len(data) - len(data) % frame_bytes
+        carry = data[usable:]
+        if usable:
+            frames = pcm_frames(data[:usable], dtype, channels)
+            yield frames if channel is None else frames[:, channel]
+
+
+def open_wav_blocks(input_wav_path, block_frames=STREAM_BLOCK_FRAMES, follow=False,
+                    poll_interval=FOLLOW_POLL_INTERVAL, idle_timeout=FOLLOW_IDLE_TIMEOUT, channel=0):
+    """
+    Opens a WAV file for block-by-block reading. With follow=True the file may still be
+    growing (like `tail -f`): reading continues until the writer has filled in the final
+    data size and all of it has been read, or no new data arrived for idle_timeout seconds.
+
+    Returns:
+        tuple: (sample_rate, dtype, blocks), where blocks yields np.ndarray blocks of
+               channel `channel` (all channels for None, see iter_pcm_blocks) and closes
+               the file when exhausted; dtype is that of the blocks.
+
+    Raises:
+        OSError, ValueError: If the file cannot be opened or its header is not supported.
+    """
+    wav_file = open(input_wav_path, 'rb')
+    try:
+        sample_rate, channels, dtype, data_bytes = read_wav_format(wav_file)
+    except Exception:
+        wav_file.close()
+        raise
+    if channel is not None and channel >= channels:
+        wav_file.close()
+        raise ValueError(f"声道 {channel} 不存在 (文件共 {channels} 个声道)")
+    blocks = _iter_wav_file_blocks(wav_file, channels, dtype, data_bytes, block_frames, follow,
+                                   poll_interval, idle_timeout, channel)
+    return sample_rate, sample_dtype(dtype), blocks
+
+
+def _iter_wav_file_blocks(wav_file, channels, dtype, data_bytes, block_frames, follow, poll_interval, idle_timeout,
+                          channel):
+    data_start = wav_file.tell()
+    frame_bytes = dtype.itemsize * channels
+    position = 0 # Bytes of whole frames consumed so far
+    idle_since = time.monotonic()
+    with wav_file:
+        while not (data_bytes and position >= data_bytes):
+            # Re-seek every round: a partially written frame at the end is read again later
+            wav_file.seek(data_start + position)
+            limit = data_bytes - position if data_bytes else None
+            got_data = False
+            for block in iter_pcm_blocks(wav_file, dtype, channels, block_frames, limit, channel):
+                position += len(block) * frame_bytes
+                got_data = True
+                yield block
+            if not follow:
+                return
+            if not data_bytes:
+                # WavStreamWriter fills in the data size when it closes the file
+                wav_file.seek(data_start - 4)
+                data_bytes = struct.unpack('<I', wav_file.read(4))[0]
+                if data_bytes:
+                    continue
+            if got_data:
+                idle_since = time.monotonic()
+            elif time.monotonic() - idle_since > idle_timeout:
+                logger.warning(f"警告: {idle_timeout} 秒内没有新数据，停止跟踪文件。")
+                return
+            else:
+                time.sleep(poll_interval)
+
+
+def decode_live(input_source, output=None, profile=None, backend=None, follow=True, sample_rate=None,
+                dtype='<i2', channels=1, channel=None):
+    """
+    Decodes a live capture and writes text to `output` as soon as it is decoded.
+
+    Args:
+        input_source (str): Path to a (possibly growing) WAV file, or "-" for raw PCM
+                            on stdin (described by sample_rate / dtype / channels).
+        output (file | None): Text stream to write to; None uses sys.stdout.
+        profile (str | ModemProfile | None): Modem profile; None reads it from the WAV
+                                             metadata, falling back to the module constants.
+        follow (bool): Keep reading a WAV file while it grows, see open_wav_blocks.
+        channel (int | str | None): Channel index, "mix" or "best", see
+                                    select_channel_blocks; None uses CHANNEL_MODE.
+
+    Returns:
+        str | None: The complete decoded text, or None if decoding could not start.
+    """
+    output = output or sys.stdout
+    try:
+        decompressor = None
+        if input_source == "-":
+            sample_rate = sample_rate or EXPECTED_SAMPLE_RATE
+            blocks = iter_pcm_blocks(sys.stdin.buffer, dtype, channels, channel=None)
+            dtype = sample_dtype(dtype)
+        else:
+            sample_rate, dtype, blocks = open_wav_blocks(input_source, follow=follow, channel=None)
+            if profile is None:
+                profile = detect_profile(input_source)
+            if detect_framing(input_source):
+                raise ValueError("带帧校验的音频不支持实时解码，请等录制完成后整体解码")
+            if detect_streams(input_source):
+                raise ValueError("多路复用的音频不支持实时解码，请等录制完成后整体解码")
+            decompressor = Decompressor() if detect_compression(input_source) else None
+        scale_factor = normalization_scale(np.dtype(dtype))
+        decoder = StreamingDecoder(sample_rate, profile, backend=backend, scale_factor=scale_factor,
+                                   decompressor=decompressor)
+        blocks = select_channel_blocks(blocks, channel, sample_rate, profile, scale_factor)
+    except (OSError, ValueError) as e:
+        logger.error(f"错误: 无法开始实时解码: {e}")
+        return None
+
+    logger.info(f"实时解码: 调制参数 {decoder.profile.name}，每符号 {decoder.cycle_samples} 个采样点。")
+    pieces = []
+    try:
+        for block in blocks:
+            text = decoder.feed(block)
+            if text:
+                output.write(text)
+                output.flush()
+                pieces.append(text)
+    except ValueError as e: # e.g. a channel the input does not have
+        logger.error(f"错误: 实时解码中断: {e}")
+        return None
+    text = decoder.finish()
+    output.write(text)
+    output.flush()
+    pieces.append(text)
+    logger.info(f"实时解码结束: {decoder.bits_decoded} 位，跳过 {decoder.uncertain_segments} 个不确定/静音周期。")
+    return "".join(pieces)
+
+
+def decode_wav_file_blocks(input_wav_path, backend=None, profile=None, channel=None, diagnostics=False):
+    """
+    Decodes a WAV file block by block through a StreamingDecoder, converting the samples
+    on the way: 8/24-bit PCM, channel mixing or selection, and resampling happen one
+    block at a time, so memory use stays bounded whatever the format. The symbol grid
+    starts at the first sample; clock skew is not tracked.
+
+    Args:
+        channel (int | str | None): Channel index, "mix" or "best", see
+                                    select_channel_blocks; None uses CHANNEL_MODE.
+        diagnostics (bool): Also return per-symbol diagnostics, as decode_audio_to_bits.
+
+    Returns:
+        BitSequence: The decoded bits, or None if decoding fails. With diagnostics=True,
+                     a (bits, diagnostics array) tuple, or None.
+    """
+    try:
+        sample_rate, dtype, blocks = open_wav_blocks(input_wav_path, block_frames=RESAMPLE_BLOCK_FRAMES,
+                                                     channel=None)
+        scale_factor = normalization_scale(dtype)
+        decoder = StreamingDecoder(sample_rate, profile, backend=backend, scale_factor=scale_factor, lock=False,
+                                   diagnostics=diagnostics)
+        logger.info(f"分块解码: 调制参数 {decoder.profile.name}，解码采样率 {decoder.sample_rate} Hz，"
+                    f"每符号 {decoder.cycle_samples} 个采样点。")
+        pieces = [decoder.feed_bits(block)
+                  for block in select_channel_blocks(blocks, channel, sample_rate, profile, scale_factor)]
+        pieces.append(decoder.finish_bits())
+    except (OSError, ValueError) as e:
+        logger.error(f"错误: 分块解码失败: {e}")
         return None
+    count("samples_analyzed", decoder.samples_received)
+    bits = _finish_decode(np.concatenate(pieces), decoder.uncertain_segments, decoder.segments_analyzed)
+    return (bits, decoder.diagnostics()) if diagnostics else bits
+
+
+def _needs_block_decode(input_wav_path, profile, channel):
+    """
+    Whether a WAV file has to be converted while it is read (8/24-bit samples, a sample
+    rate that needs resampling, or mixed channels) rather than decoded from a memory map.
+    """
+    with open(input_wav_path, 'rb') as wav_file:
+        sample_rate, channels, dtype, _ = read_wav_format(wav_file)
+    if sample_dtype(dtype) != dtype or (channel == "mix" and channels > 1):
+        return True
+    _, ratio = resample_plan(sample_rate, active_profile(profile))
+    return ratio is not None
 
 
 # --- Main Function ---
-def decode_audio_file(input_wav_path, output_txt_path=None):
+def decode_audio_file(input_wav_path, output_txt_path=None, backend=None, workers=None, profile=None, cache=None,
+                      diagnostics_path=None, calibrate=None, channel=None):
     """
     Reads a WAV file, decodes it to text, and prints/saves the result.
+
+    Args:
+        input_wav_path (str): Path to the WAV file to decode.
+        output_txt_path (str | None): Optional path to save the decoded text.
+        backend (str | None): Bit classifier backend ('dft' or 'fft'), see CLASSIFIER_BACKEND.
+        workers (int | None): Decode with this many worker processes (see
+                              decode_wav_file_parallel); None uses DECODE_WORKERS.
+        profile (str | ModemProfile | None): Modem profile to decode with. None reads it
+                                             from the file's metadata, falling back to
+                                             the module constants.
+        cache (ContentCache | bool | None): Reuse the text decoded earlier from identical
+                                            WAV bytes with the same settings (True uses
+                                            the default cache).
+        diagnostics_path (str | None): Save the per-symbol diagnostics (see
+                                       symbol_diagnostics_dtype) to this .npy file;
+                                       None uses DIAGNOSTICS_PATH.
+        calibrate (bool | None): Reclassify the symbols with an amplitude threshold
+                                 calibrated on this recording (see
+                                 calibrate_amplitude_threshold) instead of
+                                 AMPLITUDE_THRESHOLD; None uses AUTO_CALIBRATE.
+        channel (int | str | None): Channel index, "mix" or "best" (see
+                                    select_channel_blocks); None uses CHANNEL_MODE.
+                                    Any sample rate, 8/16/24/32-bit PCM and float
+                                    input is accepted; see resample_plan.
+
+    Returns:
+        str | None: The decoded text, or None if decoding failed.
     """
-    print("+"*50)
-    print(" Initiating Auditivus-Binarius-Scriptor Protocol (Decoder)")
-    print("+"*50)
-    print(f"输入音频文件: {input_wav_path}")
+    logger.info("+"*50)
+    logger.info(" Initiating Auditivus-Binarius-Scriptor Protocol (Decoder)")
+    logger.info("+"*50)
+    logger.info(f"输入音频文件: {input_wav_path}")
 
     if not os.path.exists(input_wav_path):
-        print(f"错误: 输入文件未找到: {input_wav_path}")
-        return
+        logger.error(f"错误: 输入文件未找到: {input_wav_path}")
+        return None
 
-    # 1. Read WAV file
-    try:
-        print("正在读取 WAV 文件...")
-        sample_rate, audio_data = wavfile.read(input_wav_path)
-        print(f"文件读取成功。采样率: {sample_rate} Hz, 数据点数: {len(audio_data)}")
+    diagnostics_path = diagnostics_path or DIAGNOSTICS_PATH
+    calibrate = AUTO_CALIBRATE if calibrate is None else calibrate
+    channel = CHANNEL_MODE if channel is None else channel
+    cache = resolve_cache(cache)
+    recovered_text = None
+    if cache is not None:
+        with phase("cache"):
+            # Without an explicit profile the one in the file's metadata is used, and the
+            # metadata is part of the hashed bytes
+            key = cache.make_key(file_digest(input_wav_path), kind="decode", encoding='utf-8',
+                                 profile=get_profile(profile)._asdict() if profile is not None else "auto",
+                                 backend=backend or CLASSIFIER_BACKEND, sync=SYNC_ENABLED,
+                                 thresholds=(AMPLITUDE_THRESHOLD, FREQUENCY_THRESHOLD), calibrate=calibrate,
+                                 channel=channel)
+            # Diagnostics only come out of an actual decode
+            recovered_text = None if diagnostics_path else cache.read_text(key)
+        if recovered_text is not None:
+            logger.info("缓存命中，跳过解码。")
+    if recovered_text is None:
+        recovered_text = _decode_wav_file_to_text(input_wav_path, backend, workers, profile,
+                                                  diagnostics_path, calibrate, channel)
+        if recovered_text is None:
+            return None
+        if cache is not None:
+            with phase("cache"):
+                cache.store_text(key, recovered_text)
 
-        if audio_data.ndim > 1:
-            print("检测到立体声，将使用第一个声道。")
-            audio_data = audio_data[:, 0]
+    logger.info("-" * 50)
+    logger.info("解码得到的文本:")
+    logger.info("="*20 + " START " + "="*20)
+    logger.info(recovered_text)
+    logger.info("="*21 + " END " + "="*21)
+
+    # 4. Save to file if path provided
+    if output_txt_path:
+        logger.info("-" * 50)
+        logger.info(f"正在将解码文本保存到: {output_txt_path}")
+        try:
+            # Ensure output directory exists
+            output_dir = os.path.dirname(output_txt_path)
+            if output_dir and not os.path.exists(output_dir):
+                logger.info(f"创建输出目录: {output_dir}")
+                os.makedirs(output_dir, exist_ok=True)
+
+            with phase("save"), open(output_txt_path, 'w', encoding='utf-8') as outfile:
+                outfile.write(recovered_text)
+            logger.info("文件保存成功。")
+        except IOError as e:
+            logger.error(f"错误: 无法写入输出文件 '{output_txt_path}': {e}")
+        except Exception as e:
+            logger.error(f"错误: 保存文件时发生未知错误: {e}")
+
+    logger.info("解码流程结束。")
+    return recovered_text
+
+
+def _read_wav_channel(input_wav_path, profile, channel):
+    """
+    Memory-maps a WAV file and picks the channel to decode (a strided view, no copy).
+
+    Returns:
+        tuple: (audio_data, sample_rate, scale_factor, channel index), or Nones on
+               failure (already logged).
+    """
+    try:
+        logger.info("正在读取 WAV 文件 (内存映射)...")
+        with phase("read"):
+            sample_rate, audio_data = read_wav_mmap(input_wav_path)
+        logger.info(f"文件读取成功。采样率: {sample_rate} Hz, 数据点数: {len(audio_data)}")
 
         # --- Normalization ---
-        print("正在标准化音频数据...")
-        dtype_info = np.iinfo(audio_data.dtype) if np.issubdtype(audio_data.dtype, np.integer) else None
-        if dtype_info:
-             # Integer type: scale based on max value for its type
-             max_val = dtype_info.max
-             min_val = dtype_info.min
-             # Avoid division by zero if max_val equals min_val (e.g., constant signal)
-             if max_val == min_val:
-                 audio_data_float = np.zeros_like(audio_data, dtype=float)
-             else:
-                # Scale signed integers to [-1, 1], unsigned to [0, 1] then shift?
-                # Simpler approach: just scale based on max possible deviation from zero
-                scale_factor = max(abs(max_val), abs(min_val))
-                audio_data_float = audio_data.astype(float) / scale_factor
-        elif np.issubdtype(audio_data.dtype, np.floating):
-             # Floating point type: assume it's already in [-1, 1] or similar range
-             print(f"检测到浮点类型 ({audio_data.dtype})，假设已标准化。")
-             audio_data_float = audio_data
-             # Optional: Check range and normalize if needed
-             # max_abs_val = np.max(np.abs(audio_data_float))
-             # if max_abs_val > 1.0: # Or some tolerance
-             #     print(f"警告: 浮点数据范围超过 [-1, 1] (最大绝对值: {max_abs_val:.2f})，将进行标准化。")
-             #     audio_data_float = audio_data_float / max_abs_val
+        # Integer samples are normalized per analysis window inside decode_audio_to_binary,
+        # so only the current window is ever held as float.
+        scale_factor = normalization_scale(audio_data.dtype)
+        if scale_factor is None and not np.issubdtype(audio_data.dtype, np.floating):
+            logger.error(f"错误: 不支持的音频数据类型 '{audio_data.dtype}' 用于标准化。")
+            return None, None, None, None
+        elif scale_factor is None:
+            logger.info(f"检测到浮点类型 ({audio_data.dtype})，假设已标准化。")
         else:
-             print(f"错误: 不支持的音频数据类型 '{audio_data.dtype}' 用于标准化。")
-             return
-        print("音频标准化完成。")
+            logger.info(f"音频数据将按分析窗口逐段标准化 (缩放系数: {scale_factor})。")
         # --- End Normalization ---
 
+        if audio_data.ndim == 1:
+            return audio_data, sample_rate, scale_factor, 0
+        if channel == "best":
+            probe = audio_data[:max(1, int(CHANNEL_PROBE_SECONDS * sample_rate))]
+            channel = best_channel(probe, sample_rate, profile, scale_factor)
+        elif channel == "mix":
+            channel = 0 # A single channel; more than one is mixed by decode_wav_file_blocks
+        elif channel >= audio_data.shape[1]:
+            logger.error(f"错误: 声道 {channel} 不存在 (文件共 {audio_data.shape[1]} 个声道)。")
+            return None, None, None, None
+        else:
+            logger.info(f"检测到 {audio_data.shape[1]} 个声道，将使用声道 {channel}。")
+        return audio_data[:, channel], sample_rate, scale_factor, channel # Strided view, no copy
     except FileNotFoundError: # More specific error
-        print(f"错误: 输入文件未找到: {input_wav_path}")
+        logger.error(f"错误: 输入文件未找到: {input_wav_path}")
+    except Exception as e:
+        logger.error(f"错误: 读取或处理 WAV 文件时出错: {e}")
+    return None, None, None, None
+
+
+def _decode_wav_file_to_text(input_wav_path, backend=None, workers=None, profile=None, diagnostics_path=None,
+                             calibrate=False, channel=None):
+    """
+    Steps 1-3 of decode_audio_file: read, decode and convert to text.
+
+    Returns:
+        str | None: The decoded text, or None on failure (already logged).
+    """
+    # 1. Read WAV file
+    channel = CHANNEL_MODE if channel is None else channel
+    try:
+        if profile is None:
+            profile = detect_profile(input_wav_path)
+            if profile is not None:
+                logger.info(f"从文件元数据中检测到调制参数: {profile.name}")
+        frame_payload = detect_framing(input_wav_path)
+        if frame_payload:
+            logger.info(f"检测到帧校验 (每帧 {frame_payload} 字节)，将逐帧纠错解码。")
+        compression = detect_compression(input_wav_path)
+        if compression:
+            logger.info(f"检测到压缩数据 ({compression})，解码后将解压。")
+        n_streams = detect_streams(input_wav_path)
+        if n_streams:
+            logger.info(f"检测到 {n_streams} 路复用的独立文档，将分别解码。")
+        block_decode = _needs_block_decode(input_wav_path, profile, channel)
+    except FileNotFoundError:
+        logger.error(f"错误: 输入文件未找到: {input_wav_path}")
         return
     except Exception as e:
-        print(f"错误: 读取或处理 WAV 文件时出错: {e}")
+        logger.error(f"错误: 读取或处理 WAV 文件时出错: {e}")
         return
+    if block_decode:
+        logger.info("该 WAV 文件需要格式转换、混音或重采样，将分块读取并解码。")
+        audio_data = None
+    else:
+        audio_data, sample_rate, scale_factor, channel = _read_wav_channel(input_wav_path, profile, channel)
+        if audio_data is None:
+            return
 
     # 2. Decode audio to binary string
-    print("-" * 50)
-    print("开始解码音频到二进制...")
-    binary_result = decode_audio_to_binary(audio_data_float, sample_rate)
+    logger.info("-" * 50)
+    logger.info("开始解码音频到二进制...")
+    workers = workers or DECODE_WORKERS
+    diagnostics = bool(diagnostics_path or calibrate or n_streams) # Streams are split using the diagnostics
+    with phase("decode"):
+        if block_decode:
+            binary_result = decode_wav_file_blocks(input_wav_path, backend, profile, channel, diagnostics)
+        elif workers and workers > 1:
+            del audio_data # Workers map the file themselves
+            binary_result = decode_wav_file_parallel(input_wav_path, workers, backend, profile, diagnostics, channel)
+        else:
+            binary_result = decode_audio_to_bits(audio_data, sample_rate, scale_factor, backend, profile=profile,
+                                                 diagnostics=diagnostics)
+            del audio_data # Release the memory map before any output is written
+    stream_bits = None
+    if diagnostics and binary_result is not None:
+        binary_result, symbol_diagnostics = binary_result
+        if diagnostics_path:
+            save_diagnostics(diagnostics_path, symbol_diagnostics)
+        if calibrate:
+            binary_result = _calibrated_decode(binary_result, symbol_diagnostics, active_profile(profile))
+        if n_streams:
+            threshold = calibrate_amplitude_threshold(symbol_diagnostics) if calibrate else None
+            stream_bits = demultiplex_bits(symbol_diagnostics, active_profile(profile).bits_per_symbol, n_streams,
+                                           threshold)
 
     if binary_result is None:
-        print("解码音频到二进制失败。")
+        logger.error("解码音频到二进制失败。")
         return
     elif not binary_result:
-         print("解码完成，但未检测到有效比特或所有周期都不确定。")
+         logger.warning("解码完成，但未检测到有效比特或所有周期都不确定。")
          # Decide how to handle this - maybe create empty text?
          recovered_text = ""
     else:
-        print(f"解码得到的二进制串 (前100位): {binary_result[:100]}{'...' if len(binary_result) > 100 else ''}")
-        print(f"总比特数: {len(binary_result)}")
-        print("-" * 50)
+        logger.info(f"解码得到的二进制串 (前100位): {binary_result.head(100).to_string('')}{'...' if len(binary_result) > 100 else ''}")
+        logger.info(f"总比特数: {len(binary_result)}")
+        logger.info("-" * 50)
 
         # 3. Convert binary string to text
-        print("开始转换二进制到文本 (UTF-8)...")
-        recovered_text = binary_string_to_text(binary_result, encoding='utf-8')
+        logger.info("开始转换二进制到文本 (UTF-8)...")
+        if stream_bits is None:
+            recovered_text = _payload_to_text(binary_result, frame_payload, compression)
+        else:
+            texts = []
+            for index, bits in enumerate(stream_bits):
+                logger.info(f"第 {index + 1} 路: {len(bits)} 位")
+                texts.append(_payload_to_text(bits, frame_payload, compression) if bits else "")
+            recovered_text = None if None in texts else STREAM_SEPARATOR.join(texts)
 
-    # Check result of binary_string_to_text before proceeding
     if recovered_text is None:
-        print("二进制到文本转换失败。")
-    else:
-        # Only print and save if text recovery was successful
-        print("-" * 50)
-        print("解码得到的文本:")
-        print("="*20 + " START " + "="*20)
-        print(recovered_text)
-        print("="*21 + " END " + "="*21)
-
-        # 4. Save to file if path provided
-        if output_txt_path:
-            print("-" * 50)
-            print(f"正在将解码文本保存到: {output_txt_path}")
-            try:
-                # Ensure output directory exists
-                output_dir = os.path.dirname(output_txt_path)
-                if output_dir and not os.path.exists(output_dir):
-                    print(f"创建输出目录: {output_dir}")
-                    os.makedirs(output_dir, exist_ok=True)
-
-                with open(output_txt_path, 'w', encoding='utf-8') as outfile:
-                    outfile.write(recovered_text)
-                print("文件保存成功。")
-            except IOError as e:
-                print(f"错误: 无法写入输出文件 '{output_txt_path}': {e}")
-            except Exception as e:
-                print(f"错误: 保存文件时发生未知错误: {e}")
-
-    print("\n解码流程结束。")
+        logger.error("二进制到文本转换失败。")
+    return recovered_text
+
+
+def _payload_to_text(bits, frame_payload=None, compression=None):
+    """
+    Step 3 of decode_audio_file: undoes the optional framing and compression stages and
+    decodes the text.
+
+    Returns:
+        str | None: The text, or None on failure (already logged).
+    """
+    payload = None
+    if frame_payload:
+        with phase("framing"):
+            report = unframe_bits(bits, frame_payload)
+        log_frame_report(report)
+        if not report.frames:
+            logger.error("错误: 未找到任何有效帧。")
+            return None
+        payload = report.data
+    if compression:
+        try:
+            with phase("decompress"):
+                payload = decompress_bytes(bits.to_bytes() if payload is None else payload)
+        except ValueError as e:
+            logger.error(f"错误: 无法解压: {e}")
+            return None
+    with phase("to_text"):
+        if payload is not None:
+            return payload.decode('utf-8', errors='replace')
+        return binary_string_to_text(bits, encoding='utf-8')
 
 
 # --- Main Execution ---
 if __name__ == "__main__":
-    # Configure input and output paths here
-    # Use raw strings (r"...") or double backslashes for Windows paths
-    INPUT_WAV_FILE = r"C:\Computer\Code666\python\Scriptor-Binarius-Auditivus\Omnissiah_Vox_Output.wav" # Path to the audio file generated previously
-    OUTPUT_TEXT_FILE = r"C:\Computer\Code666\python\Scriptor-Binarius-Auditivus\decoded_text.txt" # Path to save the decoded text (optional)
-
-    # Run the decoder
-    decode_audio_file(INPUT_WAV_FILE, OUTPUT_TEXT_FILE)
\ No newline at end of file
+    # `python translator.py input.wav [options]` is `python cli.py decode input.wav [options]`
+    from cli import main as cli_main
+    sys.exit(cli_main(["decode", *sys.argv[1:]]))